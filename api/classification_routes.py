@@ -0,0 +1,85 @@
+import json
+import logging
+from flask import Blueprint, Response, jsonify, request, current_app
+from routes import handle_error
+from utils.classification import METHODS, MAX_CLASSES, classify
+from utils.db_pool import db_connection
+from utils.result_cache import get_result_cache, table_data_version
+from utils.spatial_registry import get_spatial_registry
+
+# Create Blueprint
+classification_bp = Blueprint('classification_api', __name__, url_prefix='/api')
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Results are not tied to an ROI; they share one result cache directory
+CACHE_SCOPE = 'classification'
+
+@classification_bp.route('/classify', methods=['GET'])
+@handle_error
+def get_classification():
+    """
+    Compute class breaks of a numeric attribute of a vector table.
+
+    Query parameters: ``vector``, ``attribute``, ``classes`` (default 5) and
+    ``method``, a comma-separated list of equal_interval, quantile, jenks and
+    std_dev (default all of them). Results are cached per table data version.
+    """
+    vector_table = request.args.get('vector')
+    attribute = request.args.get('attribute')
+    if not vector_table or not attribute:
+        return jsonify({"status": "error", "message": "Missing parameters."}), 400
+    try:
+        classes = int(request.args.get('classes', 5))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Classes must be an integer."}), 400
+    if not 2 <= classes <= MAX_CLASSES:
+        return jsonify({"status": "error", "message": f"Classes must be between 2 and {MAX_CLASSES}."}), 400
+    methods = [method.strip() for method in request.args.get('method', ','.join(METHODS)).split(',') if method.strip()]
+    unknown = [method for method in methods if method not in METHODS]
+    if unknown or not methods:
+        return jsonify({"status": "error",
+                        "message": f"Unknown method '{', '.join(unknown)}'. Use one of {', '.join(METHODS)}."}), 400
+
+    table = get_spatial_registry().vector_table(vector_table)
+    if table is None:
+        return jsonify({"status": "error", "message": f"Vector table '{vector_table}' does not exist."}), 400
+    if attribute not in table.attributes:
+        return jsonify({"status": "error", "message": f"Attribute '{attribute}' does not exist in '{table.table}'."}), 400
+
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        version = table_data_version(cur, table.schema, table.table)
+        cur.close()
+
+    cache_entry = get_result_cache().entry(table.table, CACHE_SCOPE, version,
+                                           f"classify_{attribute}_{classes}_{'+'.join(methods)}")
+    cached = cache_entry.read() if cache_entry is not None else None
+    if cached is not None:
+        response = Response(cached, mimetype="application/json")
+        response.headers["X-Cache"] = "HIT"
+        return response
+
+    result = classify(table, attribute, methods, classes,
+                      sample_size=current_app.config["CLASSIFY_SAMPLE_SIZE"],
+                      jenks_max_values=current_app.config["CLASSIFY_JENKS_MAX_VALUES"])
+    if result is None:
+        return jsonify({"status": "error", "message": f"Attribute '{attribute}' has no values."}), 404
+
+    body = json.dumps({"status": "success", "vector": table.table, "attribute": attribute,
+                       "classes": classes, **result})
+    if cache_entry is not None:
+        cache_entry.write(body)
+    response = Response(body, mimetype="application/json")
+    response.headers["X-Cache"] = "MISS"
+    return response
+
+def register_routes(app):
+    """
+    Register the classification routes with the Flask app.
+
+    Args:
+        app: The Flask application instance.
+    """
+    app.register_blueprint(classification_bp)
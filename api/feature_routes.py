@@ -0,0 +1,93 @@
+import logging
+from flask import Blueprint, Response, jsonify, request, current_app
+from routes import handle_error, get_session_id
+from utils.pagination import fetch_page
+from utils.roi_store import roi_exists, roi_filter_sql
+from utils.spatial_registry import get_spatial_registry
+
+# Create Blueprint
+feature_bp = Blueprint('feature_api', __name__, url_prefix='/api/features')
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+class InvalidPageRequest(Exception):
+    """Raised for missing or invalid paginated feature request parameters"""
+    status_code = 400
+
+def page_request_args():
+    """
+    Read the table, page size and cursor of a paginated feature request.
+
+    Returns:
+        tuple: (VectorTable, limit, cursor)
+
+    Raises:
+        InvalidPageRequest: If a parameter is missing or invalid
+    """
+    vector_table = request.args.get('vector')
+    if not vector_table:
+        raise InvalidPageRequest("Vector table not specified.")
+
+    max_limit = current_app.config["FEATURE_PAGE_MAX_SIZE"]
+    try:
+        limit = int(request.args.get('limit', current_app.config["FEATURE_PAGE_DEFAULT_SIZE"]))
+    except ValueError:
+        raise InvalidPageRequest("Limit must be an integer.")
+    if not 1 <= limit <= max_limit:
+        raise InvalidPageRequest(f"Limit must be between 1 and {max_limit}.")
+
+    table = get_spatial_registry().vector_table(vector_table)
+    if table is None:
+        raise InvalidPageRequest(f"Vector table '{vector_table}' does not exist.")
+    if table.primary_key is None:
+        raise InvalidPageRequest(f"Vector table '{vector_table}' has no primary key to paginate on.")
+    return table, limit, request.args.get('cursor')
+
+@feature_bp.route('/map_view', methods=['GET'])
+@handle_error
+def get_map_view_page():
+    """
+    Get one page of the features inside a bbox, ordered by primary key.
+
+    Pass the ``next_cursor`` of a page as ``cursor`` to get the next one.
+    """
+    table, limit, cursor = page_request_args()
+    bbox = request.args.get('bbox')
+    if not bbox:
+        return jsonify({"status": "error", "message": "Missing parameters."}), 400
+    try:
+        minx, miny, maxx, maxy = map(float, bbox.split(","))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid bbox."}), 400
+
+    bbox_sql = table.to_table_srid("ST_MakeEnvelope(%s, %s, %s, %s, 4326)")
+    filter_sql = f"ST_Intersects({table.geometry_sql()}, {bbox_sql})"
+    page = fetch_page(table, filter_sql, (minx, miny, maxx, maxy), limit, cursor)
+    return Response(page, mimetype="application/json")
+
+@feature_bp.route('/roi', methods=['GET'])
+@handle_error
+def get_roi_page():
+    """
+    Get one page of the features inside the session's ROI, ordered by primary key.
+
+    Pass the ``next_cursor`` of a page as ``cursor`` to get the next one.
+    """
+    table, limit, cursor = page_request_args()
+    session_id = get_session_id()
+    if not roi_exists(session_id):
+        return jsonify({"status": "error", "message": "No ROI available."}), 404
+
+    filter_sql = roi_filter_sql(table.geometry_sql(), table)
+    page = fetch_page(table, filter_sql, (session_id,), limit, cursor)
+    return Response(page, mimetype="application/json")
+
+def register_routes(app):
+    """
+    Register the paginated feature routes with the Flask app.
+
+    Args:
+        app: The Flask application instance.
+    """
+    app.register_blueprint(feature_bp)
@@ -0,0 +1,63 @@
+import os
+import logging
+from flask import Blueprint, jsonify, send_file
+from routes import handle_error, get_session_id
+from utils.jobs import get_job_manager, SUCCEEDED
+
+# Create Blueprint
+job_bp = Blueprint('job_api', __name__, url_prefix='/api')
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+@job_bp.route('/jobs', methods=['GET'])
+@handle_error
+def list_jobs():
+    """
+    List the background jobs of the current session.
+    """
+    jobs = get_job_manager().list(get_session_id())
+    return jsonify({"status": "success", "jobs": [job.to_dict() for job in jobs]})
+
+@job_bp.route('/jobs/<job_id>', methods=['GET'])
+@handle_error
+def get_job(job_id):
+    """
+    Get the state and progress of a background job.
+    """
+    job = get_job_manager().get(job_id, owner=get_session_id())
+    return jsonify({"status": "success", "job": job.to_dict()})
+
+@job_bp.route('/jobs/<job_id>', methods=['DELETE'])
+@handle_error
+def cancel_job(job_id):
+    """
+    Cancel a queued or running background job.
+    """
+    manager = get_job_manager()
+    job = manager.get(job_id, owner=get_session_id())
+    manager.cancel(job)
+    return jsonify({"status": "success", "job": job.to_dict()})
+
+@job_bp.route('/jobs/<job_id>/result', methods=['GET'])
+@handle_error
+def get_job_result(job_id):
+    """
+    Download the result file of a finished background job.
+    """
+    job = get_job_manager().get(job_id, owner=get_session_id())
+    if job.state != SUCCEEDED:
+        return jsonify({"status": "error", "message": f"Job is {job.state}."}), 409
+    if not job.result_filename or not os.path.isfile(job.result_path):
+        return jsonify({"status": "error", "message": "Job has no result file."}), 404
+    return send_file(job.result_path, mimetype=job.result_mimetype,
+                     as_attachment=True, download_name=job.result_filename)
+
+def register_routes(app):
+    """
+    Register the background job routes with the Flask app.
+
+    Args:
+        app: The Flask application instance.
+    """
+    app.register_blueprint(job_bp)
@@ -1,12 +1,21 @@
 import os
+import time
+import shutil
 import tempfile
-import requests
 import json
 import logging
 import traceback
-import xml.etree.ElementTree as ET
 from flask import Blueprint, jsonify, request, current_app, abort
-from routes import handle_error, admin_auth_required
+from werkzeug.utils import secure_filename
+from routes import handle_error, admin_auth_required, get_session_id, parse_ogr_progress
+from utils.jobs import get_job_manager, job_accepted, wants_async
+from utils.chunked_upload import get_upload_store
+from utils.cog import optimize_raster
+from utils.rat import parse_rat
+from utils.etags import bump_catalog_revision
+from utils.geoserver_client import get_geoserver_client
+from utils.raster_catalog import get_raster_catalog
+from utils.style_index import StyleCreationError, get_style_index, style_exists, style_hash
 
 # Create Blueprint
 raster_bp = Blueprint('raster_api', __name__, url_prefix='/api')
@@ -14,6 +23,166 @@ raster_bp = Blueprint('raster_api', __name__, url_prefix='/api')
 # Setup logger
 logger = logging.getLogger(__name__)
 
+class RasterPublishError(Exception):
+    """Exception raised when GeoServer rejects a step of a raster upload"""
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+def publish_raster(raster_path, workspace, store_name, layer_name, job=None):
+    """
+    Publish a GeoTIFF to GeoServer and read back its RAT, if any.
+
+    The raster is first converted to a Cloud-Optimized GeoTIFF in place. An
+    .aux.xml file next to the raster is picked up by GeoServer.
+
+    Args:
+        raster_path (str): Path of the GeoTIFF file
+        workspace (str): The GeoServer workspace name
+        store_name (str): The name for the new coverage store
+        layer_name (str): The name for the layer
+        job (Job): The background job publishing the raster, if any
+
+    Returns:
+        dict: The upload response document
+
+    Raises:
+        RasterPublishError: If GeoServer rejects a request
+    """
+    # Tiled, compressed and with overviews, so zoomed-out requests read little data
+    run_subprocess = None
+    if job is not None:
+        job.update(progress=0.0, message="Converting raster to Cloud-Optimized GeoTIFF")
+        def run_subprocess(command, timeout):
+            return job.run_subprocess(command, timeout=timeout, parse_progress=parse_ogr_progress)
+    optimization = optimize_raster(raster_path, run_subprocess=run_subprocess)
+    if job is not None:
+        job.update(message="Publishing raster to GeoServer")
+    
+    # One pooled client, so the calls below reuse the same connection
+    client = get_geoserver_client()
+    
+    # Create the coverage store
+    create_store_url = f"/rest/workspaces/{workspace}/coveragestores"
+    
+    # Use file upload approach - first create the store
+    store_data = {
+        'coverageStore': {
+            'name': store_name,
+            'type': 'GeoTIFF',
+            'enabled': True,
+            'workspace': {
+                'name': workspace
+            }
+        }
+    }
+    
+    response = client.post(
+        create_store_url,
+        'create_coveragestore',
+        json=store_data
+    )
+    
+    if not response.ok:
+        raise RasterPublishError(f'Failed to create coverage store: {response.text}', response.status_code)
+    
+    # Now upload the file to the store
+    upload_url = f"/rest/workspaces/{workspace}/coveragestores/{store_name}/file.geotiff"
+    
+    upload_started = time.monotonic()
+    with open(raster_path, 'rb') as f:
+        response = client.put(
+            upload_url,
+            'upload_coverage',
+            data=f,
+            headers={
+                'Content-type': 'application/octet-stream'
+            },
+            timeout=(client.timeout[0], current_app.config["GEOSERVER_UPLOAD_TIMEOUT"])
+        )
+    
+    if not response.ok:
+        raise RasterPublishError(f'Failed to upload raster file: {response.text}', response.status_code)
+    if optimization is not None:
+        optimization['upload_seconds'] = round(time.monotonic() - upload_started, 3)
+    
+    # Create the layer if a different name is specified
+    if layer_name != store_name:
+        create_layer_url = f"/rest/workspaces/{workspace}/coveragestores/{store_name}/coverages"
+        
+        layer_data = {
+            'coverage': {
+                'name': layer_name,
+                'nativeName': store_name,
+                'title': layer_name,
+                'enabled': True
+            }
+        }
+        
+        response = client.post(
+            create_layer_url,
+            'create_coverage',
+            json=layer_data
+        )
+        
+        if not response.ok:
+            raise RasterPublishError(f'Failed to create layer: {response.text}', response.status_code)
+    
+    # Layer lists served with ETags or from the raster catalog must be revalidated
+    bump_catalog_revision()
+    get_raster_catalog().invalidate(workspace)
+    
+    # Check for RAT data by querying the PAM endpoint
+    rat_info = {}
+    rat_detected = False
+    
+    try:
+        # Only the first rows are returned; the rest can be paged through /api/rat
+        rat_info = read_rat(workspace, store_name, layer_name,
+                            limit=current_app.config["RAT_PREVIEW_ROWS"]) or {}
+        rat_detected = bool(rat_info)
+    except Exception as e:
+        logger.warning(f"Error checking for RAT data: {str(e)}")
+        # Continue even if RAT check fails
+    
+    return {
+        'success': True,
+        'message': 'Raster uploaded and published successfully',
+        'workspace': workspace,
+        'store_name': store_name,
+        'layer_name': layer_name,
+        'rat_detected': rat_detected,
+        'rat_data': rat_info,
+        'optimization': optimization
+    }
+
+def save_raster_files(raster_file, aux_file, target_dir):
+    """
+    Save an uploaded raster, and its optional .aux.xml, into a directory.
+
+    Args:
+        raster_file: The uploaded GeoTIFF
+        aux_file: The uploaded .aux.xml file, or None
+        target_dir (str): Directory to save into
+
+    Returns:
+        str: Path of the saved raster
+    """
+    raster_path = os.path.join(target_dir, secure_filename(raster_file.filename))
+    raster_file.save(raster_path)
+    
+    # If aux file provided, save it with the correct name
+    if aux_file and aux_file.filename.lower().endswith('.aux.xml'):
+        aux_path = os.path.splitext(raster_path)[0] + '.aux.xml'
+        aux_file.save(aux_path)
+    return raster_path
+
+def run_upload_raster_job(job):
+    """Publish a raster saved in the job directory (job kind 'upload_raster')."""
+    params = job.params
+    return publish_raster(os.path.join(job.dir, params['filename']), params['workspace'],
+                          params['store_name'], params['layer_name'], job=job)
+
 @raster_bp.route('/upload_raster', methods=['POST'])
 @admin_auth_required
 @handle_error
@@ -27,6 +196,7 @@ def upload_raster():
     - workspace: The GeoServer workspace name
     - store_name: The name for the new coverage store
     - layer_name: (optional) The name for the layer, defaults to store_name
+    - async: (optional) "1" to publish in a background job and return its ID
     """
     try:
         # Check if file was included
@@ -62,122 +232,28 @@ def upload_raster():
                 'message': 'Workspace and store name are required'
             }), 400
         
+        if wants_async():
+            manager = get_job_manager()
+            job = manager.prepare('upload_raster', {
+                'filename': secure_filename(raster_file.filename),
+                'workspace': workspace,
+                'store_name': store_name,
+                'layer_name': layer_name,
+            }, owner=get_session_id(create=True))
+            save_raster_files(raster_file, aux_file, job.dir)
+            manager.start(job)
+            return job_accepted(job)
+        
         # Save the files to a temporary directory
         with tempfile.TemporaryDirectory() as temp_dir:
-            # Save the raster file
-            raster_path = os.path.join(temp_dir, raster_file.filename)
-            raster_file.save(raster_path)
-            
-            # If aux file provided, save it with the correct name
-            aux_path = None
-            if aux_file and aux_file.filename.lower().endswith('.aux.xml'):
-                aux_path = os.path.join(temp_dir, os.path.splitext(raster_file.filename)[0] + '.aux.xml')
-                aux_file.save(aux_path)
-            
-            # Upload the raster to GeoServer
-            geoserver_url = current_app.config.get("GEOSERVER_URL", "http://conescout.duckdns.org/geoserver")
-            geoserver_user = current_app.config.get("GEOSERVER_USER", "admin")
-            geoserver_pass = current_app.config.get("GEOSERVER_PASS", "geoserver")
-            
-            # Create the coverage store
-            create_store_url = f"{geoserver_url}/rest/workspaces/{workspace}/coveragestores"
-            
-            # Use file upload approach - first create the store
-            store_data = {
-                'coverageStore': {
-                    'name': store_name,
-                    'type': 'GeoTIFF',
-                    'enabled': True,
-                    'workspace': {
-                        'name': workspace
-                    }
-                }
-            }
-            
-            response = requests.post(
-                create_store_url,
-                json=store_data,
-                auth=(geoserver_user, geoserver_pass)
-            )
-            
-            if not response.ok:
-                return jsonify({
-                    'success': False,
-                    'message': f'Failed to create coverage store: {response.text}'
-                }), response.status_code
-            
-            # Now upload the file to the store
-            upload_url = f"{geoserver_url}/rest/workspaces/{workspace}/coveragestores/{store_name}/file.geotiff"
-            
-            with open(raster_path, 'rb') as f:
-                response = requests.put(
-                    upload_url,
-                    data=f,
-                    headers={
-                        'Content-type': 'application/octet-stream'
-                    },
-                    auth=(geoserver_user, geoserver_pass)
-                )
-            
-            if not response.ok:
+            raster_path = save_raster_files(raster_file, aux_file, temp_dir)
+            try:
+                return jsonify(publish_raster(raster_path, workspace, store_name, layer_name))
+            except RasterPublishError as e:
                 return jsonify({
                     'success': False,
-                    'message': f'Failed to upload raster file: {response.text}'
-                }), response.status_code
-            
-            # Create the layer if a different name is specified
-            if layer_name != store_name:
-                create_layer_url = f"{geoserver_url}/rest/workspaces/{workspace}/coveragestores/{store_name}/coverages"
-                
-                layer_data = {
-                    'coverage': {
-                        'name': layer_name,
-                        'nativeName': store_name,
-                        'title': layer_name,
-                        'enabled': True
-                    }
-                }
-                
-                response = requests.post(
-                    create_layer_url,
-                    json=layer_data,
-                    auth=(geoserver_user, geoserver_pass)
-                )
-                
-                if not response.ok:
-                    return jsonify({
-                        'success': False,
-                        'message': f'Failed to create layer: {response.text}'
-                    }), response.status_code
-            
-            # Check for RAT data by querying the PAM endpoint
-            rat_info = {}
-            rat_detected = False
-            
-            try:
-                pam_url = f"{geoserver_url}/rest/workspaces/{workspace}/coveragestores/{store_name}/coverages/{layer_name}/pam"
-                pam_response = requests.get(
-                    pam_url,
-                    auth=(geoserver_user, geoserver_pass)
-                )
-                
-                if pam_response.ok:
-                    # Parse the XML to extract RAT information
-                    rat_info = parse_pam_xml(pam_response.text)
-                    rat_detected = bool(rat_info)
-            except Exception as e:
-                logger.warning(f"Error checking for RAT data: {str(e)}")
-                # Continue even if RAT check fails
-            
-            return jsonify({
-                'success': True,
-                'message': 'Raster uploaded and published successfully',
-                'workspace': workspace,
-                'store_name': store_name,
-                'layer_name': layer_name,
-                'rat_detected': rat_detected,
-                'rat_data': rat_info
-            })
+                    'message': str(e)
+                }), e.status_code
     except Exception as e:
         logger.error(f"Error uploading raster: {str(e)}\n{traceback.format_exc()}")
         return jsonify({
@@ -185,6 +261,124 @@ def upload_raster():
             'message': f'Failed to upload raster: {str(e)}'
         }), 500
 
+@raster_bp.route('/uploads', methods=['POST'])
+@admin_auth_required
+@handle_error
+def create_upload():
+    """
+    Start a resumable chunked raster upload.
+    
+    Expects JSON with:
+    - filename: Name of the GeoTIFF file
+    - size: Size of the file in bytes
+    
+    The response gives the upload ID and the chunk size to PUT the file with.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename.lower().endswith(('.tif', '.tiff', '.geotiff')):
+        return jsonify({
+            'success': False,
+            'message': 'A GeoTIFF file name is required'
+        }), 400
+    
+    upload = get_upload_store().create(filename, data.get('size'), owner=get_session_id(create=True))
+    return jsonify({'success': True, **upload.to_dict()}), 201
+
+@raster_bp.route('/uploads/<upload_id>', methods=['GET'])
+@admin_auth_required
+@handle_error
+def get_upload(upload_id):
+    """
+    Get the chunks received so far, to resume an interrupted upload.
+    """
+    upload = get_upload_store().get(upload_id, owner=get_session_id())
+    return jsonify({'success': True, **upload.to_dict()})
+
+@raster_bp.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@admin_auth_required
+@handle_error
+def put_upload_chunk(upload_id, index):
+    """
+    Store one chunk of an upload.
+    
+    The body is the raw chunk and the X-Chunk-SHA256 header its hex SHA-256.
+    A chunk may be sent again; a corrupt chunk is rejected with 422.
+    """
+    upload = get_upload_store().get(upload_id, owner=get_session_id())
+    upload.write_chunk(index, request.stream, request.content_length or 0,
+                       request.headers.get('X-Chunk-SHA256'))
+    return jsonify({
+        'success': True,
+        'index': index,
+        'received': len(upload.received),
+        'chunks': upload.chunks,
+        'complete': upload.complete
+    })
+
+@raster_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@admin_auth_required
+@handle_error
+def delete_upload(upload_id):
+    """
+    Abandon an upload and delete its data.
+    """
+    get_upload_store().get(upload_id, owner=get_session_id()).delete()
+    return jsonify({'success': True})
+
+@raster_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@admin_auth_required
+@handle_error
+def complete_upload(upload_id):
+    """
+    Publish a completed chunked upload to GeoServer.
+    
+    Expects a form with the fields of ``upload_raster`` (workspace,
+    store_name, layer_name, async and an optional aux_file) except the
+    raster itself. The staging file is streamed to GeoServer as is.
+    """
+    upload = get_upload_store().get(upload_id, owner=get_session_id())
+    
+    workspace = request.form.get('workspace')
+    store_name = request.form.get('store_name')
+    layer_name = request.form.get('layer_name') or store_name
+    if not workspace or not store_name:
+        return jsonify({
+            'success': False,
+            'message': 'Workspace and store name are required'
+        }), 400
+    
+    raster_path = upload.finish(upload.filename)
+    aux_file = request.files.get('aux_file')
+    if aux_file and aux_file.filename.lower().endswith('.aux.xml'):
+        aux_file.save(os.path.splitext(raster_path)[0] + '.aux.xml')
+    
+    if wants_async():
+        manager = get_job_manager()
+        job = manager.prepare('upload_raster', {
+            'filename': upload.filename,
+            'workspace': workspace,
+            'store_name': store_name,
+            'layer_name': layer_name,
+        }, owner=get_session_id(create=True))
+        # A rename when uploads and jobs share a file system
+        for name in os.listdir(upload.dir):
+            if name == upload.filename or name.endswith('.aux.xml'):
+                shutil.move(os.path.join(upload.dir, name), os.path.join(job.dir, name))
+        upload.delete()
+        manager.start(job)
+        return job_accepted(job)
+    
+    try:
+        return jsonify(publish_raster(raster_path, workspace, store_name, layer_name))
+    except RasterPublishError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), e.status_code
+    finally:
+        upload.delete()
+
 @raster_bp.route('/generate_rat_style', methods=['POST'])
 @admin_auth_required
 @handle_error
@@ -219,44 +413,52 @@ def generate_rat_style():
         style_name = data.get('styleName')
         
         # Generate style using the RAT API
-        geoserver_url = current_app.config.get("GEOSERVER_URL", "http://conescout.duckdns.org/geoserver")
-        geoserver_user = current_app.config.get("GEOSERVER_USER", "admin")
-        geoserver_pass = current_app.config.get("GEOSERVER_PASS", "geoserver")
-        
-        rat_url = f"{geoserver_url}/rest/workspaces/{workspace}/coveragestores/{store}/coverages/{coverage}/pam"
+        client = get_geoserver_client()
         
-        # Construct query parameters
-        params = {
-            'band': band,
-            'classification': classification
-        }
+        rat_url = f"/rest/workspaces/{workspace}/coveragestores/{store}/coverages/{coverage}/pam"
         
-        if style_name:
-            params['styleName'] = style_name
+        def create():
+            # Construct query parameters
+            params = {
+                'band': band,
+                'classification': classification
+            }
             
-        # Make the POST request to generate the style
-        response = requests.post(
-            rat_url,
-            params=params,
-            auth=(geoserver_user, geoserver_pass)
-        )
+            if style_name:
+                params['styleName'] = style_name
+                
+            # Make the POST request to generate the style
+            response = client.post(
+                rat_url,
+                'generate_rat_style',
+                params=params
+            )
+            
+            if not response.ok:
+                raise StyleCreationError(f'Failed to generate style: {response.text}', response.status_code)
+            
+            # Get the style name from the response Location header
+            location = response.headers.get('Location')
+            generated_style_name = style_name
+            
+            if location:
+                # Extract style name from the Location URL
+                parts = location.split('/')
+                generated_style_name = parts[-1]
+            return generated_style_name, workspace
         
-        if not response.ok:
+        # Identical requests reuse the style generated the first time
+        digest = style_hash({'workspace': workspace, 'store': store, 'coverage': coverage,
+                             'band': band, 'classification': classification})
+        try:
+            generated_style_name, reused = get_style_index().get_or_create(digest, create, style_exists)
+        except StyleCreationError as e:
             return jsonify({
-                'error': f'Failed to generate style: {response.text}'
-            }), response.status_code
-        
-        # Get the style name from the response Location header
-        location = response.headers.get('Location')
-        generated_style_name = style_name
-        
-        if location:
-            # Extract style name from the Location URL
-            parts = location.split('/')
-            generated_style_name = parts[-1]
+                'error': str(e)
+            }), e.status_code
         
         # Apply the style to the layer
-        layer_url = f"{geoserver_url}/rest/layers/{workspace}:{coverage}"
+        layer_url = f"/rest/layers/{workspace}:{coverage}"
         layer_data = {
             'layer': {
                 'defaultStyle': {
@@ -265,10 +467,10 @@ def generate_rat_style():
             }
         }
         
-        response = requests.put(
+        response = client.put(
             layer_url,
-            json=layer_data,
-            auth=(geoserver_user, geoserver_pass)
+            'set_layer_style',
+            json=layer_data
         )
         
         if not response.ok:
@@ -277,8 +479,9 @@ def generate_rat_style():
             }), response.status_code
         
         return jsonify({
-            'message': 'Style generated and applied successfully',
-            'styleName': generated_style_name
+            'message': 'Existing style applied successfully' if reused else 'Style generated and applied successfully',
+            'styleName': generated_style_name,
+            'reused': reused
         })
         
     except Exception as e:
@@ -287,89 +490,83 @@ def generate_rat_style():
             'error': f'Failed to generate style: {str(e)}'
         }), 500
 
-def parse_pam_xml(xml_text):
+def read_rat(workspace, store, coverage, columns=None, offset=0, limit=None):
     """
-    Parse the PAM XML to extract RAT information
-    
+    Read the raster attribute tables of a coverage from its PAM document.
+
+    The document is parsed while it is downloaded from GeoServer.
+
     Args:
-        xml_text (str): XML content from PAM endpoint
-        
+        workspace (str): GeoServer workspace name
+        store (str): Coverage store name
+        coverage (str): Coverage name
+        columns (list): Names of the columns to return values of, None for all
+        offset (int): Index of the first row to return
+        limit (int): Number of rows to return, at most RAT_MAX_ROWS
+
     Returns:
-        dict: Structured RAT data by band
+        dict: Columnar RAT document by band, or None if the coverage has no PAM document
+    """
+    pam_url = f"/rest/workspaces/{workspace}/coveragestores/{store}/coverages/{coverage}/pam"
+    response = get_geoserver_client().get(pam_url, 'get_pam', stream=True)
+    with response:
+        if not response.ok:
+            return None
+        response.raw.decode_content = True
+        tables = parse_rat(response.raw, columns=columns, offset=offset, limit=limit,
+                           max_rows=current_app.config["RAT_MAX_ROWS"])
+    return {band: table.to_dict() for band, table in tables.items()}
+
+@raster_bp.route('/rat', methods=['GET'])
+@admin_auth_required
+@handle_error
+def get_rat():
+    """
+    Get rows of the raster attribute tables of a coverage.
+    
+    Query parameters:
+    - workspace, store, coverage: The coverage
+    - band: (optional) Only return the table of this band
+    - columns: (optional) Comma-separated columns to return values of
+    - offset, limit: (optional) Window of rows, limit at most RAT_MAX_ROWS
     """
+    workspace = request.args.get('workspace')
+    store = request.args.get('store')
+    coverage = request.args.get('coverage')
+    if not workspace or not store or not coverage:
+        return jsonify({
+            'success': False,
+            'message': 'Workspace, store and coverage are required'
+        }), 400
     try:
-        # Parse XML
-        root = ET.fromstring(xml_text)
-        
-        # Find all RAT elements
-        rat_data = {}
-        
-        # Find all PAMRasterBand elements
-        for band_idx, band_elem in enumerate(root.findall('.//PAMRasterBand')):
-            band_index = band_elem.get('band', str(band_idx))
-            
-            # Find the RAT element within this band
-            rat_elem = band_elem.find('./GDALRasterAttributeTable')
-            if rat_elem is None:
-                continue
-                
-            # Find all column definitions
-            columns = {}
-            for col_elem in rat_elem.findall('./FieldDefn'):
-                col_index = col_elem.get('index')
-                col_name = col_elem.findtext('./Name')
-                col_type = col_elem.findtext('./Type')
-                col_usage = col_elem.findtext('./Usage')
-                
-                if col_name:
-                    columns[col_name] = {
-                        'index': col_index,
-                        'type': col_type,
-                        'usage': col_usage
-                    }
-            
-            # Find all row values
-            rows = []
-            for row_elem in rat_elem.findall('./Row'):
-                row_index = int(row_elem.get('index', 0))
-                row_data = {'value': row_index}
-                
-                for field_elem in row_elem.findall('./F'):
-                    field_index = int(field_elem.get('index', 0))
-                    field_value = field_elem.text
-                    
-                    # Find the column name for this index
-                    col_name = None
-                    for name, info in columns.items():
-                        if info.get('index') == str(field_index):
-                            col_name = name
-                            break
-                    
-                    if col_name:
-                        # Try to convert numeric values
-                        try:
-                            if columns[col_name].get('type') == 'Integer':
-                                field_value = int(field_value)
-                            elif columns[col_name].get('type') == 'Real':
-                                field_value = float(field_value)
-                        except (ValueError, TypeError):
-                            pass  # Keep as string
-                        
-                        row_data[col_name] = field_value
-                
-                rows.append(row_data)
-            
-            # Store the RAT data for this band
-            rat_data[band_index] = {
-                'columns': columns,
-                'rows': rows
-            }
-        
-        return rat_data
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'Offset and limit must be integers'
+        }), 400
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({
+            'success': False,
+            'message': 'Offset and limit must not be negative'
+        }), 400
+    columns = request.args.get('columns')
+    columns = [name.strip() for name in columns.split(',') if name.strip()] if columns else None
     
-    except Exception as e:
-        logger.error(f"Error parsing PAM XML: {str(e)}\n{traceback.format_exc()}")
-        return {}
+    rat_data = read_rat(workspace, store, coverage, columns=columns, offset=offset, limit=limit)
+    if rat_data is None:
+        return jsonify({
+            'success': False,
+            'message': f'No PAM document found for {workspace}:{coverage}'
+        }), 404
+    band = request.args.get('band')
+    if band is not None:
+        rat_data = {band: rat_data[band]} if band in rat_data else {}
+    return jsonify({
+        'success': True,
+        'rat_data': rat_data
+    })
 
 def register_routes(app):
     """
@@ -379,3 +576,4 @@ def register_routes(app):
         app: The Flask application instance.
     """
     app.register_blueprint(raster_bp)
+    app.extensions['job_manager'].register('upload_raster', run_upload_raster_job)
@@ -4,6 +4,9 @@ import jsonschema
 import time
 from flask import Blueprint, jsonify, request, current_app, abort
 from utils.file_lock import file_lock
+from utils.etags import conditional, catalog_revision
+from utils.layer_schema import get_layer_schema_cache
+from utils.raster_catalog import RasterCatalogError, get_raster_catalog
 
 # Create Blueprint
 species_bp = Blueprint('species_api', __name__, url_prefix='/api')
@@ -51,6 +54,16 @@ def get_species_config_path():
     else:
         return os.path.join(current_app.root_path, SPECIES_CONFIG_FILE)
 
+def species_config_version():
+    """
+    Gets the revision of the species configuration file, for ETags.
+    """
+    try:
+        stat = os.stat(get_species_config_path())
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
 def get_species_config():
     """
     Reads the species configuration from the JavaScript file
@@ -132,6 +145,11 @@ if (typeof module !== 'undefined' && module.exports) {{
             
             with open(config_path, 'w') as f:
                 f.write(js_str)
+        
+        # Have the schemas of the configured vector layers ready for the admin UI
+        layers = sorted({species['vectorLayer'] for species in config.values() if species.get('vectorLayer')})
+        if layers:
+            get_layer_schema_cache().refresh_in_background(current_app._get_current_object(), layers)
             
         return True
     except Exception as e:
@@ -139,6 +157,7 @@ if (typeof module !== 'undefined' && module.exports) {{
         return False
 
 @species_bp.route('/species', methods=['GET'])
+@conditional(species_config_version)
 def get_all_species():
     """
     Get all species
@@ -154,6 +173,7 @@ def get_all_species():
     return jsonify(species_list)
 
 @species_bp.route('/species/<species_id>', methods=['GET'])
+@conditional(species_config_version)
 def get_species(species_id):
     """
     Get a specific species
@@ -292,48 +312,71 @@ def toggle_species(species_id):
         current_app.logger.error(f"Error toggling species: {str(e)}")
         abort(500, description="An unexpected error occurred")
 
-@species_bp.route('/layer-info/<layer_name>', methods=['GET'])
-def get_layer_info(layer_name):
+def layer_info(schema):
     """
-    Get information about a layer from GeoServer
+    Build the layer-info response of a layer schema.
+    
+    ``attributes`` lists the attribute names and types in column order and
+    ``types`` maps each name to its type. Responses no longer carry the
+    ``properties`` of a sample feature; clients use the attribute names.
+    """
+    return {
+        'success': True,
+        'layer': schema['layer'],
+        'source': schema['source'],
+        'geometry': schema['geometry'],
+        'attributes': schema['attributes'],
+        'types': {attribute['name']: attribute['type'] for attribute in schema['attributes']}
+    }
+
+@species_bp.route('/layer-info', methods=['GET'])
+@conditional(catalog_revision)
+def get_layers_info():
+    """
+    Get information about several layers at once.
+    
+    Query parameters: ``layers``, a comma-separated list of layer names.
+    Unknown layers are listed in ``missing``.
     """
     try:
-        import requests
+        layers = list(dict.fromkeys(name.strip() for name in request.args.get('layers', '').split(',') if name.strip()))
+        if not layers:
+            return jsonify({'success': False, 'message': "Missing 'layers' parameter"}), 400
+        max_layers = current_app.config["LAYER_SCHEMA_BATCH_MAX"]
+        if len(layers) > max_layers:
+            return jsonify({'success': False, 'message': f"At most {max_layers} layers can be requested at once"}), 400
         
-        # Get GeoServer URL from app config
-        geoserver_url = current_app.config.get("GEOSERVER_URL", "http://conescout.duckdns.org/geoserver")
-        workspace = current_app.config.get("GEOSERVER_WORKSPACE", "SZEB_sample")
-        
-        # Construct WFS GetFeature request URL
-        wfs_url = f"{geoserver_url}/wfs?service=WFS&version=2.0.0&request=GetFeature&typeNames={workspace}:{layer_name}&outputFormat=application/json&count=1"
+        schemas = get_layer_schema_cache().get_many(layers)
         
-        # Fetch a sample feature
-        response = requests.get(wfs_url, timeout=10)
+        return jsonify({
+            'success': True,
+            'layers': {layer: layer_info(schemas[layer]) for layer in layers if layer in schemas},
+            'missing': [layer for layer in layers if layer not in schemas]
+        })
         
-        if not response.ok:
-            return jsonify({
-                'success': False,
-                'message': f"Failed to fetch layer info: {response.status_code} {response.reason}"
-            }), 400
-            
-        data = response.json()
+    except Exception as e:
+        current_app.logger.error(f"Error getting layers info: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f"An error occurred: {str(e)}"
+        }), 500
+
+@species_bp.route('/layer-info/<layer_name>', methods=['GET'])
+@conditional(catalog_revision)
+def get_layer_info(layer_name):
+    """
+    Get information about a layer from GeoServer
+    """
+    try:
+        schema = get_layer_schema_cache().get(layer_name)
         
-        if not data.get('features') or len(data['features']) == 0:
+        if schema is None:
             return jsonify({
                 'success': False,
-                'message': 'No features found in layer'
+                'message': f"Layer {layer_name} not found"
             }), 404
             
-        # Extract properties from the first feature
-        properties = {}
-        if data['features'][0].get('properties'):
-            properties = data['features'][0]['properties']
-            
-        return jsonify({
-            'success': True,
-            'layer': layer_name,
-            'properties': properties
-        })
+        return jsonify(layer_info(schema))
             
     except Exception as e:
         current_app.logger.error(f"Error getting layer info: {str(e)}")
@@ -342,43 +385,22 @@ def get_layer_info(layer_name):
             'message': f"An error occurred: {str(e)}"
         }), 500
 @species_bp.route('/raster-layers', methods=['GET'])
+@conditional(catalog_revision)
 def get_raster_layers():
     """
     Get list of available raster layers from GeoServer
     """
     try:
-        import requests
-        
-        # Get GeoServer URL from app config
-        geoserver_url = current_app.config.get("GEOSERVER_URL", "http://conescout.duckdns.org/geoserver")
         workspace = current_app.config.get("GEOSERVER_WORKSPACE", "SZEB_sample")
         
-        # Get list of coverages from GeoServer REST API
-        rest_url = f"{geoserver_url}/rest/workspaces/{workspace}/coveragestores.json"
-        response = requests.get(rest_url, auth=("admin", "geoserver"), timeout=10)
-        
-        if not response.ok:
+        # Served from the in-memory catalog, which lists the coverage stores concurrently
+        try:
+            all_coverages = get_raster_catalog().layers(workspace)
+        except RasterCatalogError as e:
             return jsonify({
                 'success': False,
-                'message': f"Failed to fetch coverage stores: {response.status_code} {response.reason}"
-            }), 400
-            
-        data = response.json()
-        
-        coverage_stores = []
-        if data.get('coverageStores') and data['coverageStores'].get('coverageStore'):
-            coverage_stores = [store['name'] for store in data['coverageStores']['coverageStore']]
-            
-        # For each coverage store, get the coverages
-        all_coverages = []
-        for store in coverage_stores:
-            store_url = f"{geoserver_url}/rest/workspaces/{workspace}/coveragestores/{store}/coverages.json"
-            store_response = requests.get(store_url, auth=("admin", "geoserver"), timeout=10)
-            
-            if store_response.ok:
-                store_data = store_response.json()
-                if store_data.get('coverages') and store_data['coverages'].get('coverage'):
-                    all_coverages.extend([coverage['name'] for coverage in store_data['coverages']['coverage']])
+                'message': str(e)
+            }), e.status_code
         
         return jsonify({
             'success': True,
@@ -0,0 +1,116 @@
+import logging
+import threading
+from flask import Blueprint, Response, jsonify, current_app
+from routes import handle_error
+from utils.db_pool import db_connection
+from utils.spatial_registry import CLIENT_SRID, get_spatial_registry
+from api.species_routes import get_species_config, get_species_config_path, species_config_version
+
+# Create Blueprint
+tile_bp = Blueprint('tile_api', __name__)
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+# Deepest zoom level served as vector tiles
+MAX_TILE_ZOOM = 22
+
+# Configured attributes per vector table, with the species config revision they were read at
+_attribute_cache = {}
+_attribute_cache_lock = threading.Lock()
+
+def get_species_attributes(vector_table):
+    """
+    Get the attribute names configured for the species using a vector table.
+
+    The species config is parsed once per table and read again only when
+    the file changes.
+
+    Args:
+        vector_table (str): Name of the vector table
+
+    Returns:
+        list: Attribute names in configuration order, without duplicates
+    """
+    key = (get_species_config_path(), vector_table)
+    version = species_config_version()
+    with _attribute_cache_lock:
+        cached = _attribute_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    attributes = []
+    for species in get_species_config().values():
+        layer = species.get('vectorLayer', '').split(':')[-1]
+        if layer != vector_table:
+            continue
+        for section in species.get('attributes', {}).values():
+            for name in section.get('items', {}):
+                if name not in attributes:
+                    attributes.append(name)
+    with _attribute_cache_lock:
+        _attribute_cache[key] = (version, attributes)
+    return attributes
+
+@tile_bp.route('/tiles/<vector_table>/<int:z>/<int:x>/<int:y>.pbf', methods=['GET'])
+@handle_error
+def get_vector_tile(vector_table, z, x, y):
+    """
+    Serve a Mapbox Vector Tile for a species vector table.
+
+    Only the attributes configured for the species in species_config.js are
+    included in the tile.
+    """
+    if z > MAX_TILE_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"status": "error", "message": "Invalid tile coordinates."}), 400
+
+    table = get_spatial_registry().vector_table(vector_table)
+    if table is None:
+        return jsonify({"status": "error", "message": f"Vector table '{vector_table}' does not exist."}), 400
+
+    # Project only configured attributes that actually exist in the table
+    attributes = [name for name in get_species_attributes(table.table) if name in table.attributes]
+    attribute_sql = ''.join(f', v."{name}"' for name in attributes)
+    geometry_sql = table.geometry_sql()
+    if table.srid == 0:
+        # Geometries without an SRID are taken to be EPSG:4326, as on the other geodata routes
+        tile_geometry_sql = f"ST_Transform(ST_SetSRID({geometry_sql}, {CLIENT_SRID}), 3857)"
+        bounds_sql = f"ST_SetSRID(ST_Transform(bounds.geom, {CLIENT_SRID}), 0)"
+    else:
+        tile_geometry_sql = f"ST_Transform({geometry_sql}, 3857)"
+        bounds_sql = f"ST_Transform(bounds.geom, {int(table.srid)})"
+
+    query = f"""
+        WITH bounds AS (
+            SELECT ST_TileEnvelope(%s, %s, %s) AS geom
+        ),
+        mvtgeom AS (
+            SELECT ST_AsMVTGeom({tile_geometry_sql}, bounds.geom) AS mvt_geom{attribute_sql}
+            FROM {table.qualified_name} v, bounds
+            WHERE ST_Intersects({geometry_sql}, {bounds_sql})
+        )
+        SELECT ST_AsMVT(mvtgeom, %s, 4096, 'mvt_geom')
+        FROM mvtgeom;
+    """
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        cur.execute(query, (z, x, y, table.table))
+        result = cur.fetchone()
+        cur.close()
+
+    tile = bytes(result[0]) if result and result[0] else b''
+    response = Response(tile, mimetype="application/vnd.mapbox-vector-tile")
+    if not tile:
+        response.status_code = 204
+    max_age = current_app.config["TILE_CACHE_MAX_AGE"]
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return response
+
+def register_routes(app):
+    """
+    Register the vector tile routes with the Flask app.
+
+    Args:
+        app: The Flask application instance.
+    """
+    app.register_blueprint(tile_bp)
@@ -0,0 +1,76 @@
+import json
+import logging
+from flask import Blueprint, Response, jsonify, request
+from routes import handle_error, get_session_id, get_roi_geometry
+from utils.db_pool import db_connection
+from utils.result_cache import get_result_cache, roi_hash, table_data_version
+from utils.spatial_registry import get_spatial_registry
+from utils.zonal_stats import compute_zonal_stats
+
+# Create Blueprint
+zonal_bp = Blueprint('zonal_api', __name__, url_prefix='/api')
+
+# Setup logger
+logger = logging.getLogger(__name__)
+
+@zonal_bp.route('/roi/zonal_stats', methods=['GET'])
+@handle_error
+def get_zonal_stats():
+    """
+    Summarize a species raster inside the current ROI.
+
+    Returns per-class pixel counts and areas plus summary statistics of one
+    raster band; ``area_unavailable`` says why areas are missing, if they are.
+    Results are cached per ROI and raster data version.
+    """
+    raster_table = request.args.get('raster')
+    if not raster_table:
+        return jsonify({"status": "error", "message": "Raster table not specified."}), 400
+    try:
+        band = int(request.args.get('band', 1))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Band must be an integer."}), 400
+    if band < 1:
+        return jsonify({"status": "error", "message": "Band must be 1 or greater."}), 400
+
+    roi_geojson = get_roi_geometry()
+    if not roi_geojson:
+        return jsonify({"status": "error", "message": "No ROI available."}), 404
+
+    table = get_spatial_registry().raster_table(raster_table)
+    if table is None:
+        return jsonify({"status": "error", "message": f"Raster table '{raster_table}' not found."}), 400
+
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        version = table_data_version(cur, table.schema, table.table)
+        cur.close()
+
+    # v2 entries carry areas of geographic rasters
+    cache_entry = get_result_cache().entry(table.table, roi_hash(roi_geojson), version,
+                                           f"zonal_stats_v2_b{band}")
+    cached = cache_entry.read() if cache_entry is not None else None
+    if cached is not None:
+        response = Response(cached, mimetype="application/json")
+        response.headers["X-Cache"] = "HIT"
+        return response
+
+    stats = compute_zonal_stats(table, get_session_id(), roi_geojson, band=band)
+    if stats is None:
+        return jsonify({"status": "error", "message": "No raster intersection found."}), 404
+
+    body = json.dumps({"status": "success", "raster": table.table, "band": band, **stats})
+    if cache_entry is not None:
+        cache_entry.write(body)
+    response = Response(body, mimetype="application/json")
+    response.headers["X-Cache"] = "MISS"
+    return response
+
+def register_routes(app):
+    """
+    Register the zonal statistics routes with the Flask app.
+
+    Args:
+        app: The Flask application instance.
+    """
+    app.register_blueprint(zonal_bp)
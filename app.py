@@ -1,7 +1,18 @@
 import os
+import tempfile
 from flask import Flask
 from flask_wtf.csrf import CSRFProtect
 from routes import setup_routes
+from utils.db_pool import init_db_pools
+from utils.result_cache import init_result_cache, init_result_cache_commands
+from utils.spatial_registry import init_spatial_registry
+from utils.roi_store import schedule_roi_sweeper
+from utils.jobs import init_job_manager, resume_jobs
+from utils.compression import init_compression
+from utils.style_index import init_style_commands
+from utils.geoserver_client import init_geoserver_client
+from utils.raster_catalog import init_raster_catalog
+from utils.layer_schema import init_layer_schema_cache
 from prometheus_client import Counter, Histogram
 import logging
 
@@ -17,6 +28,18 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Metrics, registered once per process so create_app can be called again (e.g. by tests)
+endpoint_requests = Counter('endpoint_requests', 'Total requests per endpoint', ['endpoint'])
+endpoint_latency = Histogram('endpoint_latency_seconds', 'Response time per endpoint', ['endpoint'])
+endpoint_clicks = Counter('endpoint_clicks', 'Total clicks per endpoint', ['endpoint'])
+species_selection_counter = Counter('species_selections', 'Number of times each species is selected', ['species'])
+attribute_selection_counter = Counter('attribute_selections', 'Number of times each attribute is selected', ['attribute'])
+species_duration_histogram = Histogram('species_duration_seconds', 'Time spent on each species', ['species'])
+attribute_duration_histogram = Histogram('attribute_duration_seconds', 'Time spent on each attribute', ['attribute'])
+user_locations = Counter('unique_user_locations', 'Unique user locations', ['latitude', 'longitude'])
+error_counter = Counter('endpoint_errors', 'Total errors per endpoint and status code', ['endpoint', 'status_code'])
+
+
 def create_app(test_dir=None):
     """Create and configure the Flask application instance."""
     app = Flask(__name__)
@@ -31,6 +54,127 @@ def create_app(test_dir=None):
     app.config["GEOSERVER_WORKSPACE"] = os.environ.get('GEOSERVER_WORKSPACE', "SZEB_sample")
     app.config["GEOSERVER_USER"] = os.environ.get('GEOSERVER_USER', "admin")
     app.config["GEOSERVER_PASS"] = os.environ.get('GEOSERVER_PASS', "geoserver")
+    # Shared GeoServer client: pool size, timeouts (seconds) and retries of idempotent calls
+    app.config["GEOSERVER_POOL_SIZE"] = int(os.environ.get('GEOSERVER_POOL_SIZE', 10))
+    app.config["GEOSERVER_CONNECT_TIMEOUT"] = float(os.environ.get('GEOSERVER_CONNECT_TIMEOUT', 5))
+    app.config["GEOSERVER_READ_TIMEOUT"] = float(os.environ.get('GEOSERVER_READ_TIMEOUT', 30))
+    app.config["GEOSERVER_UPLOAD_TIMEOUT"] = float(os.environ.get('GEOSERVER_UPLOAD_TIMEOUT', 600))
+    app.config["GEOSERVER_RETRIES"] = int(os.environ.get('GEOSERVER_RETRIES', 3))
+    app.config["GEOSERVER_RETRY_BACKOFF"] = float(os.environ.get('GEOSERVER_RETRY_BACKOFF', 0.5))
+    
+    # PostGIS connection settings, one pool per logical database
+    app.config["POSTGIS_HOST"] = os.environ.get('POSTGIS_HOST', "postgis")
+    app.config["POSTGIS_PORT"] = os.environ.get('POSTGIS_PORT', "5432")
+    app.config["POSTGIS_USER"] = os.environ.get('POSTGIS_USER', "geoserver")
+    app.config["POSTGIS_PASSWORD"] = os.environ.get('POSTGIS_PASSWORD', "23vmoWpostgis")
+    app.config["DB_POOLS"] = {
+        'roi_db': os.environ.get('ROI_DB_NAME', "roi_db"),
+        'geoserver_db': os.environ.get('GEOSERVER_DB_NAME', "geoserver_db"),
+    }
+    app.config["DB_POOL_MAX_CONNECTIONS"] = int(os.environ.get('DB_POOL_MAX_CONNECTIONS', 5))
+    app.config["DB_POOL_TIMEOUT"] = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+    app.config["DB_POOL_HEALTH_CHECK_INTERVAL"] = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+    app.config["DB_CONNECT_TIMEOUT"] = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+    
+    # Rows fetched per round trip when streaming feature exports
+    app.config["EXPORT_BATCH_SIZE"] = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+    # Maximum run time of an ogr2ogr export, in seconds
+    app.config["EXPORT_TIMEOUT"] = int(os.environ.get('EXPORT_TIMEOUT', 300))
+    
+    # Disk-backed cache of ROI download results
+    app.config["RESULT_CACHE_DIR"] = os.environ.get('RESULT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'szeb_result_cache'))
+    app.config["RESULT_CACHE_MAX_BYTES"] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+    
+    # Seconds between background reloads of the spatial table registry (0 disables)
+    app.config["SPATIAL_REGISTRY_REFRESH_INTERVAL"] = float(os.environ.get('SPATIAL_REGISTRY_REFRESH_INTERVAL', 300))
+    
+    # Per-session ROIs expire after ROI_TTL_HOURS; the sweeper runs every ROI_SWEEP_INTERVAL seconds
+    app.config["ROI_TTL_HOURS"] = float(os.environ.get('ROI_TTL_HOURS', 24))
+    app.config["ROI_SWEEP_INTERVAL"] = float(os.environ.get('ROI_SWEEP_INTERVAL', 3600))
+    # ROIs are split into parts of at most ROI_SUBDIVIDE_MAX_VERTICES vertices for intersections;
+    # ROI_DISPLAY_TOLERANCE (degrees, 0 = off) simplifies the copy returned by /get_roi
+    app.config["ROI_SUBDIVIDE_MAX_VERTICES"] = int(os.environ.get('ROI_SUBDIVIDE_MAX_VERTICES', 256))
+    app.config["ROI_DISPLAY_TOLERANCE"] = float(os.environ.get('ROI_DISPLAY_TOLERANCE', 0))
+    # Largest raster clip (in output pixels) that can be downloaded, 0 = no cap
+    app.config["RASTER_CLIP_MAX_PIXELS"] = int(os.environ.get('RASTER_CLIP_MAX_PIXELS', 25_000_000))
+    # Background jobs: JOB_WORKERS run at once, finished jobs are kept JOB_RESULT_TTL_HOURS
+    app.config["JOBS_DIR"] = os.environ.get('JOBS_DIR', os.path.join(tempfile.gettempdir(), 'szeb_jobs'))
+    app.config["JOB_WORKERS"] = int(os.environ.get('JOB_WORKERS', 2))
+    app.config["JOB_RESULT_TTL_HOURS"] = float(os.environ.get('JOB_RESULT_TTL_HOURS', 24))
+    app.config["JOB_SWEEP_INTERVAL"] = float(os.environ.get('JOB_SWEEP_INTERVAL', 3600))
+    # Per-route statement_timeout budgets in milliseconds (0 = no limit). Override with
+    # STATEMENT_TIMEOUTS="download_map_view=10000,download_roi_intersection=90000"
+    statement_timeouts = {
+        'download_map_view': 15000,
+        'download_roi_intersection': 60000,
+        'download_raster_intersection': 120000,
+        'zonal_api.get_zonal_stats': 60000,
+        'tile_api.get_vector_tile': 5000,
+        # Background jobs and sweepers run outside requests and are not limited
+        'background': 0,
+    }
+    for item in filter(None, os.environ.get('STATEMENT_TIMEOUTS', '').split(',')):
+        route, _, budget = item.partition('=')
+        statement_timeouts[route.strip()] = int(budget)
+    app.config["STATEMENT_TIMEOUTS"] = statement_timeouts
+    app.config["STATEMENT_TIMEOUT_DEFAULT"] = int(os.environ.get('STATEMENT_TIMEOUT_DEFAULT', 30000))
+    # Page sizes of the keyset-paginated feature API
+    app.config["FEATURE_PAGE_DEFAULT_SIZE"] = int(os.environ.get('FEATURE_PAGE_DEFAULT_SIZE', 500))
+    app.config["FEATURE_PAGE_MAX_SIZE"] = int(os.environ.get('FEATURE_PAGE_MAX_SIZE', 2000))
+    # Values read for class breaks (tables with more rows are sampled); Jenks uses a smaller subsample
+    app.config["CLASSIFY_SAMPLE_SIZE"] = int(os.environ.get('CLASSIFY_SAMPLE_SIZE', 100000))
+    app.config["CLASSIFY_JENKS_MAX_VALUES"] = int(os.environ.get('CLASSIFY_JENKS_MAX_VALUES', 2000))
+    # Connection limits of the async read path served by asgi.py
+    app.config["ASYNC_DB_POOL_MAX_CONNECTIONS"] = int(os.environ.get('ASYNC_DB_POOL_MAX_CONNECTIONS', 10))
+    # Threads per worker process running the Flask requests asgi.py passes on
+    app.config["FLASK_THREADS"] = int(os.environ.get('FLASK_THREADS', 16))
+    
+    # gzip/brotli compression of text and JSON responses of at least COMPRESSION_MIN_SIZE bytes
+    app.config["COMPRESSION_ENABLED"] = os.environ.get('COMPRESSION_ENABLED', 'True').lower() in ('true', '1', 't')
+    app.config["COMPRESSION_MIN_SIZE"] = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    app.config["COMPRESSION_LEVEL"] = int(os.environ.get('COMPRESSION_LEVEL', 6))
+    
+    # ETags of GeoServer layer lists change when this app edits the catalog, or at the latest
+    # every CATALOG_REVISION_TTL seconds to pick up changes made in GeoServer directly (0 = never)
+    app.config["CATALOG_REVISION_FILE"] = os.environ.get('CATALOG_REVISION_FILE', os.path.join(tempfile.gettempdir(), 'szeb_catalog_revision'))
+    app.config["CATALOG_REVISION_TTL"] = float(os.environ.get('CATALOG_REVISION_TTL', 300))
+    
+    # Resumable chunked raster uploads: staging files live in UPLOADS_DIR until published,
+    # or until UPLOAD_TTL_HOURS after their last chunk
+    app.config["UPLOADS_DIR"] = os.environ.get('UPLOADS_DIR', os.path.join(tempfile.gettempdir(), 'szeb_uploads'))
+    app.config["UPLOAD_CHUNK_SIZE"] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    app.config["UPLOAD_MAX_SIZE"] = int(os.environ.get('UPLOAD_MAX_SIZE', 50 * 1024 ** 3))
+    app.config["UPLOAD_TTL_HOURS"] = float(os.environ.get('UPLOAD_TTL_HOURS', 24))
+    
+    # Uploaded rasters are converted to tiled, compressed Cloud-Optimized GeoTIFFs with internal
+    # overviews before publishing (overviews of rasters with a RAT always use NEAREST)
+    app.config["RASTER_COG_ENABLED"] = os.environ.get('RASTER_COG_ENABLED', 'True').lower() in ('true', '1', 't')
+    app.config["RASTER_COG_COMPRESSION"] = os.environ.get('RASTER_COG_COMPRESSION', 'DEFLATE')
+    app.config["RASTER_COG_BLOCKSIZE"] = int(os.environ.get('RASTER_COG_BLOCKSIZE', 512))
+    app.config["RASTER_COG_RESAMPLING"] = os.environ.get('RASTER_COG_RESAMPLING', 'AVERAGE')
+    app.config["RASTER_COG_TIMEOUT"] = int(os.environ.get('RASTER_COG_TIMEOUT', 1800))
+    
+    # Raster attribute tables: at most RAT_MAX_ROWS rows are parsed per band and request,
+    # and raster upload responses include the first RAT_PREVIEW_ROWS
+    app.config["RAT_MAX_ROWS"] = int(os.environ.get('RAT_MAX_ROWS', 100000))
+    app.config["RAT_PREVIEW_ROWS"] = int(os.environ.get('RAT_PREVIEW_ROWS', 100))
+    
+    # Raster layer lists are served from memory for RASTER_CATALOG_TTL seconds, then refreshed in the
+    # background for RASTER_CATALOG_STALE_TTL more; RASTER_CATALOG_WORKERS stores are listed concurrently
+    app.config["RASTER_CATALOG_TTL"] = float(os.environ.get('RASTER_CATALOG_TTL', 60))
+    app.config["RASTER_CATALOG_STALE_TTL"] = float(os.environ.get('RASTER_CATALOG_STALE_TTL', 600))
+    app.config["RASTER_CATALOG_WORKERS"] = int(os.environ.get('RASTER_CATALOG_WORKERS', 8))
+    
+    # Layer schemas (attribute names and types) served by /api/layer-info are kept for LAYER_SCHEMA_TTL
+    # seconds; the batch form resolves at most LAYER_SCHEMA_BATCH_MAX layers per request
+    app.config["LAYER_SCHEMA_TTL"] = float(os.environ.get('LAYER_SCHEMA_TTL', 3600))
+    app.config["LAYER_SCHEMA_BATCH_MAX"] = int(os.environ.get('LAYER_SCHEMA_BATCH_MAX', 50))
+    
+    # Index of generated GeoServer styles by input hash, shared by all workers
+    app.config["STYLE_INDEX_FILE"] = os.environ.get('STYLE_INDEX_FILE', os.path.join(tempfile.gettempdir(), 'szeb_styles', 'style_index.json'))
+    
+    # Browser/proxy cache lifetime for vector tiles, in seconds
+    app.config["TILE_CACHE_MAX_AGE"] = int(os.environ.get('TILE_CACHE_MAX_AGE', 86400))
     
     # Log configuration
     logger.info(f"App configured with GEOSERVER_URL: {app.config['GEOSERVER_URL']}")
@@ -46,16 +190,18 @@ def create_app(test_dir=None):
     if test_dir:
         app.config["SPECIES_CONFIG_DIR"] = test_dir
     
-    # Metrics setup
-    endpoint_requests = Counter('endpoint_requests', 'Total requests per endpoint', ['endpoint'])
-    endpoint_latency = Histogram('endpoint_latency_seconds', 'Response time per endpoint', ['endpoint'])
-    endpoint_clicks = Counter('endpoint_clicks', 'Total clicks per endpoint', ['endpoint'])
-    species_selection_counter = Counter('species_selections', 'Number of times each species is selected', ['species'])
-    attribute_selection_counter = Counter('attribute_selections', 'Number of times each attribute is selected', ['attribute'])
-    species_duration_histogram = Histogram('species_duration_seconds', 'Time spent on each species', ['species'])
-    attribute_duration_histogram = Histogram('attribute_duration_seconds', 'Time spent on each attribute', ['attribute'])
-    user_locations = Counter('unique_user_locations', 'Unique user locations', ['latitude', 'longitude'])
-    error_counter = Counter('endpoint_errors', 'Total errors per endpoint and status code', ['endpoint', 'status_code'])
+    # Shared PostGIS connection pools
+    init_db_pools(app)
+    init_geoserver_client(app)
+    init_raster_catalog(app)
+    init_layer_schema_cache(app)
+    init_result_cache(app)
+    init_spatial_registry(app)
+    schedule_roi_sweeper(app)
+    init_job_manager(app)
+    init_compression(app)
+    init_style_commands(app)
+    init_result_cache_commands(app)
     
     # Add emergency login route
     @app.route('/emergency_login')
@@ -65,6 +211,9 @@ def create_app(test_dir=None):
     
     # Register routes
     setup_routes(app)
+
+    # Re-queue jobs left unfinished by a previous worker, now that all job kinds are registered
+    resume_jobs(app)
     
     return app
 
@@ -0,0 +1,565 @@
+"""
+ASGI entry point with an asynchronous read path.
+
+Read-only endpoints that spend their time waiting on PostGIS or GeoServer
+(/get_roi, /has_roi, GeoJSON /download_map_view, /api/layer-info and
+/api/raster-layers) are served here by coroutines using an asyncpg pool, so
+a slow query holds a connection but no thread. Raster layers come from the
+app's cached raster catalog, whose fetches of a cold cache run on a worker
+thread; like every GeoServer call, they go through the app's
+GeoServerClient, with its timeouts, retries and metrics.
+
+Every other request, and any read the async path cannot answer itself
+(another export format, a table not yet in the spatial registry, a missing
+ROI table, a layer schema not yet cached), is passed to the Flask app, which
+runs on a pool of FLASK_THREADS threads per process. When the client of a
+Flask request disconnects, the request's running PostGIS queries are
+cancelled and a streamed response is closed.
+
+Run with:
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000 asgi:application
+"""
+
+import re
+import sys
+import json
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qs
+
+import asyncpg
+from itsdangerous import BadSignature
+
+from app import app as flask_app
+from api.species_routes import layer_info
+from utils.db_pool import REQUEST_QUERIES_KEY, ClientDisconnected, RequestQueries, query_cancellations
+from utils.compression import asgi_compressing_send
+from utils.etags import catalog_changed_at, catalog_revision, make_etag, matching_etag
+from utils.feature_stream import feature_query
+from utils.raster_catalog import RasterCatalogError
+from utils.generalization import Generalization, InvalidGeneralization, parse_generalization
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Rows fetched from PostGIS per round trip when streaming features
+STREAM_PREFETCH = 500
+
+# Request bodies passed to the Flask app are spooled to disk beyond this size
+WSGI_BODY_MEMORY_LIMIT = 1024 * 1024
+
+
+class Fallback(Exception):
+    """Raised by an async handler to let the Flask app answer the request"""
+
+
+class Request:
+    """The parts of an ASGI HTTP scope the async handlers need."""
+
+    def __init__(self, scope, receive, match):
+        self.scope = scope
+        self.receive = receive
+        self.match = match
+        query_string = scope.get('query_string', b'').decode('latin-1')
+        self.query = {key: values[0] for key, values in parse_qs(query_string).items()}
+        # Same form as Flask's request.full_path, so both paths produce the same ETags
+        self.full_path = f"{scope['path']}?{query_string}"
+        self.headers = {}
+        cookies = SimpleCookie()
+        for name, value in scope.get('headers', []):
+            if name == b'cookie':
+                cookies.load(value.decode('latin-1'))
+            else:
+                self.headers[name.decode('latin-1').lower()] = value.decode('latin-1')
+        self.cookies = {key: morsel.value for key, morsel in cookies.items()}
+
+    @property
+    def session(self):
+        """Decode the Flask session cookie without a request context."""
+        serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        value = self.cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+        if serializer is None or not value:
+            return {}
+        try:
+            max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+            return serializer.loads(value, max_age=max_age)
+        except BadSignature:
+            return {}
+
+
+class AsyncResources:
+    """Lazily created asyncpg pools, shared by all requests."""
+
+    def __init__(self, config):
+        self.config = config
+        self._pools = {}
+        self._lock = asyncio.Lock()
+
+    async def pool(self, name):
+        """
+        Get the asyncpg pool of a logical database.
+
+        Args:
+            name (str): Logical database name ('roi_db' or 'geoserver_db')
+        """
+        if name not in self._pools:
+            async with self._lock:
+                if name not in self._pools:
+                    self._pools[name] = await asyncpg.create_pool(
+                        host=self.config['POSTGIS_HOST'],
+                        port=int(self.config['POSTGIS_PORT']),
+                        user=self.config['POSTGIS_USER'],
+                        password=self.config['POSTGIS_PASSWORD'],
+                        database=self.config['DB_POOLS'][name],
+                        min_size=1,
+                        max_size=self.config['ASYNC_DB_POOL_MAX_CONNECTIONS'],
+                        timeout=self.config['DB_CONNECT_TIMEOUT'],
+                    )
+        return self._pools[name]
+
+    async def close(self):
+        for pool in self._pools.values():
+            await pool.close()
+        self._pools = {}
+
+
+resources = AsyncResources(flask_app.config)
+
+
+# -------------------------------
+# Response helpers
+# -------------------------------
+async def send_json(send, document, status=200, headers=()):
+    body = json.dumps(document).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode('latin-1'))] + list(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def revalidate(request, send, version, private=False):
+    """
+    Answer a conditional GET like utils.etags.conditional does on the sync path.
+
+    Args:
+        request (Request): The request
+        send: ASGI send callable
+        version (str): Cheap version of the data the response is built from
+        private (bool): Mark responses as specific to the user's session
+
+    Returns:
+        list: ETag and Cache-Control headers for the full response, or None
+            if the client's copy is current and a 304 was sent
+    """
+    etag = make_etag(request.full_path, version)
+    cache_control = (b'cache-control', b'private, no-cache' if private else b'no-cache')
+    matched = matching_etag(request.headers.get('if-none-match'), etag)
+    if matched:
+        await send({'type': 'http.response.start', 'status': 304,
+                    'headers': [(b'etag', f'"{matched}"'.encode('latin-1')), cache_control]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return None
+    return [(b'etag', f'"{etag}"'.encode('latin-1')), cache_control]
+
+
+async def until_disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def cancel_on_disconnect(request, coro, route):
+    """
+    Run a handler coroutine, cancelling it if the client disconnects.
+
+    Cancelling a task that is waiting on asyncpg makes asyncpg cancel the
+    running query on the server.
+
+    Args:
+        request (Request): The current request
+        coro: The coroutine producing the response
+        route (str): Route name used in the cancellation metric
+    """
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(until_disconnected(request.receive))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        task.cancel()
+        query_cancellations.labels(route=route, reason='client_disconnect').inc()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    finally:
+        watcher.cancel()
+
+
+# -------------------------------
+# Async handlers
+# -------------------------------
+async def get_roi(request, send):
+    session_id = request.session.get('session_id')
+    if not session_id:
+        await send_json(send, {"status": "error", "message": "No ROI found."}, 404)
+        return
+    # Same query as utils.roi_store.load_roi
+    try:
+        generalization = parse_generalization(request.query)
+    except InvalidGeneralization as e:
+        await send_json(send, {"status": "error", "message": str(e)}, e.status_code)
+        return
+    tolerance = flask_app.config["ROI_DISPLAY_TOLERANCE"]
+    generalization = Generalization(generalization.tolerance or tolerance, generalization.precision)
+    pool = await resources.pool('roi_db')
+    try:
+        # Same version as routes.get_roi_version
+        created_at = await pool.fetchval(
+            "SELECT created_at FROM roi_sessions WHERE session_id = $1;", session_id)
+        headers = []
+        if created_at is not None:
+            headers = await revalidate(request, send, f"{session_id}:{created_at.isoformat()}:{tolerance}",
+                                       private=True)
+            if headers is None:
+                return
+        roi_geojson = await pool.fetchval(
+            f"SELECT {generalization.geojson_sql('geom')} FROM roi_sessions WHERE session_id = $1;", session_id)
+    except asyncpg.UndefinedTableError:
+        # The ROI table is created by the Flask path
+        raise Fallback()
+    if roi_geojson:
+        await send_json(send, {"status": "success", "geojson": roi_geojson}, headers=headers)
+    else:
+        await send_json(send, {"status": "error", "message": "No ROI found."}, 404)
+
+
+async def has_roi(request, send):
+    session_id = request.session.get('session_id')
+    exists = False
+    if session_id:
+        try:
+            pool = await resources.pool('roi_db')
+            exists = await pool.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM roi_sessions WHERE session_id = $1);", session_id)
+        except Exception as e:
+            logger.warning(f"has_roi error: {str(e)}")
+    await send_json(send, {"has_roi": bool(exists)})
+
+
+async def download_map_view(request, send):
+    if request.query.get('format', 'geojson').lower() != 'geojson':
+        raise Fallback()
+    vector_table = request.query.get('vector')
+    bbox = request.query.get('bbox')
+    if not vector_table or not bbox:
+        await send_json(send, {"status": "error", "message": "Missing parameters."}, 400)
+        return
+    try:
+        minx, miny, maxx, maxy = map(float, bbox.split(","))
+        generalization = parse_generalization(request.query, bbox=(minx, miny, maxx, maxy))
+    except (ValueError, InvalidGeneralization):
+        raise Fallback()
+
+    # Only tables already in the registry; a miss refreshes it on the sync path
+    registry = flask_app.extensions['spatial_registry']
+    table = registry.vector_table(vector_table, refresh=False)
+    if table is None:
+        raise Fallback()
+
+    bbox_sql = table.to_table_srid("ST_MakeEnvelope($1, $2, $3, $4, 4326)")
+    query = feature_query(f"""
+            FROM {table.qualified_name} v
+            WHERE ST_Intersects({table.geometry_sql()}, {bbox_sql})
+        """,
+        geometry_sql=table.to_client_srid(table.geometry_sql()),
+        geometry_column=table.geometry_column,
+        generalization=generalization)
+
+    await cancel_on_disconnect(request, stream_features(send, query, (minx, miny, maxx, maxy)),
+                               route='download_map_view')
+
+
+async def stream_features(send, query, params, route='download_map_view'):
+    """Stream the rows of a feature query as a GeoJSON FeatureCollection download."""
+    statement_timeout = int(flask_app.config["STATEMENT_TIMEOUTS"].get(
+        route, flask_app.config["STATEMENT_TIMEOUT_DEFAULT"]))
+    started = False
+    pool = await resources.pool('geoserver_db')
+    async with pool.acquire() as conn:
+        try:
+            async with conn.transaction():
+                if statement_timeout:
+                    await conn.execute(f"SET LOCAL statement_timeout = {statement_timeout};")
+                rows = conn.cursor(query, *params, prefetch=STREAM_PREFETCH).__aiter__()
+                try:
+                    first = await rows.__anext__()
+                except StopAsyncIteration:
+                    await send_json(send, {"status": "error", "message": "No data found in current view."}, 404)
+                    return
+
+                await send({'type': 'http.response.start', 'status': 200,
+                            'headers': [(b'content-type', b'application/json'),
+                                        (b'content-disposition', b'attachment; filename=map_view.geojson')]})
+                started = True
+                await send({'type': 'http.response.body',
+                            'body': b'{"type": "FeatureCollection", "features": [' + first[0].encode('utf-8'),
+                            'more_body': True})
+                async for row in rows:
+                    await send({'type': 'http.response.body', 'body': b',' + row[0].encode('utf-8'),
+                                'more_body': True})
+                await send({'type': 'http.response.body', 'body': b']}'})
+        except asyncpg.QueryCanceledError:
+            query_cancellations.labels(route=route, reason='timeout').inc()
+            if started:
+                raise
+            await send_json(send, {"status": "error",
+                                   "message": f"Query exceeded the {statement_timeout} ms time budget of this request"},
+                            504)
+
+
+async def get_layer_info(request, send):
+    # Only cached schemas are served here; describing a layer is left to the Flask app
+    schema = flask_app.extensions['layer_schema_cache'].cached(request.match.group('layer_name'),
+                                                               catalog_changed_at(flask_app.config))
+    if schema is None:
+        raise Fallback()
+    headers = await revalidate(request, send, catalog_revision(flask_app.config))
+    if headers is None:
+        return
+    await send_json(send, layer_info(schema), headers=headers)
+
+
+def catalog_raster_layers(workspace):
+    """Get the raster layers of a workspace from the app's raster catalog."""
+    with flask_app.app_context():
+        return flask_app.extensions['raster_catalog'].layers(workspace)
+
+
+async def get_raster_layers(request, send):
+    headers = await revalidate(request, send, catalog_revision(flask_app.config))
+    if headers is None:
+        return
+    workspace = flask_app.config.get("GEOSERVER_WORKSPACE", "SZEB_sample")
+    # Same cached catalog as the Flask route; a miss fetches on a worker thread
+    try:
+        layers = await asyncio.to_thread(catalog_raster_layers, workspace)
+    except RasterCatalogError as e:
+        await send_json(send, {'success': False, 'message': str(e)}, e.status_code)
+        return
+    except Exception as e:
+        logger.error(f"Error getting raster layers: {str(e)}")
+        await send_json(send, {'success': False, 'message': f"An error occurred: {str(e)}"}, 500)
+        return
+    await send_json(send, {'success': True, 'layers': layers}, headers=headers)
+
+
+ASYNC_ROUTES = [
+    (re.compile(r'^/get_roi$'), get_roi),
+    (re.compile(r'^/has_roi$'), has_roi),
+    (re.compile(r'^/download_map_view$'), download_map_view),
+    (re.compile(r'^/api/layer-info/(?P<layer_name>[^/]+)$'), get_layer_info),
+    (re.compile(r'^/api/raster-layers$'), get_raster_layers),
+]
+
+
+# -------------------------------
+# ASGI application
+# -------------------------------
+def wsgi_environ(scope, body):
+    """
+    Build the WSGI environ of an ASGI HTTP request.
+
+    Args:
+        scope (dict): ASGI HTTP scope
+        body: File object holding the request body
+
+    Returns:
+        dict: The WSGI environ
+    """
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI strings are latin-1 decoded bytes
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').lower()
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key in environ:
+            # Repeated headers are joined; cookies use their own separator
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    return environ
+
+
+class ThreadPoolWsgiToAsgi:
+    """
+    ASGI adapter running a thread-safe WSGI app on a pool of threads.
+
+    The request body is read before the app is called. The app and the
+    iteration of its response run on a pool thread, each chunk being handed
+    to the event loop as it is produced, so streamed responses stay
+    streamed. When the client disconnects, the queries the request is
+    running are cancelled (see utils.db_pool.RequestQueries), and the next
+    chunk raises ClientDisconnected in the pool thread, which closes the
+    response.
+    """
+
+    def __init__(self, wsgi_application, max_threads):
+        """
+        Args:
+            wsgi_application: The WSGI app, which must be thread-safe
+            max_threads (int): Requests run at the same time
+        """
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='flask')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']}")
+        body = SpooledTemporaryFile(max_size=WSGI_BODY_MEMORY_LIMIT)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+
+        environ = wsgi_environ(scope, body)
+        queries = environ[REQUEST_QUERIES_KEY] = RequestQueries()
+        disconnected = threading.Event()
+
+        async def watch_disconnect():
+            await until_disconnected(receive)
+            disconnected.set()
+            queries.cancel()
+
+        loop = asyncio.get_running_loop()
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await loop.run_in_executor(self.executor, self.run_wsgi_app, loop, environ, send, disconnected)
+        finally:
+            watcher.cancel()
+            body.close()
+
+    def run_wsgi_app(self, loop, environ, send, disconnected):
+        """Call the WSGI app and send its response; runs on a pool thread."""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            code = int(status.split(' ', 1)[0])
+            response['start'] = {'type': 'http.response.start', 'status': code,
+                                 'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                             for name, value in headers]}
+
+        def send_message(message):
+            if disconnected.is_set():
+                raise ClientDisconnected("The client disconnected")
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        result = self.wsgi_application(environ, start_response)
+        try:
+            for chunk in result:
+                if not response.get('started'):
+                    send_message(response['start'])
+                    response['started'] = True
+                if chunk:
+                    send_message({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not response.get('started'):
+                send_message(response['start'])
+            send_message({'type': 'http.response.body', 'body': b''})
+        except Exception:
+            # A cancelled query or the next chunk fails once the client is gone
+            if not disconnected.is_set():
+                raise
+            logger.info(f"Client disconnected from {environ['PATH_INFO']}; response closed")
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+
+wsgi_application = ThreadPoolWsgiToAsgi(flask_app, flask_app.config["FLASK_THREADS"])
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await resources.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """Serve async read routes directly and everything else through Flask."""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        for pattern, handler in ASYNC_ROUTES:
+            match = pattern.match(scope['path'])
+            if not match:
+                continue
+            started = False
+            if flask_app.config["COMPRESSION_ENABLED"]:
+                response_send = asgi_compressing_send(scope, send, min_size=flask_app.config["COMPRESSION_MIN_SIZE"],
+                                                      level=flask_app.config["COMPRESSION_LEVEL"])
+            else:
+                response_send = send
+
+            async def tracking_send(message):
+                nonlocal started
+                started = started or message['type'] == 'http.response.start'
+                await response_send(message)
+
+            try:
+                await handler(Request(scope, receive, match), tracking_send)
+                return
+            except Fallback:
+                break
+            except Exception as e:
+                logger.error(f"Error in async {handler.__name__}: {str(e)}")
+                if started:
+                    # Part of the body was sent; the client sees a truncated download
+                    raise
+                await send_json(send, {'status': 'error', 'message': str(e),
+                                       'error_type': type(e).__name__}, 500)
+                return
+
+    await wsgi_application(scope, receive, send)
@@ -1,20 +1,32 @@
 import os
+import re
 import requests
 import uuid
 import zipfile
 import tempfile
 import json
 import geopandas as gpd
-import psycopg2
 import subprocess  # For running ogr2ogr
 import logging
+import threading
 import traceback
 from functools import wraps
-from flask import render_template, current_app, send_from_directory, request, jsonify, session, Response, abort, redirect, url_for, flash
+from flask import render_template, current_app, send_from_directory, request, jsonify, session, Response, abort, redirect, url_for, flash, stream_with_context
 from prometheus_client import generate_latest, Counter
 from api.species_routes import register_routes as register_species_routes
 from routes_auth import setup_auth_routes, admin_auth_required
 from auth import ADMIN_USERNAME, ADMIN_PASSWORD_HASH, verify_password
+from utils.db_pool import db_connection, QueryTimeout
+from utils.exporters import EXPORT_FORMATS, export_features, export_response
+from utils.result_cache import get_result_cache, roi_hash, table_data_version
+from utils.spatial_registry import get_spatial_registry
+from utils.roi_store import InvalidRoi, save_roi, load_roi, roi_exists, roi_filter_sql, roi_revision
+from utils.raster_clip import RasterTooLarge, clip_raster
+from utils.jobs import get_job_manager, job_accepted, wants_async
+from utils.generalization import Generalization, InvalidGeneralization, parse_generalization
+from utils.etags import conditional, bump_catalog_revision
+from utils.geoserver_client import get_geoserver_client
+from utils.style_index import StyleCreationError, get_style_index, hashed_style_name, style_exists, style_hash
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -144,18 +156,20 @@ def test():
     return render_template('test.html', geoserver_url=geoserver_url, geoserver_workspace=geoserver_workspace)
 
 # -------------------------------
-# ROI Database Functions (unchanged)
+# ROI Database Functions
 # -------------------------------
-def create_roi_table_if_not_exists(conn):
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS roi (
-            id serial PRIMARY KEY,
-            geom geometry(Polygon, 4326)
-        );
-    """)
-    conn.commit()
-    cur.close()
+def get_session_id(create=False):
+    """
+    Get the ID that keys this browser session's ROI.
+
+    Args:
+        create (bool): Assign a new ID if the session does not have one yet
+    """
+    session_id = session.get('session_id', None)
+    if not session_id and create:
+        session_id = str(uuid.uuid4())
+        session['session_id'] = session_id
+    return session_id
 
 @handle_error
 def upload_roi():
@@ -206,33 +220,43 @@ def upload_roi():
             gdf = gdf.to_crs(epsg=4326)
         
         geom = gdf.unary_union
-        conn = psycopg2.connect(host="postgis", database="roi_db", user="geoserver", password="23vmoWpostgis", port="5432")
-        create_roi_table_if_not_exists(conn)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM roi;")
+        session_id = get_session_id(create=True)
+        previous_roi = get_roi_geometry()
         geom_json = json.dumps(geom.__geo_interface__)
-        cur.execute("INSERT INTO roi (geom) VALUES (ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326));", (geom_json,))
-        conn.commit()
-        cur.close()
-        conn.close()
+        save_roi(session_id, geom_json, max_vertices=current_app.config["ROI_SUBDIVIDE_MAX_VERTICES"])
+        if previous_roi:
+            # Cached downloads for the replaced ROI can no longer be requested
+            get_result_cache().invalidate_roi(roi_hash(previous_roi))
         return jsonify({"status": "success", "message": "ROI uploaded."})
+    except InvalidRoi as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
     except Exception as e:
         print("ROI upload error:", e)
         return jsonify({"status": "error", "message": "Failed to process ROI file."}), 500
 
+def get_roi_version():
+    """Revision of the session's ROI and of its display settings, for ETags."""
+    revision = roi_revision(get_session_id())
+    if revision is None:
+        return None
+    return f"{revision}:{current_app.config['ROI_DISPLAY_TOLERANCE']}"
+
 @handle_error
+@conditional(get_roi_version, private=True)
 def get_roi():
     try:
-        conn = psycopg2.connect(host="postgis", database="roi_db", user="geoserver", password="23vmoWpostgis", port="5432")
-        cur = conn.cursor()
-        cur.execute("SELECT ST_AsGeoJSON(ST_Collect(geom)) FROM roi;")
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
-        if result and result[0]:
-            return jsonify({"status": "success", "geojson": result[0]})
+        # The display copy may be simplified for the client's zoom;
+        # intersections always use the full ROI
+        generalization = parse_generalization(request.args)
+        roi_geojson = load_roi(get_session_id(),
+                               tolerance=generalization.tolerance or current_app.config["ROI_DISPLAY_TOLERANCE"],
+                               precision=generalization.precision)
+        if roi_geojson:
+            return jsonify({"status": "success", "geojson": roi_geojson})
         else:
             return jsonify({"status": "error", "message": "No ROI found."}), 404
+    except InvalidGeneralization as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
     except Exception as e:
         print("Error retrieving ROI:", e)
         return jsonify({"status": "error", "message": "Failed to retrieve ROI."}), 500
@@ -240,96 +264,113 @@ def get_roi():
 @handle_error
 def has_roi():
     try:
-        conn = psycopg2.connect(host="postgis", database="roi_db", user="geoserver", password="23vmoWpostgis", port="5432")
-        cur = conn.cursor()
-        cur.execute("SELECT count(*) FROM roi;")
-        count = cur.fetchone()[0]
-        cur.close()
-        conn.close()
-        return jsonify({"has_roi": count > 0})
+        return jsonify({"has_roi": roi_exists(get_session_id())})
     except Exception as e:
         print("has_roi error:", e)
         return jsonify({"has_roi": False})
 
 def get_roi_geometry():
     try:
-        conn = psycopg2.connect(host="postgis", database="roi_db", user="geoserver", password="23vmoWpostgis", port="5432")
-        cur = conn.cursor()
-        cur.execute("SELECT ST_AsGeoJSON(ST_Collect(geom)) FROM roi;")
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
-        if result and result[0]:
-            return result[0]
-        else:
-            return None
+        return load_roi(get_session_id())
     except Exception as e:
         print("Error retrieving ROI geometry:", e)
         return None
 
+def roi_intersection_source(table):
+    """
+    Build the FROM/WHERE clause selecting the features of a table inside the
+    session's ROI. Takes a single query parameter, the session ID.
+    """
+    # Features are matched against the subdivided ROI parts, each at most once
+    return f"""
+        FROM {table.qualified_name} v
+        WHERE {roi_filter_sql(table.geometry_sql(), table)}
+    """
+
+def run_roi_intersection_job(job):
+    """Export the features inside an ROI to the job's result file (job kind 'roi_intersection')."""
+    params = job.params
+    fmt = params['format']
+    table = get_spatial_registry().vector_table(params['vector'])
+    if table is None:
+        raise ValueError(f"Vector table '{params['vector']}' does not exist.")
+    job.update(message="Exporting features")
+    generalization = Generalization(params.get('tolerance'), params.get('precision'))
+    body = export_features(fmt, table, roi_intersection_source(table), (params['session_id'],), generalization)
+    if body is None:
+        raise ValueError("No intersection data found.")
+    job.write_result(body)
+    job.set_result_file(f"roi_intersection.{EXPORT_FORMATS[fmt]['extension']}", EXPORT_FORMATS[fmt]['mimetype'])
+
 @handle_error
 def download_roi_intersection():
     vector_table = request.args.get('vector')
     if not vector_table:
         return jsonify({"status": "error", "message": "Vector table not specified."}), 400
+    fmt = request.args.get('format', 'geojson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"status": "error", "message": f"Unsupported format '{fmt}'."}), 400
 
     roi_geojson = get_roi_geometry()
     if not roi_geojson:
         return jsonify({"status": "error", "message": "No ROI available."}), 404
 
     try:
-        conn = psycopg2.connect(host="postgis", database="geoserver_db", user="geoserver", password="23vmoWpostgis", port="5432")
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT schemaname, tablename 
-            FROM pg_catalog.pg_tables 
-            WHERE tablename = %s
-            LIMIT 1;
-        """, (vector_table,))
-        table_info = cur.fetchone()
-        if not table_info:
+        generalization = parse_generalization(request.args)
+        table = get_spatial_registry().vector_table(vector_table)
+        if table is None:
             return jsonify({"status": "error", "message": f"Vector table '{vector_table}' does not exist."}), 400
 
-        schema_name, table_name = table_info
-        full_table_name = f'"{schema_name}"."{table_name}"'
-        cur.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = %s AND column_name = 'geom';
-        """, (vector_table,))
-        
-        if not cur.fetchone():
-            return jsonify({"status": "error", "message": "Geometry column 'geom' not found in table."}), 400
-
-        query = f"""
-            SELECT row_to_json(fc)
-            FROM (
-                SELECT 'FeatureCollection' AS type, array_to_json(array_agg(f)) AS features
-                FROM (
-                    SELECT 'Feature' AS type,
-                           ST_AsGeoJSON(v.geom)::json AS geometry,
-                           to_jsonb(v) - 'geom' AS properties
-                    FROM {full_table_name} v
-                    WHERE ST_Intersects(v.geom, ST_GeomFromGeoJSON(%s))
-                ) AS f
-            ) AS fc;
-        """
-        cur.execute(query, (roi_geojson,))
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if result and result[0]:
-            response = Response(json.dumps(result[0]), mimetype="application/json")
-            response.headers["Content-Disposition"] = "attachment; filename=roi_intersection.geojson"
-            return response
-        else:
+        if wants_async():
+            session_id = get_session_id()
+            job = get_job_manager().submit('roi_intersection', {
+                'vector': table.table, 'format': fmt, 'session_id': session_id,
+                'tolerance': generalization.tolerance, 'precision': generalization.precision,
+            }, owner=session_id)
+            return job_accepted(job)
+
+        with db_connection('geoserver_db') as conn:
+            cur = conn.cursor()
+            version = table_data_version(cur, table.schema, table.table)
+            cur.close()
+
+        cache_fmt = fmt + generalization.cache_key if fmt == 'geojson' else fmt
+        cache_entry = get_result_cache().entry(table.table, roi_hash(roi_geojson), version, cache_fmt)
+
+        # Stream features from PostGIS instead of building the whole
+        # FeatureCollection in the database and again in Python
+        response = export_response(fmt, table, roi_intersection_source(table), (get_session_id(),), "roi_intersection",
+                                   cache_entry=cache_entry, generalization=generalization)
+        if response is None:
             return jsonify({"status": "error", "message": "No intersection data found."}), 404
+        return response
 
+    except (InvalidGeneralization, QueryTimeout) as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
     except Exception as e:
         print("Intersection download error:", e)
         return jsonify({"status": "error", "message": "Failed to generate intersection data: " + str(e)}), 500
 
+def run_raster_intersection_job(job):
+    """Clip a raster to an ROI into the job's result file (job kind 'raster_intersection')."""
+    params = job.params
+    table = get_spatial_registry().raster_table(params['raster'])
+    if table is None:
+        raise ValueError(f"Raster table '{params['raster']}' not found.")
+    roi_geojson = load_roi(params['session_id'])
+    if not roi_geojson:
+        raise ValueError("No ROI available.")
+    job.update(message="Clipping raster")
+    tiff = clip_raster(table, params['session_id'], roi_geojson,
+                       max_pixels=current_app.config["RASTER_CLIP_MAX_PIXELS"])
+    if tiff is None:
+        raise ValueError("No raster intersection found.")
+    try:
+        job.write_result(tiff)
+    finally:
+        tiff.close()
+    job.set_result_file(f"{table.table}_intersection.tif", "image/tiff")
+
 @handle_error
 def download_raster_intersection():
     raster_table = request.args.get('raster')
@@ -341,35 +382,31 @@ def download_raster_intersection():
         return jsonify({"status": "error", "message": "No ROI available."}), 404
 
     try:
-        conn = psycopg2.connect(
-            host="postgis",
-            database="geoserver_db",
-            user="geoserver",
-            password="23vmoWpostgis",
-            port="5432"
-        )
-        cur = conn.cursor()
-        cur.execute("SELECT 1 FROM information_schema.tables WHERE table_name = %s;", (raster_table,))
-        if not cur.fetchone():
+        table = get_spatial_registry().raster_table(raster_table)
+        if table is None:
             return jsonify({"status": "error", "message": f"Raster table '{raster_table}' not found."}), 400
 
-        query = f"""
-            SELECT ST_AsTIFF(ST_Clip(rast, ST_GeomFromGeoJSON(%s), true))
-            FROM {raster_table}
-            LIMIT 1;
-        """
-        cur.execute(query, (roi_geojson,))
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if result and result[0]:
-            response = Response(result[0], mimetype="image/tiff")
+        if wants_async():
+            session_id = get_session_id()
+            job = get_job_manager().submit('raster_intersection', {
+                'raster': table.table, 'session_id': session_id,
+            }, owner=session_id)
+            return job_accepted(job)
+
+        tiff = clip_raster(table, get_session_id(), roi_geojson,
+                           max_pixels=current_app.config["RASTER_CLIP_MAX_PIXELS"])
+        if tiff is not None:
+            response = Response(stream_with_context(tiff), mimetype="image/tiff")
+            response.headers["Content-Length"] = str(tiff.size)
             response.headers["Content-Disposition"] = f"attachment; filename={raster_table}_intersection.tif"
             return response
         else:
             return jsonify({"status": "error", "message": "No raster intersection found."}), 404
 
+    except RasterTooLarge as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
+    except QueryTimeout as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
     except Exception as e:
         print("Raster intersection download error:", e)
         return jsonify({"status": "error", "message": "Failed to generate raster intersection: " + str(e)}), 500
@@ -380,59 +417,31 @@ def download_map_view():
     bbox = request.args.get("bbox")
     if not vector_table or not bbox:
         return jsonify({"status": "error", "message": "Missing parameters."}), 400
+    fmt = request.args.get('format', 'geojson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"status": "error", "message": f"Unsupported format '{fmt}'."}), 400
 
     try:
         minx, miny, maxx, maxy = map(float, bbox.split(","))
-        conn = psycopg2.connect(
-            host="postgis", database="geoserver_db",
-            user="geoserver", password="23vmoWpostgis", port="5432"
-        )
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT schemaname, tablename 
-            FROM pg_catalog.pg_tables 
-            WHERE tablename = %s
-            LIMIT 1;
-        """, (vector_table,))
-        table_info = cur.fetchone()
-        if not table_info:
+        # Views are drawn on screen, so geometries can be generalized to the bbox
+        generalization = parse_generalization(request.args, bbox=(minx, miny, maxx, maxy))
+        table = get_spatial_registry().vector_table(vector_table)
+        if table is None:
             return jsonify({"status": "error", "message": f"Vector table '{vector_table}' does not exist."}), 400
 
-        schema_name, table_name = table_info
-        full_table_name = f'"{schema_name}"."{table_name}"'
-        cur.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = %s AND column_name = 'geom';
-        """, (vector_table,))
-        if not cur.fetchone():
-            return jsonify({"status": "error", "message": "Geometry column 'geom' not found in table."}), 400
-
-        query = f"""
-            SELECT row_to_json(fc)
-            FROM (
-                SELECT 'FeatureCollection' AS type, array_to_json(array_agg(f)) AS features
-                FROM (
-                    SELECT 'Feature' AS type,
-                           ST_AsGeoJSON(v.geom)::json AS geometry,
-                           to_jsonb(v) - 'geom' AS properties
-                    FROM {full_table_name} v
-                    WHERE ST_Intersects(v.geom, ST_MakeEnvelope(%s, %s, %s, %s, 4326))
-                ) AS f
-            ) AS fc;
+        bbox_sql = table.to_table_srid("ST_MakeEnvelope(%s, %s, %s, %s, 4326)")
+        source_sql = f"""
+            FROM {table.qualified_name} v
+            WHERE ST_Intersects({table.geometry_sql()}, {bbox_sql})
         """
-        cur.execute(query, (minx, miny, maxx, maxy))
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if result and result[0]:
-            response = Response(json.dumps(result[0]), mimetype="application/json")
-            response.headers["Content-Disposition"] = "attachment; filename=map_view.geojson"
-            return response
-        else:
+        response = export_response(fmt, table, source_sql, (minx, miny, maxx, maxy), "map_view",
+                                   generalization=generalization)
+        if response is None:
             return jsonify({"status": "error", "message": "No data found in current view."}), 404
+        return response
 
+    except (InvalidGeneralization, QueryTimeout) as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
     except Exception as e:
         print("Map view download error:", e)
         return jsonify({"status": "error", "message": f"Failed to generate map view data: {str(e)}"}), 500
@@ -441,6 +450,70 @@ def download_map_view():
 # New Functions for FeatureServer Import / Add Layer
 # -------------------------------
 
+# Keys of the import_featureserver request body, except the PostGIS password
+FEATURESERVER_IMPORT_FIELDS = ('feature_server_url', 'postgis_user', 'postgis_db', 'postgis_host',
+                               'geoserver_workspace', 'layer_name', 'geoserver_url')
+
+def featureserver_ogr_command(params, postgis_password):
+    """
+    Build the ogr2ogr command importing a FeatureServer into PostGIS.
+
+    Returns:
+        tuple: The command list and its environment
+    """
+    command = [
+        'ogr2ogr', '-f', 'PostgreSQL',
+        f"PG:dbname={params['postgis_db']} user={params['postgis_user']} host={params['postgis_host']}",
+        f"{params['feature_server_url']}&outFields=*&f=geojson",
+        '-nln', params['layer_name'], '-overwrite', '-progress',
+    ]
+    return command, dict(os.environ, PGPASSWORD=postgis_password)
+
+def parse_ogr_progress(output):
+    """Read the completed fraction from ogr2ogr's -progress output ("0...10...20")."""
+    steps = re.findall(r'(\d+)(?=\.\.\.|\s*- done)', output)
+    return int(steps[-1]) / 100 if steps else None
+
+def publish_featureserver_layer(params):
+    """
+    Publish an imported FeatureServer table in GeoServer via REST API.
+
+    Returns:
+        requests.Response: The GeoServer response
+    """
+    geoserver_publish_url = f"{params['geoserver_url']}/rest/workspaces/{params['geoserver_workspace']}/datastores/{params['layer_name']}/featuretypes"
+    publish_payload = {
+        "featureType": {
+            "name": params['layer_name'],
+            "nativeName": params['layer_name'],
+            "srs": "EPSG:4326"
+        }
+    }
+    headers = {"Content-Type": "application/json"}
+    response = get_geoserver_client().post(geoserver_publish_url, 'publish_featuretype', json=publish_payload, headers=headers)
+    if response.ok:
+        bump_catalog_revision()
+    return response
+
+def refresh_registry_after_import():
+    try:
+        get_spatial_registry().refresh()
+    except Exception as e:
+        logger.warning(f"Spatial registry refresh after import failed: {str(e)}")
+
+def run_featureserver_import_job(job):
+    """Import and publish a FeatureServer (job kind 'import_featureserver')."""
+    command, env = featureserver_ogr_command(job.params, job.secrets['postgis_password'])
+    job.update(progress=0.0, message="Importing features into PostGIS")
+    job.run_subprocess(command, env=env, parse_progress=parse_ogr_progress)
+    refresh_registry_after_import()
+
+    job.update(message="Publishing layer in GeoServer")
+    response = publish_featureserver_layer(job.params)
+    if response.status_code not in [200, 201]:
+        raise RuntimeError(f"Failed to publish to GeoServer: {response.text}")
+    return {"message": "Layer successfully imported into PostGIS and published in GeoServer!"}
+
 @handle_error
 def import_featureserver():
     """
@@ -454,40 +527,26 @@ def import_featureserver():
       - geoserver_workspace
       - layer_name
       - geoserver_url
+      - async (optional): true to run the import as a background job
     """
     try:
         data = request.get_json()
-        feature_server_url = data['feature_server_url']
-        postgis_user = data['postgis_user']
+        params = {key: data[key] for key in FEATURESERVER_IMPORT_FIELDS}
         postgis_password = data['postgis_password']
-        postgis_db = data['postgis_db']
-        postgis_host = data['postgis_host']
-        geoserver_workspace = data['geoserver_workspace']
-        layer_name = data['layer_name']
-        geoserver_url = data['geoserver_url']
+
+        if data.get('async') or wants_async():
+            # The password is kept in memory only, never in the persisted job state
+            job = get_job_manager().submit('import_featureserver', params, owner=get_session_id(create=True),
+                                           secrets={'postgis_password': postgis_password})
+            return job_accepted(job)
 
         # Step 1: Import FeatureServer data into PostGIS using ogr2ogr.
-        ogr_command = (
-            f'ogr2ogr -f "PostgreSQL" '
-            f'PG:"dbname={postgis_db} user={postgis_user} password={postgis_password} host={postgis_host}" '
-            f'"{feature_server_url}&outFields=*&f=geojson" '
-            f'-nln {layer_name} -overwrite -progress'
-        )
-        subprocess.run(ogr_command, shell=True, check=True)
+        command, env = featureserver_ogr_command(params, postgis_password)
+        subprocess.run(command, env=env, check=True)
+        refresh_registry_after_import()
 
         # Step 2: Publish the new layer to GeoServer via REST API.
-        geoserver_user = "admin"
-        geoserver_pass = "23vmoWgeoserver"
-        geoserver_publish_url = f"{geoserver_url}/rest/workspaces/{geoserver_workspace}/datastores/{layer_name}/featuretypes"
-        publish_payload = {
-            "featureType": {
-                "name": layer_name,
-                "nativeName": layer_name,
-                "srs": "EPSG:4326"
-            }
-        }
-        headers = {"Content-Type": "application/json"}
-        response = requests.post(geoserver_publish_url, json=publish_payload, auth=(geoserver_user, geoserver_pass), headers=headers)
+        response = publish_featureserver_layer(params)
         if response.status_code in [200, 201]:
             return jsonify({"success": True, "message": "Layer successfully imported into PostGIS and published in GeoServer!"})
         else:
@@ -496,6 +555,15 @@ def import_featureserver():
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+@admin_auth_required
+@handle_error
+def refresh_spatial_registry():
+    """
+    Reload the spatial table registry from the database.
+    """
+    counts = get_spatial_registry().refresh()
+    return jsonify({"status": "success", **counts})
+
 # Admin page handler - auth routes are defined in routes_auth.py
 
 @admin_auth_required
@@ -527,33 +595,44 @@ def upload_raster_page():
 # -------------------------------
 # Visitor Tracking & Other Endpoints (unchanged)
 # -------------------------------
-def create_visitor_tables_if_not_exist(conn):
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS visitors (
-        id SERIAL PRIMARY KEY,
-        ip VARCHAR(50) NOT NULL,
-        user_agent TEXT,
-        latitude FLOAT,
-        longitude FLOAT,
-        country VARCHAR(100),
-        region VARCHAR(100),
-        city VARCHAR(100),
-        first_visit TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        last_visit TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS visits (
-        id SERIAL PRIMARY KEY,
-        visitor_id INTEGER REFERENCES visitors(id),
-        endpoint VARCHAR(200) NOT NULL,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        session_id VARCHAR(100)
-    );
-    """)
-    conn.commit()
-    cur.close()
+# Visitor tables are created once per process, in a transaction of their own
+_visitor_tables_ready = False
+_visitor_tables_lock = threading.Lock()
+
+def create_visitor_tables_if_not_exist():
+    global _visitor_tables_ready
+    if _visitor_tables_ready:
+        return
+    with _visitor_tables_lock:
+        if _visitor_tables_ready:
+            return
+        with db_connection('roi_db') as conn:
+            cur = conn.cursor()
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS visitors (
+                id SERIAL PRIMARY KEY,
+                ip VARCHAR(50) NOT NULL,
+                user_agent TEXT,
+                latitude FLOAT,
+                longitude FLOAT,
+                country VARCHAR(100),
+                region VARCHAR(100),
+                city VARCHAR(100),
+                first_visit TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_visit TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """)
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS visits (
+                id SERIAL PRIMARY KEY,
+                visitor_id INTEGER REFERENCES visitors(id),
+                endpoint VARCHAR(200) NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                session_id VARCHAR(100)
+            );
+            """)
+            cur.close()
+        _visitor_tables_ready = True
 
 def record_visitor(request_obj):
     try:
@@ -564,95 +643,87 @@ def record_visitor(request_obj):
         country = "Unknown"
         region = "Unknown"
         city = "Unknown"
-        session_id = session.get('session_id', None)
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            session['session_id'] = session_id
-        conn = psycopg2.connect(host="postgis", database="roi_db", user="geoserver", 
-                              password="23vmoWpostgis", port="5432")
-        create_visitor_tables_if_not_exist(conn)
-        cur = conn.cursor()
-        cur.execute("SELECT id FROM visitors WHERE ip = %s;", (ip,))
-        visitor = cur.fetchone()
-        if visitor:
-            visitor_id = visitor[0]
+        session_id = get_session_id(create=True)
+        create_visitor_tables_if_not_exist()
+        with db_connection('roi_db') as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM visitors WHERE ip = %s;", (ip,))
+            visitor = cur.fetchone()
+            if visitor:
+                visitor_id = visitor[0]
+                cur.execute("""
+                UPDATE visitors 
+                SET last_visit = CURRENT_TIMESTAMP,
+                    user_agent = %s,
+                    latitude = %s,
+                    longitude = %s
+                WHERE id = %s;
+                """, (user_agent, latitude, longitude, visitor_id))
+            else:
+                cur.execute("""
+                INSERT INTO visitors (ip, user_agent, latitude, longitude, country, region, city)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                RETURNING id;
+                """, (ip, user_agent, latitude, longitude, country, region, city))
+                visitor_id = cur.fetchone()[0]
             cur.execute("""
-            UPDATE visitors 
-            SET last_visit = CURRENT_TIMESTAMP,
-                user_agent = %s,
-                latitude = %s,
-                longitude = %s
-            WHERE id = %s;
-            """, (user_agent, latitude, longitude, visitor_id))
-        else:
-            cur.execute("""
-            INSERT INTO visitors (ip, user_agent, latitude, longitude, country, region, city)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id;
-            """, (ip, user_agent, latitude, longitude, country, region, city))
-            visitor_id = cur.fetchone()[0]
-        cur.execute("""
-        INSERT INTO visits (visitor_id, endpoint, session_id)
-        VALUES (%s, %s, %s);
-        """, (visitor_id, request_obj.path, session_id))
-        conn.commit()
-        cur.close()
-        conn.close()
+            INSERT INTO visits (visitor_id, endpoint, session_id)
+            VALUES (%s, %s, %s);
+            """, (visitor_id, request_obj.path, session_id))
+            cur.close()
     except Exception as e:
         print(f"Error recording visitor: {str(e)}")
 
 def get_visitor_stats():
     try:
-        conn = psycopg2.connect(host="postgis", database="roi_db", user="geoserver", 
-                              password="23vmoWpostgis", port="5432")
-        cur = conn.cursor()
-        create_visitor_tables_if_not_exist(conn)
-        cur.execute("SELECT COUNT(*) FROM visitors;")
-        total_visitors = cur.fetchone()[0]
-        cur.execute("""
-        SELECT COUNT(DISTINCT visitor_id) 
-        FROM visits 
-        WHERE DATE(timestamp) = CURRENT_DATE;
-        """)
-        today_visitors = cur.fetchone()[0]
-        cur.execute("""
-        SELECT DATE(timestamp), COUNT(DISTINCT visitor_id)
-        FROM visits
-        WHERE timestamp >= CURRENT_DATE - INTERVAL '6 days'
-        GROUP BY DATE(timestamp)
-        ORDER BY DATE(timestamp);
-        """)
-        daily_visitors = cur.fetchall()
-        cur.execute("""
-        SELECT endpoint, COUNT(*) as visit_count
-        FROM visits
-        GROUP BY endpoint
-        ORDER BY visit_count DESC
-        LIMIT 10;
-        """)
-        popular_endpoints = cur.fetchall()
-        cur.execute("""
-        SELECT id, ip, latitude, longitude, country, region, city, 
-               first_visit, last_visit
-        FROM visitors
-        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
-          AND latitude != 0 AND longitude != 0;
-        """)
-        located_visitors = []
-        for row in cur.fetchall():
-            located_visitors.append({
-                "id": row[0],
-                "ip": row[1],
-                "lat": row[2],
-                "lng": row[3],
-                "country": row[4],
-                "region": row[5],
-                "city": row[6],
-                "first_visit": row[7].strftime("%Y-%m-%d %H:%M:%S") if row[7] else None,
-                "last_visit": row[8].strftime("%Y-%m-%d %H:%M:%S") if row[8] else None
-            })
-        cur.close()
-        conn.close()
+        create_visitor_tables_if_not_exist()
+        with db_connection('roi_db') as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM visitors;")
+            total_visitors = cur.fetchone()[0]
+            cur.execute("""
+            SELECT COUNT(DISTINCT visitor_id) 
+            FROM visits 
+            WHERE DATE(timestamp) = CURRENT_DATE;
+            """)
+            today_visitors = cur.fetchone()[0]
+            cur.execute("""
+            SELECT DATE(timestamp), COUNT(DISTINCT visitor_id)
+            FROM visits
+            WHERE timestamp >= CURRENT_DATE - INTERVAL '6 days'
+            GROUP BY DATE(timestamp)
+            ORDER BY DATE(timestamp);
+            """)
+            daily_visitors = cur.fetchall()
+            cur.execute("""
+            SELECT endpoint, COUNT(*) as visit_count
+            FROM visits
+            GROUP BY endpoint
+            ORDER BY visit_count DESC
+            LIMIT 10;
+            """)
+            popular_endpoints = cur.fetchall()
+            cur.execute("""
+            SELECT id, ip, latitude, longitude, country, region, city, 
+                   first_visit, last_visit
+            FROM visitors
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+              AND latitude != 0 AND longitude != 0;
+            """)
+            located_visitors = []
+            for row in cur.fetchall():
+                located_visitors.append({
+                    "id": row[0],
+                    "ip": row[1],
+                    "lat": row[2],
+                    "lng": row[3],
+                    "country": row[4],
+                    "region": row[5],
+                    "city": row[6],
+                    "first_visit": row[7].strftime("%Y-%m-%d %H:%M:%S") if row[7] else None,
+                    "last_visit": row[8].strftime("%Y-%m-%d %H:%M:%S") if row[8] else None
+                })
+            cur.close()
         days = []
         counts = []
         for day, count in daily_visitors:
@@ -712,21 +783,31 @@ def generate_style():
     coverage = data.get("coverage")
     band = data.get("band")
     classification = data.get("classification")
-    styleName = data.get("styleName")
-    unique_style_name = f"{styleName}_{uuid.uuid4().hex[:8]}"
-    geoserver_url = current_app.config.get("GEOSERVER_URL", "http://conescout.duckdns.org/geoserver")
-    rat_url = (f"{geoserver_url}/rest/workspaces/{workspace}/"
-               f"coveragestores/{store}/coverages/{coverage}/pam?"
-               f"band={band}&classification={classification}&styleName={unique_style_name}")
-    geoserver_user = current_app.config.get("GEOSERVER_USER", "admin")
-    geoserver_pass = current_app.config.get("GEOSERVER_PASS", "geoserver")
-    headers = {"Content-Type": "application/vnd.ogc.sld+xml"}
-    sld_content = ""
-    response = requests.post(rat_url, headers=headers, data=sld_content, auth=(geoserver_user, geoserver_pass))
-    if response.status_code in (201, 303):
-        return jsonify({"message": f"Style '{unique_style_name}' created successfully.", "styleName": unique_style_name}), response.status_code
-    else:
-        return jsonify({"error": "Style creation failed.", "status": response.status_code}), response.status_code
+    styleName = data.get("styleName") or coverage
+    # Identical requests reuse the style generated the first time
+    digest = style_hash({"workspace": workspace, "store": store, "coverage": coverage,
+                         "band": band, "classification": classification})
+
+    def create():
+        unique_style_name = hashed_style_name(styleName, digest)
+        rat_path = (f"/rest/workspaces/{workspace}/"
+                    f"coveragestores/{store}/coverages/{coverage}/pam?"
+                    f"band={band}&classification={classification}&styleName={unique_style_name}")
+        headers = {"Content-Type": "application/vnd.ogc.sld+xml"}
+        sld_content = ""
+        response = get_geoserver_client().post(rat_path, 'generate_style', headers=headers, data=sld_content)
+        if response.status_code not in (201, 303):
+            raise StyleCreationError("Style creation failed.", response.status_code)
+        return unique_style_name, workspace
+
+    try:
+        unique_style_name, reused = get_style_index().get_or_create(digest, create, style_exists)
+    except StyleCreationError as e:
+        return jsonify({"error": str(e), "status": e.status_code}), e.status_code
+    if reused:
+        return jsonify({"message": f"Style '{unique_style_name}' already exists.", "styleName": unique_style_name,
+                        "reused": True})
+    return jsonify({"message": f"Style '{unique_style_name}' created successfully.", "styleName": unique_style_name}), 201
 
 # -------------------------------
 # Setup Routes
@@ -806,6 +887,7 @@ def setup_routes(app):
     app.add_url_rule('/addlayer', 'addlayer', add_layer_page)
     app.add_url_rule('/upload_raster', 'upload_raster_page', upload_raster_page)
     app.add_url_rule('/import_featureserver', 'import_featureserver', import_featureserver, methods=["POST"])
+    app.add_url_rule('/api/admin/spatial-registry/refresh', 'refresh_spatial_registry', refresh_spatial_registry, methods=["POST"])
     
     # Register API routes
     register_species_routes(app)
@@ -813,6 +895,30 @@ def setup_routes(app):
     # Register Raster API routes
     from api.raster_routes import register_routes as register_raster_routes
     register_raster_routes(app)
+    
+    # Register vector tile routes
+    from api.tile_routes import register_routes as register_tile_routes
+    register_tile_routes(app)
+
+    # Register zonal statistics routes
+    from api.zonal_routes import register_routes as register_zonal_routes
+    register_zonal_routes(app)
+
+    # Register attribute classification routes
+    from api.classification_routes import register_routes as register_classification_routes
+    register_classification_routes(app)
+
+    # Register paginated feature routes
+    from api.feature_routes import register_routes as register_feature_routes
+    register_feature_routes(app)
+
+    # Register background job routes and the job kinds defined here
+    from api.job_routes import register_routes as register_job_routes
+    register_job_routes(app)
+    job_manager = app.extensions['job_manager']
+    job_manager.register('roi_intersection', run_roi_intersection_job)
+    job_manager.register('raster_intersection', run_raster_intersection_job)
+    job_manager.register('import_featureserver', run_featureserver_import_job)
     return
 
 # End of routes.py
@@ -7,35 +7,66 @@
 
 class GeoServerLayerDetector {
   constructor() {
-    this.geoserverUrl = null;
-    this.workspace = null;
-    this.init();
+    // Layer name -> promise of its /api/layer-info entry
+    this.layerInfo = new Map();
+    // Layers waiting for the next batch request
+    this.pending = new Map();
+    this.flushScheduled = false;
   }
   
   /**
-   * Initialize the detector
+   * Get the schema of a layer from the app's layer-info API.
+   * 
+   * Layers asked for in the same tick are fetched with a single batch request
+   * (/api/layer-info?layers=a,b,...), which the server answers from its schema
+   * cache; each layer is only fetched once per page.
+   * @param {string} layerName - The name of the layer
+   * @returns {Promise<Object>} - Promise resolving to the layer info
+   */
+  describeLayer(layerName) {
+    if (!this.layerInfo.has(layerName)) {
+      const promise = new Promise((resolve, reject) => {
+        this.pending.set(layerName, { resolve, reject });
+      });
+      // Failed lookups may be retried
+      promise.catch(() => this.layerInfo.delete(layerName));
+      this.layerInfo.set(layerName, promise);
+      if (!this.flushScheduled) {
+        this.flushScheduled = true;
+        setTimeout(() => this.flush(), 0);
+      }
+    }
+    return this.layerInfo.get(layerName);
+  }
+  
+  /**
+   * Send the pending layers as one batch request
    */
-  init() {
-    // Get GeoServer URL from configuration
-    if (window.geoserverConfig) {
-      this.geoserverUrl = window.geoserverConfig.baseUrl;
-      this.workspace = window.geoserverConfig.workspace;
-    } else {
-      // Try to get from meta tags
-      const metaGeoserver = document.querySelector('meta[name="geoserver-url"]');
-      const metaWorkspace = document.querySelector('meta[name="geoserver-workspace"]');
+  async flush() {
+    const pending = this.pending;
+    this.pending = new Map();
+    this.flushScheduled = false;
+    
+    try {
+      const layers = [...pending.keys()].map(encodeURIComponent).join(',');
+      const response = await fetch(`/api/layer-info?layers=${layers}`);
+      const data = await response.json();
       
-      if (metaGeoserver) {
-        this.geoserverUrl = metaGeoserver.getAttribute('content');
+      if (!response.ok || !data.success) {
+        throw new Error(data.message || `Failed to fetch layer attributes: ${response.statusText}`);
       }
       
-      if (metaWorkspace) {
-        this.workspace = metaWorkspace.getAttribute('content');
+      for (const [layerName, { resolve, reject }] of pending) {
+        if (data.layers[layerName]) {
+          resolve(data.layers[layerName]);
+        } else {
+          reject(new Error(`Layer ${layerName} not found`));
+        }
+      }
+    } catch (error) {
+      for (const { reject } of pending.values()) {
+        reject(error);
       }
-    }
-    
-    if (!this.geoserverUrl) {
-      console.error('GeoServer URL not found in configuration or meta tags');
     }
   }
   
@@ -46,33 +77,14 @@ class GeoServerLayerDetector {
    */
   async detectVectorAttributes(layerName) {
     try {
-      if (!this.geoserverUrl || !layerName) {
-        throw new Error('GeoServer URL or layer name not provided');
-      }
-      
-      const workspace = this.workspace || 'SZEB_sample';
-      
-      // Construct WFS GetFeature request URL
-      const wfsUrl = `${this.geoserverUrl}/wfs?service=WFS&version=2.0.0&request=GetFeature&typeNames=${workspace}:${layerName}&outputFormat=application/json&count=1`;
-      
-      // Fetch a sample feature
-      const response = await fetch(wfsUrl);
-      
-      if (!response.ok) {
-        throw new Error(`Failed to fetch layer attributes: ${response.statusText}`);
-      }
-      
-      const data = await response.json();
-      
-      if (!data.features || data.features.length === 0) {
-        throw new Error('No features found in layer');
+      if (!layerName) {
+        throw new Error('Layer name not provided');
       }
       
-      // Extract properties from the first feature
-      const properties = data.features[0].properties;
+      const info = await this.describeLayer(layerName.trim());
       
-      // Organize attributes by categories
-      return this.organizeAttributes(properties);
+      // The schema lists the attributes with their types, without the geometry column
+      return this.organizeAttributes(info.attributes.map(attribute => attribute.name));
       
     } catch (error) {
       console.error('Error detecting vector attributes:', error);
@@ -82,10 +94,10 @@ class GeoServerLayerDetector {
   
   /**
    * Organize attributes into categories
-   * @param {Object} properties - The feature properties
+   * @param {string[]} names - The attribute names
    * @returns {Object} - Organized attributes by category
    */
-  organizeAttributes(properties) {
+  organizeAttributes(names) {
     const attributes = {
       basics: {
         label: 'Basic Information',
@@ -114,7 +126,7 @@ class GeoServerLayerDetector {
     };
     
     // Categorize attributes based on name patterns
-    for (const [key, value] of Object.entries(properties)) {
+    for (const key of names) {
       // Skip geometry field and internal IDs
       if (key === 'geometry' || key === 'id' || key === 'fid' || key === 'gid') {
         continue;
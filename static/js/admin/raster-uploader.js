@@ -218,71 +218,60 @@ class RasterUploader {
       
       this.showStatus('info', 'Uploading raster file...');
       
-      // Create FormData
+      // Send the file in checksummed chunks, resuming a previous attempt if there is one
+      const upload = await this.startChunkedUpload(this.tifFile);
+      await this.sendMissingChunks(this.tifFile, upload, (received, total) => {
+        progressIndicator.style.width = `${(received / total) * 100}%`;
+      });
+      
+      this.showStatus('info', 'Publishing raster to GeoServer...');
+      
       const formData = new FormData();
-      formData.append('file', this.tifFile);
       if (this.auxFile) {
         formData.append('aux_file', this.auxFile);
       }
       formData.append('workspace', workspace);
       formData.append('store_name', storeName);
       formData.append('layer_name', layerName);
+      // Converting and publishing a large raster outlasts proxy timeouts, so it runs as a job
+      formData.append('async', '1');
       
-      // Upload the file
-      const xhr = new XMLHttpRequest();
-      xhr.open('POST', '/api/upload_raster', true);
+      const completeResponse = await fetch(`/api/uploads/${upload.upload_id}/complete`, {
+        method: 'POST',
+        headers: this.csrfHeaders(),
+        body: formData
+      });
+      localStorage.removeItem(this.uploadKey(this.tifFile));
       
-      // Track upload progress
-      xhr.upload.onprogress = (event) => {
-        if (event.lengthComputable) {
-          const percentComplete = (event.loaded / event.total) * 100;
-          progressIndicator.style.width = `${percentComplete}%`;
-        }
-      };
-      
-      // Handle response
-      xhr.onload = async () => {
-        if (xhr.status >= 200 && xhr.status < 300) {
-          try {
-            const response = JSON.parse(xhr.responseText);
-            
-            if (response.success) {
-              this.uploadedStore = storeName;
-              this.uploadedLayer = layerName;
-              
-              this.showStatus('success', `Raster uploaded successfully! ${response.message || ''}`);
-              
-              // If RAT was detected, update UI and show RAT info
-              if (response.rat_detected) {
-                this.ratData = response.rat_data;
-                this.displayRatInfo();
-              }
-            } else {
-              throw new Error(response.message || 'Unknown error');
-            }
-          } catch (error) {
-            this.showStatus('error', `Error parsing response: ${error.message}`);
-          }
-        } else {
-          try {
-            const response = JSON.parse(xhr.responseText);
-            throw new Error(response.message || `Server returned status ${xhr.status}`);
-          } catch (error) {
-            throw new Error(`Upload failed: ${error.message}`);
-          }
-        }
-      };
+      const accepted = await completeResponse.json();
+      if (!completeResponse.ok) {
+        throw new Error(`Upload failed: ${accepted.message || `Server returned status ${completeResponse.status}`}`);
+      }
+      const response = await this.waitForJob(accepted.status_url, (job) => {
+        progressIndicator.style.width = `${(job.progress || 0) * 100}%`;
+        this.showStatus('info', job.message || 'Publishing raster to GeoServer...');
+      });
+      if (!response.success) {
+        throw new Error(`Upload failed: ${response.message || 'Unknown error'}`);
+      }
+      
+      this.uploadedStore = storeName;
+      this.uploadedLayer = layerName;
       
-      xhr.onerror = () => {
-        this.showStatus('error', 'Network error occurred during upload');
-      };
+      const optimization = response.optimization;
+      const optimized = optimization && optimization.converted
+        ? ` Converted to Cloud-Optimized GeoTIFF: ${(optimization.original_bytes / 1048576).toFixed(1)} MB → ${(optimization.optimized_bytes / 1048576).toFixed(1)} MB.`
+        : '';
+      this.showStatus('success', `Raster uploaded successfully! ${response.message || ''}${optimized}`);
       
-      xhr.onloadend = () => {
-        uploadButton.disabled = false;
-        uploadButton.textContent = 'Upload Raster';
-      };
+      // If RAT was detected, update UI and show RAT info
+      if (response.rat_detected) {
+        this.ratData = response.rat_data;
+        this.displayRatInfo();
+      }
       
-      xhr.send(formData);
+      uploadButton.disabled = false;
+      uploadButton.textContent = 'Upload Raster';
       
     } catch (error) {
       this.showStatus('error', error.message);
@@ -291,6 +280,125 @@ class RasterUploader {
     }
   }
   
+  /**
+   * Get the CSRF header for state-changing API requests
+   * @returns {Object} Request headers
+   */
+  csrfHeaders() {
+    const meta = document.querySelector('meta[name="csrf-token"]');
+    return meta ? { 'X-CSRFToken': meta.getAttribute('content') } : {};
+  }
+  
+  /**
+   * Key under which the upload of a file is remembered for resuming
+   * @param {File} file - The file being uploaded
+   * @returns {string} localStorage key
+   */
+  uploadKey(file) {
+    return `rasterUpload:${file.name}:${file.size}:${file.lastModified}`;
+  }
+  
+  /**
+   * Resume the unfinished upload of a file, or start a new one
+   * @param {File} file - The GeoTIFF file
+   * @returns {Promise<Object>} Upload status with upload_id, chunk_size and missing chunks
+   */
+  async startChunkedUpload(file) {
+    const previousId = localStorage.getItem(this.uploadKey(file));
+    if (previousId) {
+      const response = await fetch(`/api/uploads/${previousId}`);
+      if (response.ok) {
+        return response.json();
+      }
+    }
+    
+    const response = await fetch('/api/uploads', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...this.csrfHeaders() },
+      body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    const upload = await response.json();
+    if (!response.ok) {
+      throw new Error(upload.message || `Server returned status ${response.status}`);
+    }
+    localStorage.setItem(this.uploadKey(file), upload.upload_id);
+    return upload;
+  }
+  
+  /**
+   * Send the chunks the server does not have yet, a few at a time
+   * @param {File} file - The GeoTIFF file
+   * @param {Object} upload - Upload status from the server
+   * @param {Function} onProgress - Called with the received and total chunk counts
+   */
+  async sendMissingChunks(file, upload, onProgress) {
+    const queue = [...upload.missing];
+    let received = upload.chunks - queue.length;
+    onProgress(received, upload.chunks);
+    
+    const sendChunk = async (index) => {
+      const blob = file.slice(index * upload.chunk_size, (index + 1) * upload.chunk_size);
+      const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+      const checksum = Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+      
+      // Retry dropped connections and corrupted chunks with a growing delay
+      for (let attempt = 1; ; attempt++) {
+        try {
+          const response = await fetch(`/api/uploads/${upload.upload_id}/chunks/${index}`, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': checksum, ...this.csrfHeaders() },
+            body: blob
+          });
+          if (response.ok) {
+            return;
+          }
+          const data = await response.json().catch(() => ({}));
+          if (response.status !== 422 && response.status < 500) {
+            throw Object.assign(new Error(data.message || `Server returned status ${response.status}`), { fatal: true });
+          }
+        } catch (error) {
+          if (error.fatal || attempt >= 5) {
+            throw error;
+          }
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+      }
+    };
+    
+    const worker = async () => {
+      while (queue.length) {
+        await sendChunk(queue.shift());
+        onProgress(++received, upload.chunks);
+      }
+    };
+    await Promise.all([worker(), worker(), worker()]);
+  }
+  
+  /**
+   * Poll a background job until it finishes
+   * @param {string} statusUrl - Status URL returned when the job was accepted
+   * @param {Function} onProgress - Called with the job status on every poll
+   * @returns {Promise<Object>} The job result
+   */
+  async waitForJob(statusUrl, onProgress) {
+    while (true) {
+      const response = await fetch(statusUrl);
+      const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.message || `Server returned status ${response.status}`);
+      }
+      const job = data.job;
+      if (job.state === 'succeeded') {
+        return job.result;
+      }
+      if (job.state === 'failed' || job.state === 'cancelled') {
+        throw new Error(`Upload failed: ${job.error || job.state}`);
+      }
+      onProgress(job);
+      await new Promise(resolve => setTimeout(resolve, 2000));
+    }
+  }
+  
   /**
    * Display RAT information in the UI
    */
@@ -406,54 +514,49 @@ class RasterUploader {
     // Clear table
     ratAttributesBody.innerHTML = '';
     
-    // Get column data
-    const columns = this.ratData[band].columns || {};
-    const rows = this.ratData[band].rows || [];
+    // Columnar data: pixel values and one array per column for the returned rows
+    const table = this.ratData[band];
+    const data = table.data || {};
+    const values = table.values || [];
     
     // Display first 10 rows max
-    const displayRows = rows.slice(0, 10);
+    const displayCount = Math.min(values.length, 10);
     
     // Get currently selected attribute
     const selectedAttribute = document.getElementById('ratAttribute').value;
+    const otherColumns = Object.keys(data).filter(column => column !== selectedAttribute && column !== 'histogram');
     
     // Create rows
-    displayRows.forEach(row => {
+    for (let i = 0; i < displayCount; i++) {
       const tr = document.createElement('tr');
       
       // Value column
       const tdValue = document.createElement('td');
-      tdValue.textContent = row.value || '';
+      tdValue.textContent = values[i] ?? '';
       tr.appendChild(tdValue);
       
       // Classification column
       const tdClass = document.createElement('td');
-      tdClass.textContent = row[selectedAttribute] || '';
+      tdClass.textContent = data[selectedAttribute] ? (data[selectedAttribute][i] ?? '') : '';
       tdClass.className = 'fw-bold';
       tr.appendChild(tdClass);
       
       // Other attributes
       const tdOther = document.createElement('td');
-      const otherAttrs = [];
-      
-      for (const [key, value] of Object.entries(row)) {
-        if (key !== 'value' && key !== selectedAttribute && key !== 'histogram') {
-          otherAttrs.push(`${key}: ${value}`);
-        }
-      }
-      
-      tdOther.textContent = otherAttrs.join(', ');
+      tdOther.textContent = otherColumns.map(column => `${column}: ${data[column][i]}`).join(', ');
       tr.appendChild(tdOther);
       
       ratAttributesBody.appendChild(tr);
-    });
+    }
     
     // Add message if there are more rows
-    if (rows.length > 10) {
+    const rowCount = table.row_count ?? values.length;
+    if (rowCount > displayCount) {
       const tr = document.createElement('tr');
       const td = document.createElement('td');
       td.colSpan = 3;
       td.className = 'text-center text-muted';
-      td.textContent = `...and ${rows.length - 10} more rows`;
+      td.textContent = `...and ${rowCount - displayCount} more rows`;
       tr.appendChild(td);
       ratAttributesBody.appendChild(tr);
     }
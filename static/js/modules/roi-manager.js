@@ -132,22 +132,24 @@ class RoiManager {
   /**
    * Download vector data with ROI intersection
    * @param {string} vectorTable - The vector table name
+   * @param {string} format - Export format (geojson, csv, gpkg, fgb or shp)
    * @returns {string} The download URL
    */
-  getVectorDownloadUrl(vectorTable) {
+  getVectorDownloadUrl(vectorTable, format = "geojson") {
     if (!vectorTable) {
       throw new Error("No vector table specified");
     }
     
-    return `/download_roi_intersection?vector=${encodeURIComponent(vectorTable)}`;
+    return `/download_roi_intersection?vector=${encodeURIComponent(vectorTable)}&format=${encodeURIComponent(format)}`;
   }
 
   /**
    * Download data from current map view
    * @param {string} vectorTable - The vector table name
+   * @param {string} format - Export format (geojson, csv, gpkg, fgb or shp)
    * @returns {string} The download URL
    */
-  getCurrentViewDownloadUrl(vectorTable) {
+  getCurrentViewDownloadUrl(vectorTable, format = "geojson") {
     if (!vectorTable) {
       throw new Error("No vector table specified");
     }
@@ -155,7 +157,7 @@ class RoiManager {
     const bounds = this.map.getBounds();
     const bbox = `${bounds.getSouthWest().lng},${bounds.getSouthWest().lat},${bounds.getNorthEast().lng},${bounds.getNorthEast().lat}`;
     
-    return `/download_map_view?vector=${encodeURIComponent(vectorTable)}&bbox=${encodeURIComponent(bbox)}`;
+    return `/download_map_view?vector=${encodeURIComponent(vectorTable)}&bbox=${encodeURIComponent(bbox)}&format=${encodeURIComponent(format)}`;
   }
 }
 
@@ -0,0 +1,322 @@
+import time
+import asyncio
+import datetime
+import threading
+import contextlib
+import httpx
+import pytest
+import psycopg2.errors
+from flask import Flask, Response, request
+import asgi
+from utils.db_pool import db_connection
+from utils.raster_catalog import RasterCatalogError
+from utils.spatial_registry import VectorTable
+
+TABLE = VectorTable('public', 'szeb_psme_vector', 'geom', 4326, 'MULTIPOLYGON', ('gid', 'name'), 'gid')
+CREATED_AT = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+class FakeConnection:
+    """asyncpg connection streaming the given rows."""
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+    async def execute(self, sql):
+        self.statements.append(sql)
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        yield
+    def cursor(self, query, *params, prefetch=None):
+        self.statements.append(query)
+        async def rows():
+            for row in self.rows:
+                yield row
+        return rows()
+
+class FakePool:
+    """asyncpg pool answering fetchval by the first matching SQL fragment."""
+    def __init__(self, values=None, rows=()):
+        self.values = values or {}
+        self.connection = FakeConnection(rows)
+        self.queries = []
+    async def fetchval(self, sql, *args):
+        self.queries.append((sql, args))
+        for fragment, value in self.values.items():
+            if fragment in sql:
+                return value
+        return None
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield self.connection
+
+class FakeResources:
+    def __init__(self, pool):
+        self._pool = pool
+    async def pool(self, name):
+        return self._pool
+
+class FakeRasterCatalog:
+    def __init__(self, layers=None, error=None):
+        self._layers = layers
+        self.error = error
+    def layers(self, workspace):
+        if self.error:
+            raise self.error
+        return self._layers
+
+@pytest.fixture
+def flask_app():
+    """A small Flask app standing in for the full app behind the async path."""
+    app = Flask(__name__)
+
+    @app.route('/download_map_view')
+    def download_map_view():
+        return {'answered_by': 'flask', 'format': request.args.get('format')}
+
+    return app
+
+@pytest.fixture
+def pool(monkeypatch, flask_app):
+    """Route the async handlers to a fake asyncpg pool and their fallbacks to a small Flask app."""
+    pool = FakePool()
+    monkeypatch.setattr(asgi, 'resources', FakeResources(pool))
+    monkeypatch.setattr(asgi, 'wsgi_application', asgi.ThreadPoolWsgiToAsgi(flask_app, 4))
+    return pool
+
+def session_cookie(session_id):
+    serializer = asgi.flask_app.session_interface.get_signing_serializer(asgi.flask_app)
+    return {asgi.flask_app.config['SESSION_COOKIE_NAME']: serializer.dumps({'session_id': session_id})}
+
+def get(path, app=None, cookies=None, **kwargs):
+    """Send GET requests through the ASGI app, one per path, concurrently."""
+    async def run():
+        transport = httpx.ASGITransport(app=app or asgi.application)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test', cookies=cookies) as client:
+            paths = path if isinstance(path, list) else [path]
+            responses = await asyncio.gather(*[client.get(p, **kwargs) for p in paths])
+            return responses if isinstance(path, list) else responses[0]
+    return asyncio.run(run())
+
+def test_has_roi_reads_the_flask_session(pool):
+    """The Flask session cookie is decoded and looked up in roi_db."""
+    pool.values = {'SELECT EXISTS': True}
+    assert get('/has_roi', cookies=session_cookie('abc')).json() == {'has_roi': True}
+    assert pool.queries[-1][1] == ('abc',)
+    assert get('/has_roi').json() == {'has_roi': False}
+    assert len(pool.queries) == 1
+
+def test_get_roi_answers_conditional_requests(pool):
+    """The ROI is returned with a private ETag, and a matching If-None-Match gets a 304."""
+    pool.values = {'SELECT created_at': CREATED_AT, 'FROM roi_sessions': '{"type": "Polygon"}'}
+    cookies = session_cookie('abc')
+    response = get('/get_roi', cookies=cookies)
+    assert response.status_code == 200
+    assert response.json() == {'status': 'success', 'geojson': '{"type": "Polygon"}'}
+    assert response.headers['cache-control'] == 'private, no-cache'
+
+    revalidated = get('/get_roi', cookies=cookies, headers={'If-None-Match': response.headers['etag']})
+    assert revalidated.status_code == 304
+    assert get('/get_roi').status_code == 404
+
+def test_download_map_view_streams_features(pool, monkeypatch):
+    """GeoJSON map views are streamed from a server-side cursor within the route's time budget."""
+    registry = asgi.flask_app.extensions['spatial_registry']
+    monkeypatch.setattr(registry, 'vector_table', lambda name, refresh=True: TABLE if name == TABLE.table else None)
+    pool.connection.rows = [('{"type": "Feature", "id": 1}',), ('{"type": "Feature", "id": 2}',)]
+
+    response = get('/download_map_view?vector=szeb_psme_vector&bbox=-123,44,-122,45')
+    assert response.status_code == 200
+    assert response.headers['content-disposition'] == 'attachment; filename=map_view.geojson'
+    assert [feature['id'] for feature in response.json()['features']] == [1, 2]
+    assert pool.connection.statements[0].startswith('SET LOCAL statement_timeout')
+    assert 'ST_MakeEnvelope($1, $2, $3, $4, 4326)' in pool.connection.statements[1]
+
+    pool.connection.rows = []
+    assert get('/download_map_view?vector=szeb_psme_vector&bbox=-123,44,-122,45').status_code == 404
+
+def test_unanswerable_reads_fall_back_to_flask(pool, monkeypatch):
+    """Other formats and tables missing from the registry are answered by the Flask app."""
+    registry = asgi.flask_app.extensions['spatial_registry']
+    monkeypatch.setattr(registry, 'vector_table', lambda name, refresh=True: None)
+    response = get('/download_map_view?vector=szeb_psme_vector&bbox=-123,44,-122,45&format=csv')
+    assert response.json() == {'answered_by': 'flask', 'format': 'csv'}
+    response = get('/download_map_view?vector=unknown&bbox=-123,44,-122,45')
+    assert response.json() == {'answered_by': 'flask', 'format': None}
+
+def test_layer_info_is_served_from_cached_schemas(pool, monkeypatch):
+    """Cached layer schemas are answered directly; others fall back to the Flask app."""
+    schema = {'layer': 'roads', 'source': 'postgis', 'geometry': {'name': 'geom', 'type': 'MultiLineString'},
+              'attributes': [{'name': 'name', 'type': 'string'}]}
+    cache = asgi.flask_app.extensions['layer_schema_cache']
+    monkeypatch.setattr(cache, 'cached', lambda layer, changed_at: schema if layer == 'roads' else None)
+    response = get('/api/layer-info/roads')
+    assert response.json()['attributes'] == schema['attributes']
+    assert 'etag' in response.headers
+
+    monkeypatch.setattr(asgi, 'wsgi_application', asgi.ThreadPoolWsgiToAsgi(
+        lambda environ, start_response: start_response('404 NOT FOUND', []) or [b'from flask'], 1))
+    assert get('/api/layer-info/rivers').text == 'from flask'
+
+def test_raster_layers_come_from_the_raster_catalog(pool, monkeypatch):
+    """Raster layers are read from the app's catalog; its errors keep their status code."""
+    extensions = asgi.flask_app.extensions
+    monkeypatch.setitem(extensions, 'raster_catalog', FakeRasterCatalog(layers=[{'name': 'psme'}]))
+    assert get('/api/raster-layers').json() == {'success': True, 'layers': [{'name': 'psme'}]}
+
+    monkeypatch.setitem(extensions, 'raster_catalog', FakeRasterCatalog(error=RasterCatalogError('down', 504)))
+    response = get('/api/raster-layers')
+    assert response.status_code == 504 and response.json() == {'success': False, 'message': 'down'}
+
+def test_cancel_on_disconnect():
+    """A handler still running when the client disconnects is cancelled."""
+    cancelled = []
+
+    async def handler():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def receive():
+        await asyncio.sleep(0.01)
+        return {'type': 'http.disconnect'}
+
+    async def answered():
+        return 'done'
+
+    async def run():
+        request = asgi.Request({'path': '/', 'headers': []}, receive, None)
+        assert await asgi.cancel_on_disconnect(request, answered(), route='test') == 'done'
+        started = time.monotonic()
+        await asgi.cancel_on_disconnect(request, handler(), route='test')
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 1
+    assert cancelled == [True]
+
+def test_wsgi_requests_run_concurrently():
+    """Flask requests run on several pool threads at once."""
+    threads = set()
+
+    def slow_app(environ, start_response):
+        threads.add(threading.current_thread().name)
+        time.sleep(0.3)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'ok']
+
+    started = time.monotonic()
+    responses = get(['/a', '/b', '/c', '/d'], app=asgi.ThreadPoolWsgiToAsgi(slow_app, 4))
+    assert [response.text for response in responses] == ['ok'] * 4
+    assert time.monotonic() - started < 1
+    assert len(threads) == 4
+
+def test_wsgi_request_body_and_environ():
+    """The request body, path, query string and headers reach the WSGI app."""
+    app = Flask(__name__)
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return {'body': request.get_data(as_text=True), 'q': request.args['q'],
+                'header': request.headers['X-Test'], 'cookie': request.cookies.get('a')}
+
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.ThreadPoolWsgiToAsgi(app, 1))
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.post('/echo?q=1', content=b'x' * 100000,
+                                     headers={'X-Test': 'yes', 'Cookie': 'a=b'})
+
+    assert asyncio.run(run()).json() == {'body': 'x' * 100000, 'q': '1', 'header': 'yes', 'cookie': 'b'}
+
+def test_wsgi_stream_is_closed_on_disconnect():
+    """A streamed Flask response stops when its client disconnects."""
+    closed = threading.Event()
+    app = Flask(__name__)
+
+    @app.route('/stream')
+    def stream():
+        def chunks():
+            try:
+                while True:
+                    yield b'chunk'
+                    time.sleep(0.01)
+            finally:
+                closed.set()
+        return Response(chunks())
+
+    async def run():
+        first_chunk = asyncio.Event()
+        messages = []
+        requests = iter([{'type': 'http.request', 'body': b''}])
+
+        async def receive():
+            message = next(requests, None)
+            if message:
+                return message
+            await first_chunk.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if message.get('body'):
+                first_chunk.set()
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/stream', 'query_string': b'', 'headers': []}
+        await asyncio.wait_for(asgi.ThreadPoolWsgiToAsgi(app, 1)(scope, receive, send), timeout=5)
+        return messages
+
+    messages = asyncio.run(run())
+    assert messages[0]['status'] == 200
+    assert closed.is_set()
+
+def test_disconnect_cancels_the_running_query_of_a_flask_request():
+    """A query still running when the client disconnects is cancelled on the server."""
+    started, cancelled = threading.Event(), threading.Event()
+
+    class BlockingConnection:
+        def cancel(self):
+            cancelled.set()
+        def cursor(self):
+            return self
+        def execute(self, query, params=None):
+            started.set()
+            if not cancelled.wait(5):
+                raise AssertionError("query was not cancelled")
+            raise psycopg2.errors.QueryCanceled("canceling statement due to user request")
+        def rollback(self):
+            pass
+
+    class Pool:
+        def getconn(self):
+            return BlockingConnection()
+        def putconn(self, conn, close=False):
+            pass
+
+    app = Flask(__name__)
+    app.extensions['db_pools'] = {'geoserver_db': Pool()}
+
+    @app.route('/slow')
+    def slow():
+        with db_connection('geoserver_db', statement_timeout=0) as conn:
+            conn.cursor().execute("SELECT pg_sleep(60);")
+        return 'done'
+
+    async def run():
+        messages = []
+        requests = iter([{'type': 'http.request', 'body': b''}])
+
+        async def receive():
+            message = next(requests, None)
+            if message:
+                return message
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/slow', 'query_string': b'', 'headers': []}
+        await asyncio.wait_for(asgi.ThreadPoolWsgiToAsgi(app, 1)(scope, receive, send), timeout=5)
+        return messages
+
+    assert asyncio.run(run()) == []
+    assert cancelled.is_set()
@@ -0,0 +1,75 @@
+import io
+import os
+import time
+import hashlib
+import pytest
+from utils.chunked_upload import UploadError, UploadStore
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+def send(upload, index, data=None, checksum=None):
+    chunk = DATA[index * upload.chunk_size:(index + 1) * upload.chunk_size] if data is None else data
+    checksum = checksum or hashlib.sha256(chunk).hexdigest()
+    return upload.write_chunk(index, io.BytesIO(chunk), len(chunk), checksum)
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / 'uploads'), chunk_size=4096, max_size=1024 * 1024, ttl=3600)
+
+def test_chunks_in_any_order_assemble_the_file(store):
+    """Chunks written out of order land at their offsets in one staging file."""
+    upload = store.create('psme.tif', len(DATA), owner='me')
+    assert upload.chunks == 3 and upload.chunk_length(2) == 2048
+    for index in (2, 0, 1):
+        send(upload, index)
+    assert upload.complete
+    path = upload.finish('psme.tif')
+    with open(path, 'rb') as f:
+        assert f.read() == DATA
+    assert not os.path.exists(upload.data_path)
+
+    # A chunk sent again after completion conflicts instead of failing
+    with pytest.raises(UploadError) as excinfo:
+        send(upload, 0)
+    assert excinfo.value.status_code == 409
+
+def test_resume_reports_missing_chunks(store):
+    """A new request sees the chunks received by earlier ones."""
+    upload = store.create('psme.tif', len(DATA), owner='me')
+    send(upload, 1)
+    resumed = store.get(upload.id, owner='me')
+    assert resumed.to_dict()['missing'] == [0, 2]
+    with pytest.raises(UploadError) as excinfo:
+        resumed.finish('psme.tif')
+    assert excinfo.value.status_code == 409
+    with pytest.raises(UploadError) as excinfo:
+        store.get(upload.id, owner='someone else')
+    assert excinfo.value.status_code == 404
+    with pytest.raises(UploadError) as excinfo:
+        store.get(upload.id, owner=None)
+    assert excinfo.value.status_code == 404
+
+def test_corrupt_and_truncated_chunks_are_rejected(store):
+    """Chunks with a wrong checksum or length are not marked as received."""
+    upload = store.create('psme.tif', len(DATA), owner='me')
+    with pytest.raises(UploadError) as excinfo:
+        send(upload, 0, checksum='0' * 64)
+    assert excinfo.value.status_code == 422
+    with pytest.raises(UploadError):
+        upload.write_chunk(0, io.BytesIO(DATA[:100]), 4096, hashlib.sha256(DATA[:4096]).hexdigest())
+    with pytest.raises(UploadError):
+        send(upload, 0, data=DATA[:100])
+    with pytest.raises(UploadError):
+        send(upload, 3)
+    assert store.get(upload.id, owner='me').received == []
+
+def test_limits_and_expiry(store):
+    """Oversized uploads are refused and untouched uploads are swept."""
+    with pytest.raises(UploadError) as excinfo:
+        store.create('big.tif', 2 * 1024 * 1024, owner='me')
+    assert excinfo.value.status_code == 413
+    upload = store.create('psme.tif', len(DATA), owner='me')
+    upload.updated_at = time.time() - 7200
+    upload.save()
+    assert store.sweep() == 1
+    assert not os.path.exists(upload.dir)
@@ -0,0 +1,100 @@
+import contextlib
+import tracemalloc
+import numpy as np
+import pytest
+from utils import classification
+from utils.spatial_registry import VectorTable
+
+TABLE = VectorTable('public', 't', 'geom', 4326, 'MULTIPOLYGON', ('gid', 'density'), 'gid')
+
+# Three well separated clusters
+CLUSTERS = np.concatenate([np.linspace(0, 1, 50), np.linspace(10, 11, 50), np.linspace(20, 21, 50)])
+
+def test_equal_interval():
+    """Equal interval splits the range into classes of the same width."""
+    result = classification.compute_breaks([0, 1, 2, 3, 4, 10], 'equal_interval', 5)
+    assert result['breaks'] == [0, 2, 4, 6, 8, 10]
+    assert result['counts'] == [3, 2, 0, 0, 1]
+
+def test_quantile():
+    """Quantile classes hold the same number of values; tied edges leave empty top classes."""
+    result = classification.compute_breaks(np.arange(100), 'quantile', 4)
+    assert result['counts'] == [25, 25, 25, 25]
+    result = classification.compute_breaks([1, 1, 1, 1, 2], 'quantile', 4)
+    assert result['breaks'] == [1, 2, 2, 2, 2] and result['counts'] == [5, 0, 0, 0]
+
+def test_constant_values_keep_classes_plus_one_breaks():
+    """Every method returns classes + 1 edges, also when all values are equal."""
+    for method in classification.METHODS:
+        result = classification.compute_breaks([4.0] * 10, method, 5)
+        assert result['breaks'] == [4.0] * 6, method
+        assert result['counts'] == [10, 0, 0, 0, 0], method
+
+def test_jenks_finds_clusters():
+    """Natural breaks fall in the gaps between clusters, also when subsampled."""
+    for max_values in (2000, 60):
+        result = classification.compute_breaks(CLUSTERS, 'jenks', 3, jenks_max_values=max_values)
+        assert result['breaks'][0] == 0 and result['breaks'][-1] == 21
+        assert 1 <= result['breaks'][1] < 10 and 11 <= result['breaks'][2] < 20
+        assert result['counts'] == [50, 50, 50]
+
+def test_jenks_few_distinct_values():
+    """Jenks fills the classes it cannot split with empty ones."""
+    result = classification.compute_breaks([3, 3, 7, 7], 'jenks', 5)
+    assert result['breaks'] == [3, 3, 7, 7, 7, 7] and result['counts'] == [2, 2, 0, 0, 0]
+
+def test_jenks_memory_is_bounded():
+    """The Jenks step does not build n x n matrices."""
+    values = np.sort(np.random.default_rng(0).normal(size=2000))
+    tracemalloc.start()
+    try:
+        classification.jenks_breaks(values, 5)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 20 * 1024 * 1024
+
+def test_std_dev():
+    """Standard deviation classes are centred on the mean and span min to max."""
+    values = np.array([-2, -1, 0, 1, 2], dtype=float)
+    result = classification.compute_breaks(values, 'std_dev', 4)
+    assert result['breaks'][0] == -2 and result['breaks'][-1] == 2
+    assert 0 in result['breaks']
+    assert sum(result['counts']) == 5
+
+def fake_connection(monkeypatch, column_type, reltuples, values):
+    queries = []
+    class FakeCursor:
+        def execute(self, query, params=None):
+            queries.append((query, params))
+        def fetchone(self):
+            if len(queries) == 1:
+                return (column_type, reltuples) if column_type else None
+            return (values,)
+        def close(self):
+            pass
+    class FakeConnection:
+        def cursor(self):
+            return FakeCursor()
+    @contextlib.contextmanager
+    def fake_db_connection(name):
+        yield FakeConnection()
+    monkeypatch.setattr(classification, 'db_connection', fake_db_connection)
+    return queries
+
+def test_classify_samples_large_tables(monkeypatch):
+    """Large tables are read through TABLESAMPLE and capped at the sample size."""
+    queries = fake_connection(monkeypatch, 'double precision', 1_000_000, list(CLUSTERS))
+    result = classification.classify(TABLE, 'density', ['quantile', 'jenks'], 3, sample_size=1000)
+    assert result['sampled'] and result['count'] == 150
+    assert set(result['classifications']) == {'quantile', 'jenks'}
+    query, params = queries[1]
+    assert 'TABLESAMPLE BERNOULLI' in query
+    assert params == (pytest.approx(0.12), 1000)
+
+def test_classify_rejects_text_columns(monkeypatch):
+    """Only numeric columns can be classified."""
+    fake_connection(monkeypatch, 'text', 10, [])
+    with pytest.raises(classification.ClassificationError) as excinfo:
+        classification.classify(TABLE, 'density', ['quantile'], 3)
+    assert excinfo.value.status_code == 400
@@ -0,0 +1,65 @@
+import json
+import subprocess
+import pytest
+from flask import Flask
+from utils import cog
+
+@pytest.fixture
+def app():
+    """Provide an app context with COG conversion enabled."""
+    app = Flask(__name__)
+    app.config.update(RASTER_COG_ENABLED=True, RASTER_COG_COMPRESSION='DEFLATE', RASTER_COG_BLOCKSIZE=512,
+                      RASTER_COG_RESAMPLING='AVERAGE', RASTER_COG_TIMEOUT=60)
+    with app.app_context():
+        yield app
+
+def fake_gdal(monkeypatch, layout=None, fail=False):
+    """Replace gdalinfo and gdal_translate; the fake COG is 10 bytes."""
+    commands = []
+    def run(command, **kwargs):
+        commands.append(command)
+        if command[0] == 'gdalinfo':
+            info = {'metadata': {'IMAGE_STRUCTURE': {'LAYOUT': layout}} if layout else {}}
+            return subprocess.CompletedProcess(command, 0, json.dumps(info).encode(), b'')
+        if fail:
+            return subprocess.CompletedProcess(command, 1, b'', b'ERROR 1: not a raster')
+        with open(command[-1], 'wb') as f:
+            f.write(b'0123456789')
+        with open(command[-1] + '.aux.xml', 'w') as f:
+            f.write('<PAMDataset/>')
+        return subprocess.CompletedProcess(command, 0, b'', b'')
+    monkeypatch.setattr(cog.subprocess, 'run', run)
+    return commands
+
+def test_converts_in_place_and_keeps_the_rat(app, tmp_path, monkeypatch):
+    """The COG replaces the upload, the RAT forces NEAREST overviews and stays next to it."""
+    commands = fake_gdal(monkeypatch)
+    raster = tmp_path / 'psme.tif'
+    raster.write_bytes(b'x' * 100)
+    (tmp_path / 'psme.aux.xml').write_text('<PAMDataset><GDALRasterAttributeTable/></PAMDataset>')
+
+    result = cog.optimize_raster(str(raster))
+    assert result['converted'] and result['original_bytes'] == 100 and result['optimized_bytes'] == 10
+    assert result['saved_bytes'] == 90 and result['overview_resampling'] == 'NEAREST'
+    assert raster.read_bytes() == b'0123456789'
+    assert 'GDALRasterAttributeTable' in (tmp_path / 'psme.aux.xml').read_text()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['psme.aux.xml', 'psme.tif']
+    assert 'OVERVIEW_RESAMPLING=NEAREST' in commands[1] and 'COMPRESS=DEFLATE' in commands[1]
+
+def test_existing_cogs_are_skipped(app, tmp_path, monkeypatch):
+    """Rasters GDAL reports as COG are published as they are."""
+    commands = fake_gdal(monkeypatch, layout='COG')
+    raster = tmp_path / 'psme.tif'
+    raster.write_bytes(b'x' * 100)
+    assert cog.optimize_raster(str(raster))['converted'] is False
+    assert len(commands) == 1 and raster.read_bytes() == b'x' * 100
+
+def test_failed_conversion_keeps_the_original(app, tmp_path, monkeypatch):
+    """A GDAL error leaves the upload untouched so it can still be published."""
+    commands = fake_gdal(monkeypatch, fail=True)
+    raster = tmp_path / 'psme.tif'
+    raster.write_bytes(b'x' * 100)
+    result = cog.optimize_raster(str(raster))
+    assert result['converted'] is False and 'not a raster' in result['reason']
+    assert 'OVERVIEW_RESAMPLING=AVERAGE' in commands[1]
+    assert [p.name for p in tmp_path.iterdir()] == ['psme.tif'] and raster.read_bytes() == b'x' * 100
@@ -0,0 +1,86 @@
+import gzip
+import json
+import asyncio
+import pytest
+from flask import Flask, Response, jsonify, stream_with_context
+from utils import compression
+
+@pytest.fixture
+def client():
+    """Provide a client of a bare app with compression enabled."""
+    app = Flask(__name__)
+    app.config.update(COMPRESSION_MIN_SIZE=100, COMPRESSION_LEVEL=6)
+    compression.init_compression(app)
+
+    @app.route('/big')
+    def big():
+        return jsonify({'values': list(range(500))})
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/stream')
+    def stream():
+        def chunks():
+            yield '{"type": "FeatureCollection", "features": ['
+            yield ','.join('{"type": "Feature", "id": %d}' % i for i in range(300))
+            yield ']}'
+        return Response(stream_with_context(chunks()), mimetype='application/json')
+
+    @app.route('/tiff')
+    def tiff():
+        return Response(b'\0' * 5000, mimetype='image/tiff')
+
+    return app.test_client()
+
+def test_json_is_gzipped(client):
+    """Large JSON bodies are gzipped when the client accepts it."""
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data))['values'][-1] == 499
+
+def test_not_accepted_or_too_small(client):
+    """Bodies are sent as is without Accept-Encoding or below the minimum size."""
+    assert 'Content-Encoding' not in client.get('/big').headers
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+
+def test_compressed_types_skipped(client):
+    """Already compressed formats are never recompressed."""
+    response = client.get('/tiff', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.data) == 5000
+
+def test_streamed_response(client):
+    """Streamed bodies are compressed incrementally and saved bytes are counted."""
+    saved = compression.compression_saved_bytes.labels(encoding='gzip')
+    before = saved._value.get()
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert len(json.loads(gzip.decompress(response.data))['features']) == 300
+    assert saved._value.get() > before
+
+def test_asgi_send_wrapper():
+    """The ASGI wrapper compresses streamed JSON and drops Content-Length."""
+    sent = []
+    async def send(message):
+        sent.append(message)
+    scope = {'method': 'GET', 'headers': [(b'accept-encoding', b'gzip')]}
+    wrapped = compression.asgi_compressing_send(scope, send, min_size=10)
+
+    async def respond():
+        await wrapped({'type': 'http.response.start', 'status': 200,
+                       'headers': [(b'content-type', b'application/json'), (b'content-length', b'999')]})
+        for i in range(100):
+            await wrapped({'type': 'http.response.body', 'body': b'{"id": %d},' % i, 'more_body': True})
+        await wrapped({'type': 'http.response.body', 'body': b'{}'})
+    asyncio.run(respond())
+
+    headers = dict(sent[0]['headers'])
+    assert headers[b'content-encoding'] == b'gzip'
+    assert b'content-length' not in headers
+    body = gzip.decompress(b''.join(message['body'] for message in sent[1:]))
+    assert body.endswith(b'{"id": 99},{}')
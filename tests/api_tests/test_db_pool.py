@@ -0,0 +1,116 @@
+import pytest
+import psycopg2.errors
+import psycopg2.extensions
+from flask import Flask
+from utils.db_pool import (REQUEST_QUERIES_KEY, ClientDisconnected, ConnectionPool, PoolTimeout, QueryTimeout,
+                           RequestQueries, db_connection, query_cancellations)
+
+class FakeInfo:
+    transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+class FakeConnection:
+    """Minimal stand-in for a psycopg2 connection."""
+    def __init__(self):
+        self.closed = 0
+        self.info = FakeInfo()
+
+    def close(self):
+        self.closed = 1
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self)
+
+class FakeCursor:
+    """Cursor recording executed statements on its connection."""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        self.conn.executed = getattr(self.conn, 'executed', []) + [(query, params)]
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Create a pool that hands out fake connections."""
+    pool = ConnectionPool('test_db', {}, max_connections=2, timeout=0.1)
+    monkeypatch.setattr(pool, '_connect', FakeConnection)
+    return pool
+
+def test_connection_is_reused(pool):
+    """Test that a returned connection is handed out again."""
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+
+def test_checkout_times_out_when_exhausted(pool):
+    """Test that checkout waits at most the configured timeout."""
+    pool.getconn()
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+def test_closed_connection_is_replaced(pool):
+    """Test that a connection closed while idle is not handed out."""
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.closed = 1
+    assert pool.getconn() is not conn
+
+@pytest.fixture
+def app(pool):
+    """Create an app using the fake pool with per-route statement budgets."""
+    app = Flask(__name__)
+    app.config['STATEMENT_TIMEOUTS'] = {'slow_route': 100}
+    app.config['STATEMENT_TIMEOUT_DEFAULT'] = 0
+    app.extensions['db_pools'] = {'test_db': pool}
+    app.add_url_rule('/slow', 'slow_route', lambda: '')
+    return app
+
+def test_route_budget_sets_statement_timeout(app):
+    """Test that connections in a request get the route's statement_timeout."""
+    with app.test_request_context('/slow'):
+        with db_connection('test_db') as conn:
+            pass
+    assert conn.executed == [("SET LOCAL statement_timeout = %s;", (100,))]
+
+def test_unlimited_outside_requests(app):
+    """Test that no budget is applied where none is configured."""
+    with app.app_context():
+        with db_connection('test_db') as conn:
+            pass
+    assert not getattr(conn, 'executed', [])
+
+def test_cancelled_query_raises_timeout(app):
+    """Test that a query cancelled by the budget surfaces as QueryTimeout."""
+    with app.test_request_context('/slow'):
+        with pytest.raises(QueryTimeout):
+            with db_connection('test_db'):
+                raise psycopg2.errors.QueryCanceled("canceling statement due to statement timeout")
+
+def test_disconnected_client_cancels_running_query(app):
+    """Test that cancelling a request's queries cancels its open connections and counts a disconnect."""
+    queries = RequestQueries()
+    cancelled = []
+    with app.test_request_context('/slow', environ_base={REQUEST_QUERIES_KEY: queries}):
+        with pytest.raises(psycopg2.errors.QueryCanceled):
+            with db_connection('test_db') as conn:
+                conn.cancel = lambda: cancelled.append(conn)
+                queries.cancel()
+                raise psycopg2.errors.QueryCanceled("canceling statement due to user request")
+        assert cancelled == [conn]
+        assert query_cancellations.labels(route='slow_route', reason='client_disconnect')._value.get() >= 1
+
+        # The connection went back to the pool and is no longer tracked
+        queries.cancel()
+        assert cancelled == [conn]
+        with pytest.raises(ClientDisconnected):
+            with db_connection('test_db'):
+                pass
@@ -0,0 +1,68 @@
+import os
+import pytest
+from flask import Flask, jsonify
+from utils import compression, etags
+
+@pytest.fixture
+def app(tmp_path):
+    """Provide a bare app with a versioned view and compression enabled."""
+    app = Flask(__name__)
+    app.config.update(CATALOG_REVISION_FILE=str(tmp_path / 'catalog_revision'), CATALOG_REVISION_TTL=0,
+                      COMPRESSION_MIN_SIZE=10, COMPRESSION_LEVEL=6)
+    compression.init_compression(app)
+    app.calls = 0
+
+    @app.route('/layers')
+    @etags.conditional(etags.catalog_revision)
+    def layers():
+        app.calls += 1
+        return jsonify({'layers': ['a', 'b'] * 20})
+
+    @app.route('/missing')
+    @etags.conditional(lambda: None)
+    def missing():
+        return jsonify({'status': 'error'}), 404
+
+    return app
+
+def test_not_modified_skips_view(app):
+    """A matching If-None-Match is answered with 304 without running the view."""
+    client = app.test_client()
+    first = client.get('/layers')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+    etag = first.headers['ETag']
+
+    second = client.get('/layers', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.headers['ETag'] == etag
+    assert app.calls == 1
+
+def test_catalog_change_invalidates(app):
+    """Bumping the catalog revision changes the ETag."""
+    client = app.test_client()
+    etag = client.get('/layers').headers['ETag']
+    with app.app_context():
+        etags.bump_catalog_revision()
+        os.utime(app.config['CATALOG_REVISION_FILE'], ns=(1, 1))
+    response = client.get('/layers', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_compressed_representation(app):
+    """Compressed bodies get their own strong ETag, which still revalidates."""
+    client = app.test_client()
+    plain = client.get('/layers').headers['ETag']
+    compressed = client.get('/layers', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['ETag'] == plain[:-1] + '-gzip"'
+
+    response = client.get('/layers', headers={'Accept-Encoding': 'gzip',
+                                              'If-None-Match': compressed.headers['ETag']})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == compressed.headers['ETag']
+
+def test_no_version(app):
+    """Views without a data version run unconditionally and get no ETag."""
+    response = app.test_client().get('/missing', headers={'If-None-Match': '*'})
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
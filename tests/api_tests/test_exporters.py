@@ -0,0 +1,36 @@
+import csv
+import io
+import pytest
+from flask import Flask
+from utils import exporters
+from utils.spatial_registry import VectorTable
+
+TABLE = VectorTable('public', 't', 'geom', 4326, 'MULTIPOLYGON', ('id', 'Range'))
+
+@pytest.fixture
+def app_context():
+    """Provide a bare app context carrying the export settings."""
+    app = Flask(__name__)
+    app.config['EXPORT_BATCH_SIZE'] = 10
+    with app.app_context():
+        yield
+
+def test_csv_export_replaces_geometry_with_wkt(app_context, monkeypatch):
+    """Test that CSV exports drop the raw geometry and keep the WKT column."""
+    def fake_iter_rows(db_name, query, params=None, batch_size=500, header=False):
+        yield ('id', 'Range', 'geom', 'wkt')
+        yield (1, 'North', '0101000020E6', 'POINT(1 2)')
+        yield (2, 'South', '0101000020E6', 'POINT(3 4)')
+    monkeypatch.setattr(exporters, 'iter_rows', fake_iter_rows)
+
+    body = ''.join(exporters.export_features('csv', TABLE, 'FROM t v', ()))
+    rows = list(csv.reader(io.StringIO(body)))
+    assert rows == [['id', 'Range', 'wkt'], ['1', 'North', 'POINT(1 2)'], ['2', 'South', 'POINT(3 4)']]
+
+def test_csv_export_without_features(app_context, monkeypatch):
+    """Test that an empty CSV export is reported as None."""
+    def fake_iter_rows(db_name, query, params=None, batch_size=500, header=False):
+        yield ('id', 'geom', 'wkt')
+    monkeypatch.setattr(exporters, 'iter_rows', fake_iter_rows)
+
+    assert exporters.export_features('csv', TABLE, 'FROM t v', ()) is None
@@ -0,0 +1,21 @@
+import json
+from utils.feature_stream import peek, geojson_chunks
+
+def rows_of(*features):
+    """Mimic iter_rows by yielding single-column rows."""
+    for feature in features:
+        yield (feature,)
+
+def test_peek_empty_stream():
+    """Test that an empty stream is reported as None."""
+    assert peek(rows_of()) is None
+
+def test_feature_collection_is_valid_json():
+    """Test that streamed chunks form a valid FeatureCollection."""
+    features = [json.dumps({"type": "Feature", "geometry": None, "properties": {"id": i}}) for i in range(3)]
+    rows = peek(rows_of(*features))
+    body = ''.join(geojson_chunks(row[0] for row in rows))
+
+    data = json.loads(body)
+    assert data['type'] == 'FeatureCollection'
+    assert [f['properties']['id'] for f in data['features']] == [0, 1, 2]
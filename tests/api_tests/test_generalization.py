@@ -0,0 +1,48 @@
+import pytest
+from utils.feature_stream import feature_query
+from utils.generalization import (Generalization, InvalidGeneralization, NO_GENERALIZATION,
+                                  parse_generalization, precision_for, zoom_tolerance)
+
+def test_no_parameters_keep_full_resolution():
+    """Without parameters geometries are not generalized, even with a bbox."""
+    assert parse_generalization({}) == NO_GENERALIZATION
+    assert parse_generalization({}, bbox=(-124, 42, -116, 46)) == NO_GENERALIZATION
+    assert feature_query('FROM t v').count('ST_AsGeoJSON(v.geom)') == 1
+
+def test_zoom_gives_one_pixel_tolerance():
+    """A zoom level simplifies to the size of one screen pixel."""
+    generalization = parse_generalization({'zoom': '6'})
+    assert generalization.tolerance == pytest.approx(360 / (256 * 64))
+    assert generalization.precision == 3
+
+def test_explicit_values_take_precedence():
+    """Tolerance wins over zoom and precision is capped to ST_AsGeoJSON's maximum."""
+    generalization = parse_generalization({'tolerance': '0.01', 'zoom': '3', 'precision': '15'})
+    assert generalization == Generalization(0.01, 9)
+
+def test_bbox_default():
+    """generalize=1 derives the tolerance from the width of the requested bbox."""
+    generalization = parse_generalization({'generalize': '1'}, bbox=(-124, 42, -116, 46))
+    assert generalization.tolerance == pytest.approx(8 / 1024)
+    assert generalization.precision == precision_for(8 / 1024)
+
+def test_invalid_parameters():
+    """Malformed or negative values are rejected with a 400."""
+    for args in ({'zoom': 'far'}, {'tolerance': '-1'}, {'precision': '1.5'}, {'tolerance': 'nan'}):
+        with pytest.raises(InvalidGeneralization) as excinfo:
+            parse_generalization(args)
+        assert excinfo.value.status_code == 400
+
+def test_non_finite_parameters_are_not_called_negative():
+    """NaN and infinity are reported as not finite."""
+    for value in ('nan', 'inf', '-inf'):
+        with pytest.raises(InvalidGeneralization, match="must be a finite number"):
+            parse_generalization({'tolerance': value})
+
+def test_geojson_sql():
+    """Simplification and precision are applied inside ST_AsGeoJSON."""
+    generalization = Generalization(zoom_tolerance(0), 2)
+    assert generalization.geojson_sql('v.geom') == 'ST_AsGeoJSON(ST_SimplifyPreserveTopology(v.geom, 1.40625), 2)'
+    assert Generalization(None, 5).geojson_sql('geom') == 'ST_AsGeoJSON(geom, 5)'
+    assert generalization.cache_key != Generalization(None, 5).cache_key
+    assert NO_GENERALIZATION.cache_key == ''
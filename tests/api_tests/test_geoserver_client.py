@@ -0,0 +1,49 @@
+import pytest
+import requests
+from utils import geoserver_client
+
+CONFIG = {
+    "GEOSERVER_URL": "http://geoserver.test/geoserver/",
+    "GEOSERVER_USER": "user",
+    "GEOSERVER_PASS": "secret",
+    "GEOSERVER_POOL_SIZE": 4,
+    "GEOSERVER_CONNECT_TIMEOUT": 2,
+    "GEOSERVER_READ_TIMEOUT": 20,
+    "GEOSERVER_RETRIES": 3,
+    "GEOSERVER_RETRY_BACKOFF": 0.5,
+}
+
+def test_request_defaults(monkeypatch):
+    """Paths resolve against GEOSERVER_URL and calls get the configured auth and timeouts."""
+    calls = []
+    monkeypatch.setattr(requests.Session, 'request',
+                        lambda self, method, url, **kwargs: calls.append((method, url, kwargs)))
+    client = geoserver_client.GeoServerClient(dict(CONFIG))
+    client.get('/rest/layers.json', 'list_layers')
+    client.get('/wfs', 'wfs_get_feature', auth=None, timeout=1)
+    client.post('http://other.test/rest', 'publish')
+
+    assert calls[0] == ('GET', 'http://geoserver.test/geoserver/rest/layers.json',
+                        {'auth': ('user', 'secret'), 'timeout': (2, 20)})
+    assert calls[1][2] == {'auth': None, 'timeout': 1}
+    assert calls[2][:2] == ('POST', 'http://other.test/rest')
+
+def test_only_idempotent_requests_are_retried():
+    """POSTs are never retried; the pool size comes from the config."""
+    client = geoserver_client.GeoServerClient(dict(CONFIG))
+    adapter = client.session.get_adapter('http://geoserver.test')
+    assert adapter._pool_maxsize == 4
+    assert adapter.max_retries.total == 3
+    assert 'POST' not in adapter.max_retries.allowed_methods
+    assert 'PUT' in adapter.max_retries.allowed_methods
+
+def test_connection_errors_are_counted(monkeypatch):
+    """Failed calls raise and are counted per operation."""
+    def fail(self, method, url, **kwargs):
+        raise requests.ConnectionError("refused")
+    monkeypatch.setattr(requests.Session, 'request', fail)
+    errors = geoserver_client.geoserver_request_errors.labels(operation='test_failure')
+    before = errors._value.get()
+    with pytest.raises(requests.ConnectionError):
+        geoserver_client.GeoServerClient(dict(CONFIG)).get('/rest', 'test_failure')
+    assert errors._value.get() == before + 1
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+import pytest
+from flask import Flask
+from utils.jobs import JobManager, JobError, SUCCEEDED, FAILED, CANCELLED
+
+@pytest.fixture
+def manager(tmp_path):
+    """Create a job manager with a single worker."""
+    return JobManager(Flask(__name__), str(tmp_path), max_workers=1, result_ttl=60)
+
+def wait_finished(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job.state
+
+def test_job_writes_result_file(manager):
+    """Test that a successful job publishes its result file and return value."""
+    def handler(job):
+        job.write_result(['a', b'b'])
+        job.set_result_file('out.txt', 'text/plain')
+        return {'rows': 2}
+    manager.register('export', handler)
+
+    job = manager.submit('export', {}, owner='s1')
+    assert wait_finished(job) == SUCCEEDED
+    assert job.to_dict()['has_file'] and job.result == {'rows': 2}
+    with open(job.result_path, 'rb') as f:
+        assert f.read() == b'ab'
+
+def test_failed_job_records_error(manager):
+    """Test that handler exceptions mark the job as failed."""
+    def handler(job):
+        raise ValueError("No intersection data found.")
+    manager.register('export', handler)
+
+    job = manager.submit('export', {}, owner='s1')
+    assert wait_finished(job) == FAILED
+    assert job.error == "No intersection data found."
+
+def test_running_job_can_be_cancelled(manager):
+    """Test that a running job stops at its next cancellation check."""
+    started = threading.Event()
+    def handler(job):
+        started.set()
+        while True:
+            job.check_cancelled()
+            time.sleep(0.01)
+    manager.register('slow', handler)
+
+    job = manager.submit('slow', {}, owner='s1')
+    assert started.wait(5)
+    manager.cancel(job)
+    assert wait_finished(job) == CANCELLED
+
+def test_job_is_cancelled_from_another_process(manager, tmp_path):
+    """Test that a job polls the persisted cancellation flag set through another manager."""
+    started = threading.Event()
+    def handler(job):
+        started.set()
+        while True:
+            job.check_cancelled()
+            time.sleep(0.01)
+    manager.register('slow', handler)
+
+    job = manager.submit('slow', {}, owner='s1')
+    assert started.wait(5)
+    other = JobManager(Flask(__name__), str(tmp_path), max_workers=1)
+    other.cancel(other.get(job.id, owner='s1'))
+    assert wait_finished(job) == CANCELLED
+    assert other.get(job.id, owner='s1').state == CANCELLED
+
+def test_jobs_are_listed_from_the_persisted_state(manager, tmp_path):
+    """Test that any manager sharing the jobs directory lists a session's jobs."""
+    manager.register('noop', lambda job: None)
+    first = manager.prepare('noop', {}, owner='s1')
+    manager.prepare('noop', {}, owner='s2')
+    other = JobManager(Flask(__name__), str(tmp_path), max_workers=1)
+    assert [job.id for job in other.list('s1')] == [first.id]
+
+def test_jobs_are_private_to_their_session(manager):
+    """Test that other sessions cannot look up a job."""
+    manager.register('noop', lambda job: None)
+    job = manager.submit('noop', {}, owner='s1')
+    assert manager.get(job.id, owner='s1') is job
+    with pytest.raises(JobError):
+        manager.get(job.id, owner='s2')
+    with pytest.raises(JobError):
+        manager.get(job.id, owner=None)
+    with pytest.raises(JobError):
+        manager.get('../etc', owner='s1')
+
+def test_unfinished_jobs_resume_after_restart(tmp_path):
+    """Test that queued jobs are rerun and jobs with secrets fail after a restart."""
+    first = JobManager(Flask(__name__), str(tmp_path), max_workers=1)
+    first.register('export', lambda job: None)
+    plain = first.prepare('export', {'n': 1}, owner='s1')
+    secret = first.prepare('export', {}, owner='s1', secrets={'password': 'x'})
+
+    second = JobManager(Flask(__name__), str(tmp_path), max_workers=1)
+    second.register('export', lambda job: {'n': job.params['n']})
+    second.resume()
+    resumed = second.get(plain.id, owner='s1')
+    assert wait_finished(resumed) == SUCCEEDED and resumed.result == {'n': 1}
+    assert second.get(secret.id, owner='s1').state == FAILED
+    assert 'password' not in open(os.path.join(secret.dir, 'job.json')).read()
+
+def test_sweep_removes_expired_jobs(manager):
+    """Test that finished jobs are deleted once their results expire."""
+    manager.register('noop', lambda job: None)
+    job = manager.submit('noop', {}, owner='s1')
+    wait_finished(job)
+    assert manager.sweep() == 0
+    job.finished_at -= 120
+    assert manager.sweep() == 1
+    assert not os.path.exists(job.dir)
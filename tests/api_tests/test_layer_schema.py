@@ -0,0 +1,104 @@
+import contextlib
+import pytest
+from flask import Flask
+from api.species_routes import layer_info
+from utils import layer_schema
+from utils.etags import bump_catalog_revision
+from utils.spatial_registry import VectorTable
+
+DESCRIBED = {
+    'roads': [{'name': 'the_geom', 'type': 'gml:MultiLineString', 'localType': 'MultiLineString'},
+              {'name': 'name', 'type': 'xsd:string', 'localType': 'string'}],
+    'rivers': [{'name': 'geom', 'type': 'gml:LineString', 'localType': 'LineString'},
+               {'name': 'length', 'type': 'xsd:number', 'localType': 'number'}],
+}
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+        self.ok = status_code < 400
+    def json(self):
+        if self.data is None:
+            raise ValueError("not JSON")
+        return self.data
+
+class FakeClient:
+    """Answers DescribeFeatureType for the layers in DESCRIBED."""
+    def __init__(self):
+        self.requests = []
+    def get(self, path, operation, params=None, **kwargs):
+        names = [name.split(':')[-1] for name in params['typeNames'].split(',')]
+        self.requests.append(names)
+        if any(name not in DESCRIBED for name in names):
+            return FakeResponse(None, 400)
+        return FakeResponse({'featureTypes': [{'typeName': name, 'properties': DESCRIBED[name]} for name in names]})
+
+class FakeRegistry:
+    tables = {'density': VectorTable('public', 'density', 'geom', 4326, 'MULTIPOLYGON', ('gid', 'value'), 'gid')}
+    def vector_table(self, name, refresh=True):
+        return self.tables.get(name.split(':')[-1])
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Provide an app context with a fake GeoServer, registry and database."""
+    app = Flask(__name__)
+    app.config["CATALOG_REVISION_FILE"] = str(tmp_path / 'revision')
+    app.extensions['geoserver_client'] = FakeClient()
+    monkeypatch.setattr(layer_schema, 'get_spatial_registry', lambda: FakeRegistry())
+
+    class FakeCursor:
+        def execute(self, query, params=None):
+            self.params = params
+        def fetchall(self):
+            return [('public', 'density', 'gid', 'integer', True), ('public', 'density', 'geom', 'geometry', False),
+                    ('public', 'density', 'value', 'double precision', False)]
+        def close(self):
+            pass
+    class FakeConnection:
+        def cursor(self):
+            return FakeCursor()
+    @contextlib.contextmanager
+    def fake_db_connection(name):
+        yield FakeConnection()
+    monkeypatch.setattr(layer_schema, 'db_connection', fake_db_connection)
+    with app.app_context():
+        yield app
+
+def test_postgis_and_wfs_layers(app):
+    """PostGIS tables are described from the catalog, other layers in one WFS request."""
+    schemas = layer_schema.LayerSchemaCache().get_many(['density', 'roads', 'rivers'])
+    assert schemas['density']['source'] == 'postgis'
+    assert schemas['density']['geometry'] == {'name': 'geom', 'type': 'MULTIPOLYGON'}
+    # The primary key is a feature ID, as in WFS schemas
+    assert schemas['density']['attributes'] == [{'name': 'value', 'type': 'double precision'}]
+    assert schemas['roads'] == {'layer': 'roads', 'source': 'wfs',
+                                'geometry': {'name': 'the_geom', 'type': 'MultiLineString'},
+                                'attributes': [{'name': 'name', 'type': 'string'}]}
+    assert app.extensions['geoserver_client'].requests == [['roads', 'rivers']]
+
+def test_unknown_layers_are_described_one_by_one(app):
+    """A rejected batch is retried per layer so the known layers are still described."""
+    schemas = layer_schema.LayerSchemaCache().get_many(['roads', 'missing'])
+    assert set(schemas) == {'roads'}
+    assert app.extensions['geoserver_client'].requests == [['roads', 'missing'], ['roads'], ['missing']]
+
+def test_schemas_are_cached_until_the_catalog_changes(app):
+    """Cached schemas are reused; a catalog change describes the layer again."""
+    client = app.extensions['geoserver_client']
+    cache = layer_schema.LayerSchemaCache()
+    cache.get('roads')
+    assert cache.get('roads')['layer'] == 'roads'
+    assert len(client.requests) == 1
+
+    bump_catalog_revision()
+    assert cache.cached('roads', layer_schema.catalog_changed_at()) is None
+    cache.get('roads')
+    assert len(client.requests) == 2
+
+def test_layer_info_lists_attribute_types(app):
+    """Layer info carries the attributes and a name -> type map, not sample values."""
+    info = layer_info(layer_schema.LayerSchemaCache().get('roads'))
+    assert info['attributes'] == [{'name': 'name', 'type': 'string'}]
+    assert info['types'] == {'name': 'string'}
+    assert 'properties' not in info
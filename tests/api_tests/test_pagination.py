@@ -0,0 +1,72 @@
+import json
+import contextlib
+import pytest
+from flask import Flask
+from utils import pagination
+from utils.spatial_registry import VectorTable
+
+TABLE = VectorTable('public', 't', 'geom', 4326, 'MULTIPOLYGON', ('gid', 'Range'), 'gid')
+
+class FakeCursor:
+    """Cursor answering the EXPLAIN estimate and a page query."""
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+        self.result = [([{'Plan': {'Plan Rows': 1234}}],)] if query.startswith('EXPLAIN') else self.rows
+    def fetchone(self):
+        return self.result[0]
+    def fetchall(self):
+        return self.result
+    def close(self):
+        pass
+
+@pytest.fixture
+def app_context():
+    """Provide an app context with a signing key."""
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    with app.app_context():
+        yield
+
+def use_rows(monkeypatch, rows):
+    cur = FakeCursor(rows)
+    class FakeConnection:
+        def cursor(self):
+            return cur
+    @contextlib.contextmanager
+    def fake_db_connection(name):
+        yield FakeConnection()
+    monkeypatch.setattr(pagination, 'db_connection', fake_db_connection)
+    return cur
+
+def feature_rows(keys):
+    return [(json.dumps({'type': 'Feature', 'id': key}), key) for key in keys]
+
+def test_first_page_has_estimate_and_cursor(app_context, monkeypatch):
+    """Test that a full first page reports the estimate and a continuation token."""
+    cur = use_rows(monkeypatch, feature_rows([1, 2, 3]))
+    page = json.loads(pagination.fetch_page(TABLE, 'true', (), limit=2))
+    assert [f['id'] for f in page['features']] == [1, 2]
+    assert page['estimated_total'] == 1234
+    assert pagination.decode_cursor(page['next_cursor'], pagination.filter_fingerprint(TABLE, ())) == 2
+    assert cur.queries[-1][1] == (3,)
+
+def test_next_page_continues_after_last_key(app_context, monkeypatch):
+    """Test that a cursor adds the keyset condition instead of an offset."""
+    token = pagination.encode_cursor(pagination.filter_fingerprint(TABLE, (1.0,)), 2)
+    cur = use_rows(monkeypatch, feature_rows([3]))
+    page = json.loads(pagination.fetch_page(TABLE, 'x = %s', (1.0,), limit=2, cursor=token))
+    query, params = cur.queries[-1]
+    assert 'v."gid" > %s' in query and 'OFFSET' not in query
+    assert params == (1.0, 2, 3)
+    assert page['next_cursor'] is None and 'estimated_total' not in page
+
+def test_cursor_rejected_for_other_query(app_context):
+    """Test that tokens cannot be replayed with a different filter or tampered with."""
+    token = pagination.encode_cursor(pagination.filter_fingerprint(TABLE, (1.0,)), 2)
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(token, pagination.filter_fingerprint(TABLE, (2.0,)))
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(token + 'x', pagination.filter_fingerprint(TABLE, (1.0,)))
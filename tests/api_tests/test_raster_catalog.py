@@ -0,0 +1,81 @@
+import threading
+import time
+import pytest
+from flask import Flask
+from utils import raster_catalog
+from utils.etags import bump_catalog_revision
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.reason = 'Error'
+    def json(self):
+        return self.data
+
+class FakeClient:
+    """Serves stores a, b and c, each with two coverages, slowly."""
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+        self.version = 1
+    def get(self, path, operation, **kwargs):
+        self.calls.append(operation)
+        if operation == 'list_coveragestores':
+            return FakeResponse({'coverageStores': {'coverageStore': [{'name': n} for n in 'abc']}})
+        self.threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        store = path.split('/')[-2]
+        return FakeResponse({'coverages': {'coverage': [{'name': f"{store}{i}_v{self.version}"} for i in (1, 2)]}})
+
+@pytest.fixture
+def app(tmp_path):
+    """Provide an app context with a fake GeoServer client."""
+    app = Flask(__name__)
+    app.config["CATALOG_REVISION_FILE"] = str(tmp_path / 'revision')
+    app.extensions['geoserver_client'] = FakeClient()
+    with app.app_context():
+        yield app
+
+def test_stores_are_listed_concurrently(app):
+    """Per-store requests run in parallel and the result keeps the store order."""
+    catalog = raster_catalog.RasterCatalog(max_workers=3)
+    started = time.monotonic()
+    assert catalog.layers('ws') == ['a1_v1', 'a2_v1', 'b1_v1', 'b2_v1', 'c1_v1', 'c2_v1']
+    assert time.monotonic() - started < 0.14
+    assert len(app.extensions['geoserver_client'].threads) == 3
+
+def test_fresh_lists_are_served_from_memory(app):
+    """Within the TTL, GeoServer is not called again; a catalog change forces a fetch."""
+    client = app.extensions['geoserver_client']
+    catalog = raster_catalog.RasterCatalog(ttl=60)
+    catalog.layers('ws')
+    catalog.layers('ws')
+    assert client.calls.count('list_coveragestores') == 1
+
+    client.version = 2
+    bump_catalog_revision()
+    assert catalog.layers('ws')[0] == 'a1_v2'
+    assert client.calls.count('list_coveragestores') == 2
+
+def test_stale_lists_are_refreshed_in_the_background(app):
+    """An expired list is served while a fresh one is fetched."""
+    client = app.extensions['geoserver_client']
+    catalog = raster_catalog.RasterCatalog(ttl=0, stale_ttl=60)
+    catalog.layers('ws')
+    client.version = 2
+    assert catalog.layers('ws')[0] == 'a1_v1'
+    for _ in range(50):
+        if not catalog._refreshing:
+            break
+        time.sleep(0.02)
+    assert catalog._entries['ws'][0][0] == 'a1_v2'
+
+def test_store_listing_errors(app):
+    """A failed store listing raises and is not cached."""
+    catalog = raster_catalog.RasterCatalog()
+    app.extensions['geoserver_client'].get = lambda path, operation, **kwargs: FakeResponse({}, 503)
+    with pytest.raises(raster_catalog.RasterCatalogError):
+        catalog.layers('ws')
+    assert catalog._entries == {}
@@ -0,0 +1,109 @@
+import contextlib
+from flask import Response
+from utils import raster_clip
+from utils.spatial_registry import RasterTable
+
+TABLE = RasterTable('public', 'szeb', 'rast', 3857, 30.0, -30.0)
+
+class FakeCursor:
+    """Cursor returning canned rows in order."""
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.queries = []
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+    def fetchone(self):
+        return self.rows.pop(0)
+    def close(self):
+        pass
+
+def test_estimate_uses_registry_scale():
+    """Test that the pixel estimate divides the ROI extent by the pixel size."""
+    cur = FakeCursor([(3000.0, 600.0)])
+    assert raster_clip.estimate_clip_pixels(cur, TABLE, 'sid') == 100 * 20
+    assert len(cur.queries) == 1
+
+def test_estimate_reads_scale_from_tile_when_unconstrained():
+    """Test that rasters without scale constraints read it from a tile."""
+    table = TABLE._replace(scale_x=None, scale_y=None)
+    cur = FakeCursor([(10.0, -10.0), (1000.0, 500.0)])
+    assert raster_clip.estimate_clip_pixels(cur, table, 'sid') == 100 * 50
+
+def test_estimate_without_intersecting_tiles():
+    """Test that an unconstrained raster outside the ROI estimates zero pixels."""
+    table = TABLE._replace(scale_x=None, scale_y=None)
+    assert raster_clip.estimate_clip_pixels(FakeCursor([None]), table, 'sid') == 0
+
+def test_roi_tiles_sql_filters_on_roi_parts():
+    """Test that tiles are selected through the ROI parts in the raster's SRID."""
+    sql = raster_clip.roi_tiles_sql(TABLE)
+    assert 'FROM "public"."szeb" r' in sql
+    assert 'ST_Intersects(r."rast", ST_Transform(p.geom, 3857))' in sql
+
+class FakeLargeObject:
+    """Large object over a bytes buffer, counting reads."""
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.reads = 0
+        self.unlinked = False
+    def seek(self, offset, whence=0):
+        self.position = len(self.data) + offset if whence == 2 else offset
+        return self.position
+    def read(self, size):
+        self.reads += 1
+        chunk = self.data[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+    def unlink(self):
+        self.unlinked = True
+
+class FakeConnection:
+    def __init__(self, rows, lobject):
+        self.rows = rows
+        self.large_object = lobject
+        self.released = False
+    def cursor(self):
+        return FakeCursor(self.rows)
+    def lobject(self, oid, mode):
+        return self.large_object
+
+def fake_db(monkeypatch, conn):
+    @contextlib.contextmanager
+    def db_connection(name):
+        try:
+            yield conn
+        finally:
+            conn.released = True
+    monkeypatch.setattr(raster_clip, 'db_connection', db_connection)
+
+def test_clip_is_streamed_from_a_large_object(monkeypatch):
+    """Test that the GeoTIFF is read in chunks while the response is sent."""
+    data = bytes(range(256)) * 600
+    conn = FakeConnection([(16384,)], FakeLargeObject(data))
+    fake_db(monkeypatch, conn)
+    tiff = raster_clip.clip_raster(TABLE, 'sid', '{}', max_pixels=0)
+    assert tiff.size == len(data) and conn.large_object.reads == 0
+
+    response = Response(tiff, mimetype='image/tiff')
+    assert response.is_streamed
+    chunks = list(response.response)
+    assert [len(c) for c in chunks] == [65536, 65536, 22528]
+    assert b''.join(chunks) == data
+    assert conn.large_object.unlinked and conn.released
+
+def test_closed_download_releases_the_connection(monkeypatch):
+    """Test that a client disconnect ends the transaction, which drops the large object."""
+    conn = FakeConnection([(16384,)], FakeLargeObject(b'x' * 200000))
+    fake_db(monkeypatch, conn)
+    tiff = raster_clip.clip_raster(TABLE, 'sid', '{}', max_pixels=0)
+    next(iter(tiff))
+    tiff.close()
+    assert conn.released and not conn.large_object.unlinked
+
+def test_clip_without_intersecting_tiles(monkeypatch):
+    """Test that no GeoTIFF means no download, and the connection is returned."""
+    conn = FakeConnection([None], None)
+    fake_db(monkeypatch, conn)
+    assert raster_clip.clip_raster(TABLE, 'sid', '{}', max_pixels=0) is None
+    assert conn.released
@@ -0,0 +1,62 @@
+import io
+import time
+from utils.rat import parse_rat
+
+def pam(rows, band='1', field_index=False):
+    """Build a PAM document in GDAL's format with Value, Name and Density columns."""
+    fields = ''.join(
+        f'<Row index="{i}">' + ''.join(
+            f'<F index="{j}">{value}</F>' if field_index else f'<F>{value}</F>'
+            for j, value in enumerate(row)) + '</Row>'
+        for i, row in enumerate(rows))
+    return io.BytesIO(f'''<PAMDataset><PAMRasterBand band="{band}">
+      <Histograms><HistItem><HistCounts>1|2|3</HistCounts></HistItem></Histograms>
+      <GDALRasterAttributeTable tableType="thematic">
+        <FieldDefn index="0"><Name>Value</Name><Type>0</Type><Usage>5</Usage></FieldDefn>
+        <FieldDefn index="1"><Name>Name</Name><Type>2</Type><Usage>2</Usage></FieldDefn>
+        <FieldDefn index="2"><Name>Density</Name><Type>1</Type><Usage>0</Usage></FieldDefn>
+        {fields}
+      </GDALRasterAttributeTable></PAMRasterBand></PAMDataset>'''.encode())
+
+ROWS = [(1, 'low', 0.5), (2, 'mid', 1.5), (3, 'high', 'nan')]
+
+def test_columnar_typed_table():
+    """Positional fields are mapped to their columns and numeric columns are typed."""
+    table = parse_rat(pam(ROWS))['1'].to_dict()
+    assert table['columns']['Density'] == {'index': '2', 'type': 'Real', 'usage': '0'}
+    assert table['row_count'] == 3 and table['values'] == [0, 1, 2]
+    assert table['data'] == {'Value': [1, 2, 3], 'Name': ['low', 'mid', 'high'], 'Density': [0.5, 1.5, None]}
+
+def test_indexed_fields_and_named_types():
+    """Fields with an index attribute, as some writers emit, map the same way."""
+    doc = pam(ROWS, field_index=True).getvalue().replace(b'<Type>0</Type>', b'<Type>Integer</Type>')
+    assert parse_rat(io.BytesIO(doc))['1'].to_dict()['data']['Value'] == [1, 2, 3]
+
+def test_projection_and_slicing():
+    """Only the requested columns and rows are kept; all rows are counted."""
+    table = parse_rat(pam(ROWS), columns=['Name'], offset=1, limit=1)['1'].to_dict()
+    assert set(table['columns']) == {'Value', 'Name', 'Density'}
+    assert table['data'] == {'Name': ['mid']}
+    assert table['values'] == [1] and table['offset'] == 1 and table['row_count'] == 3
+
+def test_non_numeric_values_are_kept():
+    """A value that is not a number turns its column into a plain list."""
+    table = parse_rat(pam([(1, 'a', 0.5), ('n/a', 'b', 1.0)]))['1'].to_dict()
+    assert table['data']['Value'] == [1, 'n/a']
+
+def test_missing_and_non_finite_values_are_null():
+    """Rows lacking fields keep typed columns aligned; NaN and infinity become null."""
+    doc = pam([(1, 'a', 'inf'), (2, 'b', 1.5)]).getvalue().replace(b'<F>2</F>', b'<F/>').replace(
+        b'<F>b</F><F>1.5</F>', b'')
+    table = parse_rat(io.BytesIO(doc))['1']
+    assert table.to_dict()['data'] == {'Value': [1, None], 'Name': ['a', None], 'Density': [None, None]}
+    assert table.columns[0].values.typecode == 'q' and table.columns[2].values.typecode == 'd'
+
+def test_large_tables_are_capped():
+    """A 50k-class RAT parses quickly and keeps at most max_rows rows."""
+    rows = [(i, f"class {i}", i / 10) for i in range(50000)]
+    started = time.monotonic()
+    table = parse_rat(pam(rows), max_rows=1000)['1'].to_dict()
+    assert time.monotonic() - started < 5
+    assert table['row_count'] == 50000 and len(table['values']) == 1000
+    assert table['data']['Name'][-1] == 'class 999'
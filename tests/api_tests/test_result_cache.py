@@ -0,0 +1,108 @@
+import os
+import pytest
+from utils import result_cache
+from utils.result_cache import ResultCache
+
+@pytest.fixture
+def cache(tmp_path):
+    """Create a cache with a small size budget."""
+    return ResultCache(str(tmp_path), max_bytes=10)
+
+def test_entry_is_published_after_full_stream(cache):
+    """Test that a fully streamed result becomes a cache hit."""
+    entry = cache.entry('szeb_psme_vector', 'roi1', 'v1', 'geojson')
+    assert not entry.exists()
+    assert list(entry.tee(['abc', b'de'])) == ['abc', b'de']
+    assert entry.exists()
+    with open(entry.path, 'rb') as f:
+        assert f.read() == b'abcde'
+
+def test_aborted_stream_is_not_cached(cache):
+    """Test that a download closed part-way leaves no entry behind."""
+    entry = cache.entry('szeb_psme_vector', 'roi1', 'v1', 'geojson')
+    stream = entry.tee(['abc', 'de'])
+    next(stream)
+    stream.close()
+    assert not entry.exists()
+    assert os.listdir(os.path.dirname(entry.path)) == []
+
+def test_new_data_version_replaces_old_entry(cache):
+    """Test that writing a newer table version removes the stale entry."""
+    old = cache.entry('szeb_psme_vector', 'roi1', 'v1', 'geojson')
+    list(old.tee(['abc']))
+    new = cache.entry('szeb_psme_vector', 'roi1', 'v2', 'geojson')
+    list(new.tee(['xyz']))
+    assert new.exists()
+    assert not old.exists()
+
+def test_least_recently_used_entries_are_evicted(cache):
+    """Test that the cache stays within its size budget."""
+    first = cache.entry('a', 'roi1', 'v1', 'csv')
+    list(first.tee(['123456']))
+    os.utime(first.path, (0, 0))
+    second = cache.entry('b', 'roi1', 'v1', 'csv')
+    list(second.tee(['123456']))
+    assert second.exists()
+    assert not first.exists()
+
+def test_invalidate_roi(cache):
+    """Test that replacing an ROI drops its cached results."""
+    entry = cache.entry('a', 'roi1', 'v1', 'csv')
+    list(entry.tee(['1']))
+    cache.invalidate_roi('roi1')
+    assert not entry.exists()
+
+def test_write_and_read_small_result(cache):
+    """Test that small results can be stored and read back in one call."""
+    entry = cache.entry('szeb_psme_raster', 'roi1', 'v1', 'zonal_stats_b1')
+    assert entry.read() is None
+    entry.write('{"a":1}')
+    assert entry.read() == b'{"a":1}'
+
+class FakeCursor:
+    """Cursor answering the data version queries."""
+
+    def __init__(self, trigger_enabled=True, version=None, existing_triggers=()):
+        self.trigger_enabled = trigger_enabled
+        self.version = version
+        self.existing_triggers = existing_triggers
+        self.statements = []
+        self.result = None
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql.strip())
+        if 'FROM pg_catalog.pg_class' in sql:
+            self.result = (1234, self.trigger_enabled)
+        elif 'to_regclass' in sql:
+            self.result = (params[1] in self.existing_triggers,)
+        elif 'table_data_versions WHERE' in sql:
+            self.result = (self.version,) if self.version is not None else None
+
+    def fetchone(self):
+        return self.result
+
+def test_data_version_comes_from_the_trigger_counter():
+    """The version is read from the trigger's counter, without any DDL."""
+    cur = FakeCursor(version=None)
+    assert result_cache.table_data_version(cur, 'public', 'szeb_psme_vector') == '1234-0'
+    cur = FakeCursor(version=7)
+    assert result_cache.table_data_version(cur, 'public', 'szeb_psme_vector') == '1234-7'
+    assert not any('CREATE' in sql or 'pg_stat' in sql for sql in cur.statements)
+
+def test_tables_without_enabled_trigger_are_not_cached(cache):
+    """A missing, dropped or disabled trigger means no version, so no cache slot."""
+    cur = FakeCursor(trigger_enabled=False, version=7)
+    assert result_cache.table_data_version(cur, 'public', 'szeb_psme_vector') is None
+    assert "tgenabled <> 'D'" in cur.statements[0]
+    assert len(cur.statements) == 1
+    assert cache.entry('szeb_psme_vector', 'roi1', None, 'geojson') is None
+
+def test_install_version_triggers_skips_existing_triggers():
+    """Triggers are only created on the tables that lack one."""
+    cur = FakeCursor(existing_triggers=('szeb_psme_vector',))
+    installed = result_cache.install_version_triggers(
+        cur, [('public', 'szeb_psme_vector'), ('public', 'szeb_psme_raster')])
+    assert installed == [('public', 'szeb_psme_raster')]
+    assert 'CREATE OR REPLACE FUNCTION public.bump_table_data_version()' in cur.statements[0]
+    creates = [sql for sql in cur.statements if sql.startswith('CREATE TRIGGER')]
+    assert len(creates) == 1 and '"public"."szeb_psme_raster"' in creates[0]
@@ -0,0 +1,102 @@
+import contextlib
+import pytest
+from flask import Flask
+from utils import roi_store
+from utils.roi_store import InvalidRoi, roi_filter_sql, save_roi, sweep_expired_rois
+from utils.spatial_registry import RasterTable, VectorTable
+
+@pytest.fixture
+def app(monkeypatch):
+    """Provide an app context with fake ROI and GeoServer databases that log their transactions."""
+    app = Flask(__name__)
+    app.log = []
+    app.rowcount = 3
+    app.failing_commits = set()
+    app.failing_queries = set()
+
+    class FakeCursor:
+        def __init__(self, name):
+            self.name = name
+        def execute(self, query, params=None):
+            if any(fragment in query for fragment in app.failing_queries):
+                raise RuntimeError("query failed")
+            app.log.append((self.name, query.split()[0], params))
+            self.rowcount = app.rowcount
+        def close(self):
+            pass
+
+    class FakeConnection:
+        def __init__(self, name):
+            self.name = name
+        def cursor(self):
+            return FakeCursor(self.name)
+
+    @contextlib.contextmanager
+    def fake_db_connection(name):
+        try:
+            yield FakeConnection(name)
+        except Exception:
+            app.log.append((name, 'ROLLBACK', None))
+            raise
+        if name in app.failing_commits:
+            app.log.append((name, 'ROLLBACK', None))
+            raise RuntimeError("commit failed")
+        app.log.append((name, 'COMMIT', None))
+
+    monkeypatch.setattr(roi_store, 'db_connection', fake_db_connection)
+    monkeypatch.setattr(roi_store, '_schema_ready', True)
+    with app.app_context():
+        yield app
+
+def test_save_roi_commits_parts_after_the_roi(app):
+    """Parts are written first but committed only once the ROI itself is."""
+    save_roi('s1', '{"type": "Polygon"}', max_vertices=64)
+    assert [(name, statement) for name, statement, _ in app.log] == [
+        ('geoserver_db', 'DELETE'), ('geoserver_db', 'INSERT'), ('roi_db', 'INSERT'),
+        ('roi_db', 'COMMIT'), ('geoserver_db', 'COMMIT')]
+    assert app.log[1][2] == ('s1', '{"type": "Polygon"}', 64)
+
+def test_save_roi_without_polygons_changes_nothing(app):
+    """An ROI with no polygon area is refused before the ROI table is touched."""
+    app.rowcount = 0
+    with pytest.raises(InvalidRoi):
+        save_roi('s1', '{"type": "LineString"}')
+    assert app.log[-1] == ('geoserver_db', 'ROLLBACK', None)
+    assert not any(name == 'roi_db' for name, _, _ in app.log)
+
+def test_failed_roi_write_keeps_the_previous_parts(app):
+    """If the ROI cannot be stored, the new parts are rolled back."""
+    app.failing_queries.add('INSERT INTO roi_sessions')
+    with pytest.raises(RuntimeError):
+        save_roi('s1', '{"type": "Polygon"}')
+    assert app.log[-2:] == [('roi_db', 'ROLLBACK', None), ('geoserver_db', 'ROLLBACK', None)]
+    assert not any(statement == 'COMMIT' for _, statement, _ in app.log)
+
+def test_failed_parts_commit_removes_the_new_roi(app):
+    """If the parts fail to commit after the ROI did, the ROI is removed as well."""
+    app.failing_commits.add('geoserver_db')
+    with pytest.raises(RuntimeError):
+        save_roi('s1', '{"type": "Polygon"}')
+    assert ('roi_db', 'COMMIT', None) in app.log
+    cleanup = app.log[app.log.index(('geoserver_db', 'ROLLBACK', None)) + 1:]
+    assert cleanup[:2] == [('roi_db', 'DELETE', ('s1',)), ('roi_db', 'COMMIT', None)]
+    assert cleanup[2] == ('geoserver_db', 'DELETE', ('s1',))
+
+def test_roi_filter_sql_matches_the_table_srid():
+    """The ROI parts are transformed to the table's SRID, and only when it differs."""
+    projected = VectorTable('public', 'roads', 'geom', 26910, 'MULTILINESTRING', ('name',))
+    sql = roi_filter_sql(projected.geometry_sql(), projected)
+    assert sql.startswith('EXISTS (')
+    assert 'p.session_id = %s' in sql and sql.count('%s') == 1
+    assert 'ST_Intersects(v."geom", ST_Transform(p.geom, 26910))' in sql
+
+    geographic = VectorTable('public', 'density', 'geom', 4326, 'MULTIPOLYGON', ())
+    assert 'ST_Intersects(v."geom", p.geom)' in roi_filter_sql(geographic.geometry_sql(), geographic)
+    raster = RasterTable('public', 'dem', 'rast', 0, 30.0, -30.0)
+    assert 'ST_Intersects(r.rast, p.geom)' in roi_filter_sql('r.rast', raster)
+
+def test_sweep_removes_expired_rois_and_parts(app):
+    """The sweeper deletes old rows from both tables and counts the ROIs."""
+    assert sweep_expired_rois(12) == 3
+    assert [(name, statement, params) for name, statement, params in app.log if statement == 'DELETE'] == [
+        ('roi_db', 'DELETE', (12,)), ('geoserver_db', 'DELETE', (12,))]
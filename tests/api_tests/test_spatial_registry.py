@@ -0,0 +1,71 @@
+import contextlib
+import pytest
+from flask import Flask
+from utils import spatial_registry
+from utils.spatial_registry import SpatialRegistry, VectorTable
+
+GEOMETRY_COLUMNS = [('public', 'roads', 'geom', 26910, 'MULTILINESTRING'),
+                    ('public', 'roads', 'centroid', 26910, 'POINT'),
+                    ('other', 'roads', 'geom', 4326, 'LINESTRING'),
+                    ('public', 'density', 'geom', 4326, 'MULTIPOLYGON')]
+# What the attribute query returns: every non-geometry column, once per table
+ATTRIBUTES = [('public', 'density', 'gid'), ('public', 'density', 'value'),
+              ('public', 'roads', 'gid'), ('public', 'roads', 'name')]
+
+@pytest.fixture
+def app(monkeypatch):
+    """Provide an app context with a fake GeoServer database catalog."""
+    app = Flask(__name__)
+    app.queries = []
+
+    class FakeCursor:
+        def execute(self, query, params=None):
+            app.queries.append(query)
+        def fetchall(self):
+            query = app.queries[-1]
+            if 'information_schema.columns' in query:
+                return ATTRIBUTES
+            if 'FROM geometry_columns' in query:
+                return GEOMETRY_COLUMNS
+            if 'pg_index' in query:
+                return [('public', 'roads', 'gid')]
+            return [('public', 'dem', 'rast', 3310, 30.0, -30.0)]
+        def close(self):
+            pass
+
+    class FakeConnection:
+        def cursor(self):
+            return FakeCursor()
+
+    @contextlib.contextmanager
+    def fake_db_connection(name):
+        assert name == 'geoserver_db'
+        yield FakeConnection()
+
+    monkeypatch.setattr(spatial_registry, 'db_connection', fake_db_connection)
+    with app.app_context():
+        yield app
+
+def test_refresh_describes_tables(app):
+    """The first geometry column of the first schema wins; attributes exclude geometry columns."""
+    registry = SpatialRegistry()
+    assert registry.refresh() == {'vector_tables': 2, 'raster_tables': 1}
+    assert registry.vector_table('ws:roads') == VectorTable('public', 'roads', 'geom', 26910, 'MULTILINESTRING',
+                                                            ('gid', 'name'), 'gid')
+    assert registry.vector_table('density').primary_key is None
+    assert registry.raster_table('dem').srid == 3310
+
+    attribute_query = next(query for query in app.queries if 'information_schema.columns' in query)
+    # Filtering on the table, not joining its geometry columns, lists each attribute once
+    assert 'JOIN geometry_columns' not in attribute_query
+    assert 'g.f_geometry_column = c.column_name' in attribute_query
+
+def test_unknown_tables_refresh_at_most_once_per_interval(app):
+    """A miss reloads the registry unless it was loaded recently."""
+    registry = SpatialRegistry(miss_refresh_interval=60)
+    assert registry.vector_table('roads', refresh=False) is None
+    assert not app.queries
+    assert registry.vector_table('roads') is not None
+    loads = len(app.queries)
+    assert registry.vector_table('missing') is None
+    assert len(app.queries) == loads
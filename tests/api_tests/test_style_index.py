@@ -0,0 +1,71 @@
+import time
+import pytest
+from flask import Flask
+from utils import style_index
+
+@pytest.fixture
+def app(tmp_path):
+    """Provide an app context with a style index in a temporary directory."""
+    app = Flask(__name__)
+    app.config["STYLE_INDEX_FILE"] = str(tmp_path / 'styles' / 'style_index.json')
+    with app.app_context():
+        yield app
+
+def test_equivalent_inputs_hash_the_same():
+    """Whitespace, key order and numbers sent as strings do not change the hash."""
+    first = style_index.style_hash({'coverage': 'psme ', 'band': '1', 'breaks': [0.5, '1.0']})
+    second = style_index.style_hash({'breaks': ['0.50', 1], 'band': 1.0, 'coverage': 'psme'})
+    assert first == second
+    assert first != style_index.style_hash({'coverage': 'psme', 'band': 2, 'breaks': [0.5, 1]})
+
+def test_get_or_create_reuses_existing_style(app):
+    """A known hash reuses its style; a style deleted in GeoServer is created again."""
+    index = style_index.get_style_index()
+    created = []
+    def create():
+        created.append(1)
+        return f"psme_{len(created)}", 'ws'
+
+    assert index.get_or_create('abc', create, lambda name, ws: True) == ('psme_1', False)
+    assert index.get_or_create('abc', create, lambda name, ws: True) == ('psme_1', True)
+    assert index.get_or_create('abc', create, lambda name, ws: False) == ('psme_2', False)
+    assert len(created) == 2
+    assert index.entries()['abc']['workspace'] == 'ws'
+
+def test_failed_creation_is_not_indexed(app):
+    """Errors from GeoServer propagate and leave the index unchanged."""
+    index = style_index.get_style_index()
+    def create():
+        raise style_index.StyleCreationError("rejected", 409)
+    with pytest.raises(style_index.StyleCreationError):
+        index.get_or_create('abc', create, lambda name, ws: True)
+    assert index.entries() == {}
+
+def test_collect_orphaned_styles(app, monkeypatch):
+    """Only old, unused, existing generated styles are deleted."""
+    index = style_index.get_style_index()
+    old = time.time() - 48 * 3600
+    with index.lock():
+        index._write({
+            'used': {'name': 'in_use', 'workspace': 'ws', 'created': old},
+            'orphan': {'name': 'orphan', 'workspace': 'ws', 'created': old},
+            'gone': {'name': 'gone', 'workspace': None, 'created': old},
+            'new': {'name': 'new', 'workspace': 'ws', 'created': time.time()},
+        })
+    deleted = []
+    class FakeResponse:
+        ok = True
+    class FakeClient:
+        def delete(self, path, operation, **kwargs):
+            deleted.append(path)
+            return FakeResponse()
+    monkeypatch.setattr(style_index, 'layer_style_names', lambda: {'in_use'})
+    monkeypatch.setattr(style_index, 'style_exists', lambda name, workspace=None: name != 'gone')
+    monkeypatch.setattr(style_index, 'get_geoserver_client', lambda: FakeClient())
+
+    assert style_index.collect_orphaned_styles(dry_run=True) == {'deleted': ['orphan'], 'missing': ['gone']}
+    assert deleted == [] and len(index.entries()) == 4
+
+    assert style_index.collect_orphaned_styles() == {'deleted': ['orphan'], 'missing': ['gone']}
+    assert deleted == ['/rest/workspaces/ws/styles/orphan']
+    assert set(index.entries()) == {'used', 'new'}
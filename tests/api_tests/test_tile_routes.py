@@ -0,0 +1,114 @@
+import contextlib
+import os
+import pytest
+from flask import Flask
+from api import tile_routes
+from utils.spatial_registry import VectorTable
+
+SPECIES_CONFIG = """
+const speciesConfig = {
+  "psme": {
+    "vectorLayer": "ws:psme_habitat",
+    "attributes": {
+      "basics": {"items": {"name": "Name", "missing_column": "Missing"}},
+      "risks": {"items": {"fire_risk": "Fire Risk", "name": "Name"}}
+    }
+  },
+  "abam": {
+    "vectorLayer": "ws:abam_habitat",
+    "attributes": {"basics": {"items": {"demand": "Demand"}}}
+  }
+};
+"""
+
+TABLES = {
+    'psme_habitat': VectorTable('public', 'psme_habitat', 'geom', 26910, 'MULTIPOLYGON',
+                                ('gid', 'name', 'fire_risk'), 'gid'),
+    'abam_habitat': VectorTable('public', 'abam_habitat', 'geom', 0, 'MULTIPOLYGON', ('gid', 'demand'), 'gid'),
+}
+
+class FakeRegistry:
+    def vector_table(self, name):
+        return TABLES.get(name)
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Provide an app serving tiles from a fake database."""
+    (tmp_path / 'species_config.js').write_text(SPECIES_CONFIG)
+    app = Flask(__name__)
+    app.config.update(SPECIES_CONFIG_DIR=str(tmp_path), TILE_CACHE_MAX_AGE=60)
+    tile_routes.register_routes(app)
+    app.queries = []
+    app.tile = b'tile'
+
+    class FakeCursor:
+        def execute(self, query, params=None):
+            app.queries.append((query, params))
+        def fetchone(self):
+            return (memoryview(app.tile),)
+        def close(self):
+            pass
+
+    class FakeConnection:
+        def cursor(self):
+            return FakeCursor()
+
+    @contextlib.contextmanager
+    def fake_db_connection(name):
+        yield FakeConnection()
+
+    monkeypatch.setattr(tile_routes, 'db_connection', fake_db_connection)
+    monkeypatch.setattr(tile_routes, 'get_spatial_registry', lambda: FakeRegistry())
+    monkeypatch.setattr(tile_routes, '_attribute_cache', {})
+    return app
+
+def test_tile_query_projects_configured_attributes(app):
+    """Tiles carry only configured attributes that exist in the table, in config order."""
+    response = app.test_client().get('/tiles/psme_habitat/3/1/2.pbf')
+    assert response.status_code == 200
+    assert response.data == b'tile'
+    assert response.mimetype == 'application/vnd.mapbox-vector-tile'
+    assert response.headers['Cache-Control'] == 'public, max-age=60'
+
+    query, params = app.queries[0]
+    assert params == (3, 1, 2, 'psme_habitat')
+    assert 'AS mvt_geom, v."name", v."fire_risk"\n' in query
+    assert 'missing_column' not in query
+    assert 'ST_AsMVTGeom(ST_Transform(v."geom", 3857), bounds.geom)' in query
+    assert 'ST_Intersects(v."geom", ST_Transform(bounds.geom, 26910))' in query
+
+def test_srid_zero_tables_are_read_as_wgs84(app):
+    """Geometries without an SRID get EPSG:4326 before being transformed."""
+    response = app.test_client().get('/tiles/abam_habitat/0/0/0.pbf')
+    assert response.status_code == 200
+    query, _ = app.queries[0]
+    assert 'ST_AsMVTGeom(ST_Transform(ST_SetSRID(v."geom", 4326), 3857), bounds.geom)' in query
+    assert 'ST_Intersects(v."geom", ST_SetSRID(ST_Transform(bounds.geom, 4326), 0))' in query
+
+def test_empty_and_invalid_tiles(app):
+    """Empty tiles return 204; unknown tables and out-of-range tiles return 400."""
+    client = app.test_client()
+    app.tile = b''
+    assert client.get('/tiles/psme_habitat/3/1/2.pbf').status_code == 204
+    assert client.get('/tiles/unknown/3/1/2.pbf').status_code == 400
+    assert client.get('/tiles/psme_habitat/3/8/2.pbf').status_code == 400
+    assert client.get('/tiles/psme_habitat/23/0/0.pbf').status_code == 400
+
+def test_attributes_are_cached_per_table(app, monkeypatch):
+    """The species config is parsed once per table until the file changes."""
+    reads = []
+    get_species_config = tile_routes.get_species_config
+    monkeypatch.setattr(tile_routes, 'get_species_config', lambda: reads.append(1) or get_species_config())
+
+    with app.app_context():
+        assert tile_routes.get_species_attributes('psme_habitat') == ['name', 'missing_column', 'fire_risk']
+        assert tile_routes.get_species_attributes('psme_habitat') == ['name', 'missing_column', 'fire_risk']
+        assert len(reads) == 1
+        assert tile_routes.get_species_attributes('abam_habitat') == ['demand']
+        assert len(reads) == 2
+
+        path = os.path.join(app.config['SPECIES_CONFIG_DIR'], 'species_config.js')
+        with open(path, 'w') as f:
+            f.write(SPECIES_CONFIG.replace('"demand": "Demand"', '"demand": "Demand", "supply": "Supply"'))
+        assert tile_routes.get_species_attributes('abam_habitat') == ['demand', 'supply']
+        assert len(reads) == 3
@@ -0,0 +1,86 @@
+import contextlib
+import pytest
+from flask import Flask
+from utils import zonal_stats
+from utils.spatial_registry import RasterTable
+from utils.zonal_stats import DEGREE, METRE, compute_zonal_stats, format_zonal_stats, zonal_stats_query
+
+def test_classes_get_areas_in_metric_crs():
+    """Test that class pixel counts are converted to areas for metre-based rasters."""
+    row = (30, 60.0, 2.0, 0.8, 1.0, 3.0, [[1, 10], [2, 10], [3, 10]], -900.0, None)
+    stats = format_zonal_stats(row, METRE)
+    assert stats['summary'] == {'count': 30, 'sum': 60.0, 'mean': 2.0, 'stddev': 0.8, 'min': 1.0, 'max': 3.0}
+    assert stats['pixel_area_m2'] == 900.0
+    assert stats['classes'][0] == {'value': 1, 'pixels': 10, 'area_m2': 9000.0}
+    assert stats['area_unavailable'] is None
+
+def test_classes_get_spheroid_areas_in_geographic_crs():
+    """Test that degree-based rasters report the class areas measured on the spheroid."""
+    row = (5, 5.0, 1.0, 0.0, 1.0, 2.0, [[1, 4], [2, 1]], 0.0001, [[1, 4.1e6]])
+    stats = format_zonal_stats(row, DEGREE)
+    assert stats['pixel_area_m2'] is None and stats['area_unavailable'] is None
+    assert stats['classes'] == [{'value': 1, 'pixels': 4, 'area_m2': 4.1e6},
+                                {'value': 2, 'pixels': 1, 'area_m2': 0.0}]
+
+def test_areas_unavailable_in_other_crs():
+    """Test that rasters in other units report why there are no areas."""
+    row = (5, 5.0, 1.0, 0.0, 1.0, 1.0, [[1, 5]], 25.0, None)
+    stats = format_zonal_stats(row, None)
+    assert stats['pixel_area_m2'] is None
+    assert stats['classes'] == [{'value': 1, 'pixels': 5, 'area_m2': None}]
+    assert stats['area_unavailable']
+
+def test_class_areas_are_measured_only_for_geographic_rasters():
+    """Test that only the geographic query vectorizes classes and measures them as geography."""
+    table = RasterTable('public', 'dem', 'rast', 4326, 0.01, -0.01)
+    geographic = zonal_stats_query(table, DEGREE)
+    assert 'ST_DumpAsPolygons(rast, 1, true)' in geographic
+    assert 'ST_Area(ST_Transform((d).geom, 4326)::geography)' in geographic
+    metric = zonal_stats_query(table._replace(srid=3310), METRE)
+    assert 'ST_DumpAsPolygons' not in metric and 'NULL\n' in metric
+    assert 'ST_Transform(ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), 3310)' in metric
+    assert geographic.count('%s') == metric.count('%s') == 3
+
+@pytest.fixture
+def database(monkeypatch):
+    """Provide an app context with a fake database returning a given CRS definition."""
+    app = Flask(__name__)
+    database = {'queries': [], 'srs': None}
+
+    class FakeCursor:
+        def execute(self, query, params=None):
+            database['queries'].append((query, params))
+        def fetchone(self):
+            if 'spatial_ref_sys' in database['queries'][-1][0]:
+                return database['srs']
+            return (3, 3.0, 1.0, 0.0, 1.0, 1.0, [[1, 3]], 1e-4, [[1, 3.5e5]])
+        def close(self):
+            pass
+
+    class FakeConnection:
+        def cursor(self):
+            return FakeCursor()
+
+    @contextlib.contextmanager
+    def fake_db_connection(name):
+        yield FakeConnection()
+
+    monkeypatch.setattr(zonal_stats, 'db_connection', fake_db_connection)
+    with app.app_context():
+        yield database
+
+def test_crs_branch(database):
+    """Test that the CRS units decide how areas are computed."""
+    table = RasterTable('public', 'dem', 'rast', 4326, 0.01, -0.01)
+    database['srs'] = (False, True)
+    stats = compute_zonal_stats(table, 's1', '{}', band=2)
+    assert stats['classes'] == [{'value': 1, 'pixels': 3, 'area_m2': 3.5e5}]
+    assert 'geography' in database['queries'][-1][0] and database['queries'][-1][1] == ('{}', 2, 's1')
+
+    database['srs'] = (True, False)
+    assert compute_zonal_stats(table, 's1', '{}')['pixel_area_m2'] == 1e-4
+
+    database['queries'].clear()
+    stats = compute_zonal_stats(table._replace(srid=0), 's1', '{}')
+    assert stats['area_unavailable'] and stats['classes'][0]['area_m2'] is None
+    assert not any('spatial_ref_sys' in query for query, _ in database['queries'])
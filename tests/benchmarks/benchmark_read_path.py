@@ -0,0 +1,103 @@
+"""
+Throughput benchmark of the sync (app:app) and async (asgi:application) read paths.
+
+Start both servers against the same database and GeoServer, each with a
+single worker process, for example:
+
+    gunicorn --bind 0.0.0.0:8001 app:app
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8002 asgi:application
+
+then install the test requirements, which provide httpx, and run:
+
+    pip install -r tests/requirements.txt
+    python tests/benchmarks/benchmark_read_path.py \
+        --sync http://localhost:8001 --async http://localhost:8002 \
+        --concurrency 200 --requests 2000 \
+        --path /has_roi --path "/api/layer-info/szeb_psme_vector" \
+        --path "/download_map_view?vector=szeb_psme_vector&bbox=-123,44,-122,45"
+
+For every path and server it reports requests per second, latency
+percentiles and the number of failed requests.
+"""
+
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+
+async def run_load(base_url, path, concurrency, total, cookies):
+    """
+    Issue ``total`` GET requests with at most ``concurrency`` in flight.
+
+    Returns:
+        dict: Elapsed seconds, per-request latencies and failure count
+    """
+    latencies = []
+    failures = 0
+    remaining = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60, cookies=cookies) as client:
+        async def worker():
+            nonlocal failures
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    await response.aread()
+                    if response.status_code >= 500:
+                        failures += 1
+                except httpx.HTTPError:
+                    failures += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    return {'elapsed': elapsed, 'latencies': latencies, 'failures': failures}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(label, path, result):
+    latencies = result['latencies']
+    print(f"{label:<6} {path[:48]:<48} "
+          f"{len(latencies) / result['elapsed']:>9.1f} req/s  "
+          f"p50 {statistics.median(latencies) * 1000:>8.1f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:>8.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:>8.1f} ms  "
+          f"failed {result['failures']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sync', dest='sync_url', help="Base URL of the sync (WSGI) server")
+    parser.add_argument('--async', dest='async_url', help="Base URL of the async (ASGI) server")
+    parser.add_argument('--path', action='append', required=True, help="Path to request, repeatable")
+    parser.add_argument('--concurrency', type=int, default=100, help="Requests in flight")
+    parser.add_argument('--requests', type=int, default=1000, help="Requests per path and server")
+    parser.add_argument('--session-cookie', help="Value of the Flask 'session' cookie, for ROI routes")
+    args = parser.parse_args()
+
+    servers = [(label, url) for label, url in (('sync', args.sync_url), ('async', args.async_url)) if url]
+    if not servers:
+        parser.error("Give --sync and/or --async")
+    cookies = {'session': args.session_cookie} if args.session_cookie else None
+
+    for path in args.path:
+        for label, url in servers:
+            # Warm up connection pools and caches before measuring
+            await run_load(url, path, min(args.concurrency, 10), 20, cookies)
+            result = await run_load(url, path, args.concurrency, args.requests, cookies)
+            report(label, path, result)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,6 +1,7 @@
 import os
 import unittest
 import json
+import tempfile
 from unittest.mock import patch, MagicMock
 from flask import url_for
 
@@ -9,6 +10,7 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 from app import create_app
+from utils.style_index import hashed_style_name, style_hash
 
 class TestGeoServerConfig(unittest.TestCase):
     """
@@ -22,11 +24,14 @@ class TestGeoServerConfig(unittest.TestCase):
         # Create test app with test config
         self.app = create_app()
         self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
         self.app.config['SERVER_NAME'] = 'localhost'
         self.app.config['GEOSERVER_URL'] = 'http://test-geoserver.example.com/geoserver'
         self.app.config['GEOSERVER_WORKSPACE'] = 'test_workspace'
         self.app.config['GEOSERVER_USER'] = 'test_user'
         self.app.config['GEOSERVER_PASS'] = 'test_pass'
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.app.config['STYLE_INDEX_FILE'] = os.path.join(self.temp_dir.name, 'style_index.json')
         
         # Create test client
         self.client = self.app.test_client()
@@ -40,6 +45,7 @@ class TestGeoServerConfig(unittest.TestCase):
         Clean up after tests
         """
         self.app_context.pop()
+        self.temp_dir.cleanup()
     
     def test_index_passes_geoserver_config(self):
         """
@@ -53,7 +59,7 @@ class TestGeoServerConfig(unittest.TestCase):
         self.assertIn('data-geoserver-url="http://test-geoserver.example.com/geoserver"', html)
         self.assertIn('data-workspace="test_workspace"', html)
     
-    @patch('requests.post')
+    @patch('requests.Session.request')
     def test_generate_style_uses_app_config(self, mock_post):
         """
         Test that the generate_style endpoint uses the app's GeoServer configuration
@@ -83,15 +89,20 @@ class TestGeoServerConfig(unittest.TestCase):
         # Assert response is successful
         self.assertEqual(response.status_code, 201)
         
-        # Assert POST was called with correct URL and auth from app config
+        # Assert POST was sent through the shared client with the URL and auth from app config
+        style_name = hashed_style_name('test_style', style_hash({
+            'workspace': 'test_workspace', 'store': 'test_store', 'coverage': 'test_coverage',
+            'band': '1', 'classification': 'unique'}))
         mock_post.assert_called_once_with(
-            f"http://test-geoserver.example.com/geoserver/rest/workspaces/test_workspace/coveragestores/test_store/coverages/test_coverage/pam?band=1&classification=unique&styleName=test_style_",
+            'POST',
+            f"http://test-geoserver.example.com/geoserver/rest/workspaces/test_workspace/coveragestores/test_store/coverages/test_coverage/pam?band=1&classification=unique&styleName={style_name}",
             headers={"Content-Type": "application/vnd.ogc.sld+xml"},
             data="",
-            auth=('test_user', 'test_pass')
+            auth=('test_user', 'test_pass'),
+            timeout=(self.app.config['GEOSERVER_CONNECT_TIMEOUT'], self.app.config['GEOSERVER_READ_TIMEOUT'])
         )
     
-    @patch('requests.post')
+    @patch('requests.Session.request')
     def test_generate_style_handles_errors(self, mock_post):
         """
         Test that the generate_style endpoint handles GeoServer errors
@@ -0,0 +1,302 @@
+"""
+Resumable chunked uploads of large files.
+
+A client creates an upload with the file's name and size, then PUTs the
+file in fixed-size chunks, each with the SHA-256 of its bytes. Chunks are
+written straight into a single preallocated staging file at their offset,
+so they may arrive in any order, in parallel, or again after a failure, and
+the file never has to be assembled or copied. The upload's state file
+records which chunks arrived; after a disconnect the client asks for it and
+sends only the missing chunks.
+
+Each upload has its own directory under ``UPLOADS_DIR``. Uploads not touched
+for UPLOAD_TTL_HOURS are deleted.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import tempfile
+from flask import current_app
+
+from utils.file_lock import file_lock
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Upload IDs are UUID hex strings; anything else is never looked up on disk
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Bytes read from the request per write to the staging file
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Exception raised for invalid or unknown uploads and chunks"""
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Upload:
+    """A chunked upload and its persisted state."""
+
+    FIELDS = ('id', 'owner', 'filename', 'size', 'chunk_size', 'received', 'created_at', 'updated_at')
+
+    def __init__(self, store, **state):
+        self.store = store
+        for field in self.FIELDS:
+            setattr(self, field, state.get(field))
+
+    @property
+    def dir(self):
+        return os.path.join(self.store.uploads_dir, self.id)
+
+    @property
+    def data_path(self):
+        return os.path.join(self.dir, 'data.part')
+
+    @property
+    def state_path(self):
+        return os.path.join(self.dir, 'upload.json')
+
+    @property
+    def chunks(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    @property
+    def missing(self):
+        received = set(self.received)
+        return [index for index in range(self.chunks) if index not in received]
+
+    @property
+    def complete(self):
+        return not self.missing
+
+    def chunk_length(self, index):
+        """Get the expected length of a chunk."""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def to_dict(self):
+        """Get the public status of the upload."""
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'chunk_size': self.chunk_size,
+            'chunks': self.chunks,
+            'received': sorted(self.received),
+            'missing': self.missing,
+            'complete': self.complete,
+        }
+
+    def save(self):
+        """Write the upload state file atomically."""
+        state = {field: getattr(self, field) for field in self.FIELDS}
+        fd, temp_path = tempfile.mkstemp(dir=self.dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def reload(self):
+        """Read the state written by other requests."""
+        with open(self.state_path) as f:
+            state = json.load(f)
+        for field in self.FIELDS:
+            setattr(self, field, state.get(field))
+
+    def write_chunk(self, index, stream, length, checksum):
+        """
+        Write a chunk into the staging file.
+
+        Args:
+            index (int): Chunk index, from 0
+            stream: File-like object the chunk is read from
+            length (int): Length of the chunk body, from Content-Length
+            checksum (str): Hex SHA-256 of the chunk, from the client
+
+        Returns:
+            Upload: The upload, with its state updated
+
+        Raises:
+            UploadError: If the chunk is out of range, truncated or corrupt,
+                or the upload was already completed
+        """
+        if not 0 <= index < self.chunks:
+            raise UploadError(f"Chunk {index} is out of range; the upload has {self.chunks} chunks.")
+        if not checksum:
+            raise UploadError("Missing chunk checksum.")
+        expected = self.chunk_length(index)
+        if length != expected:
+            raise UploadError(f"Chunk {index} must be {expected} bytes, got {length}.")
+
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            fd = os.open(self.data_path, os.O_WRONLY)
+        except FileNotFoundError:
+            # finish() moved the staging file away
+            raise UploadError("Upload was already completed.", status_code=409)
+        try:
+            offset = index * self.chunk_size
+            while written < expected:
+                block = stream.read(min(READ_BLOCK_SIZE, expected - written))
+                if not block:
+                    break
+                digest.update(block)
+                os.pwrite(fd, block, offset + written)
+                written += len(block)
+        finally:
+            os.close(fd)
+        if written != expected:
+            raise UploadError(f"Chunk {index} was truncated after {written} of {expected} bytes.")
+        if digest.hexdigest() != checksum.strip().lower():
+            raise UploadError(f"Checksum mismatch for chunk {index}; send it again.", status_code=422)
+
+        # Chunks of one upload may be written by several requests at once
+        with file_lock(self.state_path, timeout=10):
+            self.reload()
+            if index not in self.received:
+                self.received.append(index)
+            self.updated_at = time.time()
+            self.save()
+        return self
+
+    def finish(self, filename):
+        """
+        Move the completed staging file to its final name in the upload directory.
+
+        Args:
+            filename (str): Safe file name
+
+        Returns:
+            str: Path of the file
+
+        Raises:
+            UploadError: If chunks are missing
+        """
+        if not self.complete:
+            raise UploadError(f"Upload is missing {len(self.missing)} chunk(s).", status_code=409)
+        path = os.path.join(self.dir, filename)
+        try:
+            os.replace(self.data_path, path)
+        except FileNotFoundError:
+            raise UploadError("Upload was already completed.", status_code=409)
+        return path
+
+    def delete(self):
+        """Delete the upload and its data."""
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class UploadStore:
+    """Directory of chunked uploads."""
+
+    def __init__(self, uploads_dir, chunk_size, max_size, ttl):
+        """
+        Initialize the store.
+
+        Args:
+            uploads_dir (str): Directory holding upload state and staging files
+            chunk_size (int): Size of every chunk but the last, in bytes
+            max_size (int): Largest accepted file, in bytes
+            ttl (float): Seconds an untouched upload is kept
+        """
+        self.uploads_dir = uploads_dir
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.ttl = ttl
+        os.makedirs(uploads_dir, exist_ok=True)
+
+    def create(self, filename, size, owner):
+        """
+        Start an upload.
+
+        Args:
+            filename (str): Name of the uploaded file
+            size (int): Size of the file in bytes
+            owner (str): Session ID allowed to use the upload
+
+        Returns:
+            Upload: The new upload
+
+        Raises:
+            UploadError: If the size is invalid or too large
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("Size must be a positive integer.")
+        if size > self.max_size:
+            raise UploadError(f"File exceeds the upload limit of {self.max_size} bytes.", status_code=413)
+        self.sweep()
+
+        now = time.time()
+        upload = Upload(self, id=uuid.uuid4().hex, owner=owner, filename=filename, size=size,
+                        chunk_size=self.chunk_size, received=[], created_at=now, updated_at=now)
+        os.makedirs(upload.dir)
+        # Sparse until the chunks arrive
+        with open(upload.data_path, 'wb') as f:
+            f.truncate(size)
+        upload.save()
+        return upload
+
+    def _load(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+            return None
+        upload = Upload(self, id=upload_id)
+        try:
+            upload.reload()
+        except (OSError, ValueError):
+            return None
+        return upload
+
+    def get(self, upload_id, owner):
+        """
+        Look up an upload.
+
+        Args:
+            upload_id (str): The upload ID
+            owner (str): Session ID; only uploads this session owns are
+                returned, none if it is None (the request has no session)
+
+        Returns:
+            Upload: The upload
+
+        Raises:
+            UploadError: If the upload does not exist or belongs to another session
+        """
+        upload = self._load(upload_id)
+        if upload is None or owner is None or upload.owner != owner:
+            raise UploadError("Upload not found.", status_code=404)
+        return upload
+
+    def sweep(self):
+        """
+        Delete uploads that were not touched for ``ttl`` seconds.
+
+        Returns:
+            int: Number of uploads deleted
+        """
+        cutoff = time.time() - self.ttl
+        deleted = 0
+        for upload_id in os.listdir(self.uploads_dir):
+            upload = self._load(upload_id)
+            if upload is None:
+                continue
+            if upload.updated_at < cutoff:
+                upload.delete()
+                deleted += 1
+        if deleted:
+            logger.info(f"Removed {deleted} expired uploads")
+        return deleted
+
+
+def get_upload_store():
+    """Get the chunked upload store of the current app."""
+    config = current_app.config
+    return UploadStore(config["UPLOADS_DIR"], config["UPLOAD_CHUNK_SIZE"],
+                       config["UPLOAD_MAX_SIZE"], config["UPLOAD_TTL_HOURS"] * 3600)
@@ -0,0 +1,304 @@
+"""
+Class breaks of a numeric attribute for choropleth styles.
+
+The attribute column is read from PostGIS in a single round trip (a random
+``TABLESAMPLE`` on large tables) into a NumPy array, and the breaks of each
+method are computed on that array:
+
+- ``equal_interval``: classes of equal width between min and max
+- ``quantile``: classes holding the same number of features
+- ``jenks``: Fisher-Jenks natural breaks, minimizing the within-class
+  sum of squared deviations, computed on a further subsample
+- ``std_dev``: one-standard-deviation classes centred on the mean
+
+Breaks are returned as ``classes + 1`` ascending edges from min to max, each
+class holding the values above its lower edge up to and including its upper
+edge (the first class also holds min). When a method finds fewer classes,
+because the data has fewer distinct values, the top edge is repeated and the
+extra classes are empty.
+"""
+
+import logging
+import numpy as np
+
+from utils.db_pool import db_connection
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+METHODS = ('equal_interval', 'quantile', 'jenks', 'std_dev')
+MAX_CLASSES = 20
+
+# End values per vectorized Jenks step, bounding its memory to n * JENKS_BLOCK floats
+JENKS_BLOCK = 64
+
+# Column types that can be classified
+NUMERIC_TYPES = ('smallint', 'integer', 'bigint', 'real', 'double precision', 'numeric')
+
+
+class ClassificationError(Exception):
+    """Raised when an attribute cannot be classified"""
+    status_code = 400
+
+
+def equal_interval_breaks(values, classes):
+    """
+    Split the value range into classes of equal width.
+
+    Args:
+        values (ndarray): Sorted attribute values
+        classes (int): Number of classes
+
+    Returns:
+        ndarray: Class edges
+    """
+    return np.linspace(values[0], values[-1], classes + 1)
+
+
+def quantile_breaks(values, classes):
+    """
+    Split the values into classes with the same number of values.
+
+    Args:
+        values (ndarray): Sorted attribute values
+        classes (int): Number of classes
+
+    Returns:
+        ndarray: Class edges, without repeats when values are tied; min and
+            max even if they are equal
+    """
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, classes + 1)))
+    return edges if len(edges) > 1 else np.array([values[0], values[-1]])
+
+
+def std_dev_breaks(values, classes):
+    """
+    Split the values into one-standard-deviation classes centred on the mean.
+
+    Args:
+        values (ndarray): Sorted attribute values
+        classes (int): Number of classes
+
+    Returns:
+        ndarray: Class edges; the outer classes extend to min and max
+    """
+    std = values.std()
+    if std == 0:
+        return np.array([values[0], values[-1]])
+    edges = values.mean() + std * (np.arange(classes + 1) - classes / 2)
+    inner = edges[1:-1]
+    inner = inner[(inner > values[0]) & (inner < values[-1])]
+    return np.concatenate(([values[0]], inner, [values[-1]]))
+
+
+def jenks_breaks(values, classes):
+    """
+    Compute Fisher-Jenks natural breaks by dynamic programming.
+
+    The within-class sum of squared deviations of any run of values comes
+    from cumulative sums. Each class step takes, for every end value, the
+    vectorized minimum over all class starts, computed for JENKS_BLOCK end
+    values at a time; memory stays O(n * JENKS_BLOCK) for the step and
+    O(n * classes) for the back pointers.
+
+    Args:
+        values (ndarray): Sorted attribute values
+        classes (int): Number of classes
+
+    Returns:
+        ndarray: Class edges (min, the upper bound of each class)
+    """
+    n = len(values)
+    classes = min(classes, len(np.unique(values)))
+    if classes < 2:
+        return np.array([values[0], values[-1]])
+
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    squares = np.concatenate(([0.0], np.cumsum(values * values)))
+
+    def ssd(start, end):
+        """Sum of squared deviations of values[start..end], inf for empty runs."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            count = end - start + 1
+            total = sums[end + 1] - sums[start]
+            result = squares[end + 1] - squares[start] - total * total / count
+        return np.where(count > 0, result, np.inf)
+
+    ends = np.arange(n)
+    class_starts = np.arange(1, n)[:, None]
+    cost = ssd(0, ends)
+    starts = []
+    for _ in range(1, classes):
+        # Class starting at i follows the best partition of values[..i-1]
+        next_cost = np.empty(n)
+        best_start = np.empty(n, dtype=np.int64)
+        for block in range(0, n, JENKS_BLOCK):
+            block_ends = ends[block:block + JENKS_BLOCK]
+            # Classes cannot start after their end value
+            latest = block_ends[-1]
+            candidates = cost[:latest, None] + ssd(class_starts[:latest], block_ends[None, :])
+            best = np.argmin(candidates, axis=0)
+            next_cost[block:block + JENKS_BLOCK] = candidates[best, np.arange(len(block_ends))]
+            best_start[block:block + JENKS_BLOCK] = best + 1
+        cost = next_cost
+        starts.append(best_start)
+
+    # Walk back from the last value to recover where each class starts
+    edges = [values[-1]]
+    last = n - 1
+    for step in reversed(starts):
+        first = step[last]
+        edges.append(values[first - 1])
+        last = first - 1
+    edges.append(values[0])
+    return np.array(edges[::-1])
+
+
+BREAK_FUNCTIONS = {
+    'equal_interval': equal_interval_breaks,
+    'quantile': quantile_breaks,
+    'jenks': jenks_breaks,
+    'std_dev': std_dev_breaks,
+}
+
+
+def pad_breaks(breaks, classes):
+    """
+    Repeat the top edge of a classification with fewer classes than asked.
+
+    Args:
+        breaks (ndarray): At least two class edges
+        classes (int): Number of classes asked for
+
+    Returns:
+        ndarray: ``classes + 1`` class edges; the added classes are empty
+    """
+    missing = classes + 1 - len(breaks)
+    if missing <= 0:
+        return breaks
+    return np.concatenate((breaks, np.repeat(breaks[-1], missing)))
+
+
+def compute_breaks(values, method, classes, jenks_max_values=2000, seed=0):
+    """
+    Compute the class breaks of a set of values.
+
+    Args:
+        values (ndarray): Attribute values, NULLs removed
+        method (str): Key of BREAK_FUNCTIONS
+        classes (int): Number of classes
+        jenks_max_values (int): Values kept for Jenks, which is quadratic
+        seed (int): Seed of the Jenks subsample, for reproducible breaks
+
+    Returns:
+        dict: ``breaks`` (class edges) and ``counts`` (values per class)
+    """
+    values = np.sort(np.asarray(values, dtype=float))
+    subset = values
+    if method == 'jenks' and len(values) > jenks_max_values:
+        rng = np.random.default_rng(seed)
+        subset = np.sort(rng.choice(values, jenks_max_values, replace=False))
+        # Keep the extremes so the breaks span the whole range
+        subset[0], subset[-1] = values[0], values[-1]
+
+    breaks = BREAK_FUNCTIONS[method](subset, classes)
+    if subset is not values and len(breaks) > 2:
+        # A subsample break sits on the last sampled value of its class; move it
+        # to the last full-data value before the middle of the gap to the next class
+        inner = breaks[1:-1]
+        following = subset[np.minimum(np.searchsorted(subset, inner, side='right'), len(subset) - 1)]
+        middle = (inner + following) / 2
+        breaks[1:-1] = values[np.searchsorted(values, middle, side='right') - 1]
+    breaks = pad_breaks(breaks, classes)
+    # Classes are closed on the right, like the "> lower, <= upper" style rules
+    classes_of = np.searchsorted(breaks[1:-1], values, side='left')
+    counts = np.bincount(classes_of, minlength=classes)
+    return {'breaks': breaks.tolist(), 'counts': counts.tolist()}
+
+
+def fetch_values(table, attribute, sample_size):
+    """
+    Read an attribute column, sampled when the table is large.
+
+    Args:
+        table (VectorTable): The classified table
+        attribute (str): Numeric column name
+        sample_size (int): Approximate maximum number of values read
+
+    Returns:
+        tuple: (ndarray of values, estimated row count, whether sampled)
+
+    Raises:
+        ClassificationError: If the column is missing or not numeric
+    """
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT format_type(a.atttypid, NULL), GREATEST(c.reltuples, 0)::bigint
+            FROM pg_attribute a
+            JOIN pg_class c ON c.oid = a.attrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relname = %s AND a.attname = %s AND NOT a.attisdropped;
+        """, (table.schema, table.table, attribute))
+        row = cur.fetchone()
+        if row is None:
+            raise ClassificationError(f"Attribute '{attribute}' does not exist in '{table.table}'.")
+        column_type, estimated_rows = row
+        if column_type not in NUMERIC_TYPES:
+            raise ClassificationError(f"Attribute '{attribute}' is not numeric ({column_type}).")
+
+        column = attribute.replace('"', '""')
+        sampled = estimated_rows > sample_size
+        sample_sql = ''
+        params = ()
+        if sampled:
+            # BERNOULLI keeps each row with the given probability; a margin
+            # covers NULLs and the estimate being stale, LIMIT caps the rest
+            sample_sql = 'TABLESAMPLE BERNOULLI (%s) REPEATABLE (0)'
+            params = (min(100.0, 120.0 * sample_size / estimated_rows),)
+        cur.execute(f"""
+            SELECT array_agg(value) FROM (
+                SELECT v."{column}"::double precision AS value
+                FROM {table.qualified_name} v {sample_sql}
+                WHERE v."{column}" IS NOT NULL
+                LIMIT %s
+            ) s;
+        """, params + (sample_size,))
+        values = cur.fetchone()[0] or []
+        cur.close()
+    return np.asarray(values, dtype=float), int(estimated_rows), sampled
+
+
+def classify(table, attribute, methods, classes, sample_size=100000, jenks_max_values=2000):
+    """
+    Compute the class breaks of a numeric attribute with several methods.
+
+    Args:
+        table (VectorTable): The classified table
+        attribute (str): Numeric column name
+        methods (list): Keys of BREAK_FUNCTIONS
+        classes (int): Number of classes
+        sample_size (int): Approximate maximum number of values read
+        jenks_max_values (int): Values kept for Jenks
+
+    Returns:
+        dict: Value summary and the breaks of each method, or None if the
+            attribute has no values
+    """
+    values, estimated_rows, sampled = fetch_values(table, attribute, sample_size)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return None
+    return {
+        'count': int(len(values)),
+        'estimated_rows': estimated_rows,
+        'sampled': sampled,
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'mean': float(values.mean()),
+        'stddev': float(values.std()),
+        'classifications': {
+            method: compute_breaks(values, method, classes, jenks_max_values)
+            for method in methods
+        },
+    }
@@ -0,0 +1,164 @@
+"""
+Cloud-Optimized GeoTIFF conversion of uploaded rasters.
+
+Rasters are often exported striped, uncompressed and without overviews, so
+GeoServer reads the full-resolution data for every zoomed-out WMS request.
+Before a raster is published, ``gdal_translate -of COG`` rewrites it as a
+tiled, compressed GeoTIFF with internal overviews, in place of the upload.
+
+Overviews of rasters with a raster attribute table (RAT) are resampled with
+NEAREST, since their pixel values are class codes. The converted file
+replaces the upload under the same name, so the ``.aux.xml`` file holding
+the RAT still applies to it.
+
+Conversion is an optimization only: if GDAL is missing or fails, the
+original file is published as uploaded.
+"""
+
+import os
+import json
+import time
+import logging
+import subprocess
+from flask import current_app
+from prometheus_client import Counter, Histogram
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Metrics
+raster_cog_conversions = Counter('raster_cog_conversions_total', 'Raster uploads by COG conversion outcome',
+                                 ['outcome'])
+# The bytes saved are the difference of the input and output totals
+raster_cog_input_bytes = Counter('raster_cog_input_bytes_total', 'Size of uploaded rasters converted to COG')
+raster_cog_output_bytes = Counter('raster_cog_output_bytes_total', 'Size of the COGs uploaded rasters were converted to')
+raster_cog_seconds = Histogram('raster_cog_seconds', 'Time spent converting uploaded rasters to COG')
+
+
+def aux_path(raster_path):
+    return os.path.splitext(raster_path)[0] + '.aux.xml'
+
+
+def has_rat(raster_path):
+    """Check whether the .aux.xml file of a raster holds a raster attribute table."""
+    try:
+        with open(aux_path(raster_path), 'r', errors='replace') as f:
+            return 'GDALRasterAttributeTable' in f.read()
+    except OSError:
+        return False
+
+
+def is_cog(raster_path):
+    """
+    Check whether a raster already is a Cloud-Optimized GeoTIFF.
+
+    Args:
+        raster_path (str): Path of the GeoTIFF
+
+    Returns:
+        bool: True if GDAL reports the COG layout
+    """
+    result = subprocess.run(['gdalinfo', '-json', raster_path], capture_output=True, timeout=60)
+    if result.returncode != 0:
+        return False
+    info = json.loads(result.stdout)
+    structure = (info.get('metadata') or {}).get('IMAGE_STRUCTURE') or {}
+    return structure.get('LAYOUT') == 'COG'
+
+
+def cog_command(source, target, config, resampling):
+    """
+    Build the gdal_translate command converting a raster to COG.
+
+    Args:
+        source (str): Input GeoTIFF
+        target (str): Output file
+        config: App config with the RASTER_COG_* settings
+        resampling (str): Overview resampling method
+
+    Returns:
+        list: The command
+    """
+    return [
+        'gdal_translate', '-of', 'COG',
+        '-co', f"COMPRESS={config['RASTER_COG_COMPRESSION']}",
+        '-co', 'PREDICTOR=YES',
+        '-co', f"BLOCKSIZE={config['RASTER_COG_BLOCKSIZE']}",
+        '-co', 'OVERVIEWS=AUTO',
+        '-co', f"OVERVIEW_RESAMPLING={resampling}",
+        '-co', 'BIGTIFF=IF_SAFER',
+        '-co', 'NUM_THREADS=ALL_CPUS',
+        source, target,
+    ]
+
+
+def optimize_raster(raster_path, run_subprocess=None):
+    """
+    Replace an uploaded GeoTIFF by a Cloud-Optimized GeoTIFF.
+
+    Args:
+        raster_path (str): Path of the uploaded GeoTIFF; overwritten on success
+        run_subprocess: Optional callable ``(command, timeout)`` running the
+            conversion, e.g. a job's ``run_subprocess`` to report progress
+            and honour cancellation
+
+    Returns:
+        dict: What was done, with sizes and timings, or None if disabled
+    """
+    config = current_app.config
+    if not config["RASTER_COG_ENABLED"]:
+        return None
+
+    original_bytes = os.path.getsize(raster_path)
+    try:
+        if is_cog(raster_path):
+            raster_cog_conversions.labels(outcome='skipped').inc()
+            return {'converted': False, 'reason': 'already a COG', 'original_bytes': original_bytes}
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        logger.warning(f"Could not inspect {raster_path} with gdalinfo: {str(e)}")
+        raster_cog_conversions.labels(outcome='failed').inc()
+        return {'converted': False, 'reason': f"gdalinfo failed: {str(e)}", 'original_bytes': original_bytes}
+
+    resampling = 'NEAREST' if has_rat(raster_path) else config["RASTER_COG_RESAMPLING"]
+    target = f"{os.path.splitext(raster_path)[0]}.cog.tif"
+    command = cog_command(raster_path, target, config, resampling)
+    timeout = config["RASTER_COG_TIMEOUT"]
+
+    started = time.monotonic()
+    try:
+        if run_subprocess is not None:
+            run_subprocess(command, timeout)
+        else:
+            result = subprocess.run(command, capture_output=True, timeout=timeout)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.decode('utf-8', errors='replace').strip()[-2000:])
+    except (OSError, RuntimeError, subprocess.SubprocessError) as e:
+        logger.warning(f"COG conversion of {raster_path} failed, publishing the original: {str(e)}")
+        raster_cog_conversions.labels(outcome='failed').inc()
+        for path in (target, f"{target}.aux.xml"):
+            if os.path.exists(path):
+                os.remove(path)
+        return {'converted': False, 'reason': f"conversion failed: {str(e)}", 'original_bytes': original_bytes}
+    seconds = time.monotonic() - started
+
+    # The COG takes the upload's name, so the uploaded .aux.xml with the RAT
+    # stays next to it; GDAL's own copy of the metadata is not needed
+    os.replace(target, raster_path)
+    if os.path.exists(f"{target}.aux.xml"):
+        os.remove(f"{target}.aux.xml")
+
+    optimized_bytes = os.path.getsize(raster_path)
+    raster_cog_conversions.labels(outcome='converted').inc()
+    raster_cog_input_bytes.inc(original_bytes)
+    raster_cog_output_bytes.inc(optimized_bytes)
+    raster_cog_seconds.observe(seconds)
+    logger.info(f"Converted {os.path.basename(raster_path)} to COG in {seconds:.1f} s: "
+                f"{original_bytes:,} -> {optimized_bytes:,} bytes")
+    return {
+        'converted': True,
+        'original_bytes': original_bytes,
+        'optimized_bytes': optimized_bytes,
+        'saved_bytes': original_bytes - optimized_bytes,
+        'conversion_seconds': round(seconds, 3),
+        'overview_resampling': resampling,
+    }
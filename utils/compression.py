@@ -0,0 +1,262 @@
+"""
+Response compression.
+
+JSON, GeoJSON, CSV and other text responses are compressed with brotli (when
+the ``brotli`` package is installed) or gzip, whichever the client accepts.
+Streamed responses are compressed chunk by chunk as they are produced, so a
+FeatureCollection streamed from a server-side cursor is never buffered to be
+compressed. Formats that are already compressed (GeoTIFF, zip, GeoPackage,
+vector tiles) are left alone, as are bodies below a minimum size, where the
+framing would outweigh the savings.
+"""
+
+import zlib
+import logging
+from flask import request
+from werkzeug.http import parse_accept_header
+from prometheus_client import Counter
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Metrics
+compression_saved_bytes = Counter('response_compression_saved_bytes_total',
+                                  'Bytes saved by compressing responses', ['encoding'])
+compressed_responses = Counter('response_compression_responses_total',
+                               'Responses compressed', ['encoding'])
+
+# Content types worth compressing; everything else (images, archives,
+# vector tiles, GeoPackage) is sent as is
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/geo+json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+}
+
+
+def supported_encodings():
+    """
+    Get the content codings this server can produce, most preferred first.
+
+    Returns:
+        list: Content coding names
+    """
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding(accept_encodings):
+    """
+    Pick the content coding of a response.
+
+    Args:
+        accept_encodings: werkzeug ``Accept`` object of the request's Accept-Encoding
+
+    Returns:
+        str: 'br', 'gzip', or None to send the body uncompressed
+    """
+    return accept_encodings.best_match(supported_encodings())
+
+
+def is_compressible(mimetype):
+    """
+    Check whether a content type benefits from compression.
+
+    Args:
+        mimetype (str): Content type without parameters
+
+    Returns:
+        bool: True for text and JSON-like types
+    """
+    if not mimetype:
+        return False
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+class StreamCompressor:
+    """Incremental compressor for one response body."""
+
+    def __init__(self, encoding, level=6):
+        self.encoding = encoding
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=min(level, 11))
+        else:
+            # wbits 16 + MAX_WBITS writes a gzip header and trailer
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        """Compress a chunk, returning whatever output is ready (possibly b'')."""
+        self.bytes_in += len(data)
+        if self.encoding == 'br':
+            output = self._compressor.process(data)
+        else:
+            output = self._compressor.compress(data)
+        self.bytes_out += len(output)
+        return output
+
+    def finish(self):
+        """Flush the remaining output and record the bytes saved."""
+        output = self._compressor.finish() if self.encoding == 'br' else self._compressor.flush()
+        self.bytes_out += len(output)
+        compressed_responses.labels(encoding=self.encoding).inc()
+        compression_saved_bytes.labels(encoding=self.encoding).inc(max(0, self.bytes_in - self.bytes_out))
+        return output
+
+
+def compress_iter(chunks, compressor):
+    """
+    Compress a streamed body as it is produced.
+
+    Args:
+        chunks: Iterable of str or bytes body chunks
+        compressor (StreamCompressor): Compressor of this response
+
+    Yields:
+        bytes: Compressed chunks
+    """
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            output = compressor.compress(chunk)
+            if output:
+                yield output
+        yield compressor.finish()
+    finally:
+        # Closing early (client disconnected) must still close the inner stream
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, min_size=1024, level=6):
+    """
+    Compress a Flask response in place if the client and content allow it.
+
+    Args:
+        response (Response): Response about to be sent
+        min_size (int): Bodies smaller than this many bytes are not compressed
+        level (int): Compression level
+
+    Returns:
+        Response: The same response
+    """
+    if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers or response.direct_passthrough
+            or not is_compressible(response.mimetype)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        if response.content_length is not None and response.content_length < min_size:
+            return response
+        compressor = StreamCompressor(encoding, level)
+        response.response = compress_iter(response.response, compressor)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        compressor = StreamCompressor(encoding, level)
+        response.set_data(compressor.compress(data) + compressor.finish())
+
+    response.headers['Content-Encoding'] = encoding
+    # A compressed representation needs its own strong ETag (see utils.etags)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
+
+
+def asgi_compressing_send(scope, send, min_size=1024, level=6):
+    """
+    Wrap an ASGI ``send`` callable so the response it sends is compressed.
+
+    Used by the async read path in asgi.py, which bypasses Flask's
+    after_request hooks. The rules are those of :func:`compress_response`.
+
+    Args:
+        scope (dict): ASGI HTTP scope of the request
+        send: ASGI send callable
+        min_size (int): Bodies smaller than this many bytes are not compressed
+        level (int): Compression level
+
+    Returns:
+        The wrapped send callable
+    """
+    accept = b''
+    for name, value in scope.get('headers', []):
+        if name == b'accept-encoding':
+            accept = value
+    encoding = negotiate_encoding(parse_accept_header(accept.decode('latin-1')))
+    if encoding is None or scope.get('method') == 'HEAD':
+        return send
+
+    start = None
+    compressor = None
+
+    async def compressing_send(message):
+        nonlocal start, compressor
+        if message['type'] == 'http.response.start':
+            headers = {name.lower(): value for name, value in message.get('headers', [])}
+            mimetype = headers.get(b'content-type', b'').decode('latin-1').split(';')[0].strip()
+            if (message['status'] >= 200 and message['status'] not in (204, 304)
+                    and b'content-encoding' not in headers and is_compressible(mimetype)):
+                # Held back until the first body chunk tells whether to compress
+                start = message
+                return
+        elif message['type'] == 'http.response.body' and start is not None:
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                headers = [(name, value) for name, value in start.get('headers', [])
+                           if name.lower() != b'content-length']
+                if not more_body and len(body) < min_size:
+                    await send({**start, 'headers': start.get('headers', []) + [(b'vary', b'Accept-Encoding')]})
+                    start = None
+                    await send(message)
+                    return
+                compressor = StreamCompressor(encoding, level)
+                # A compressed representation needs its own strong ETag (see utils.etags)
+                headers = [(name, value[:-1] + b'-' + encoding.encode('latin-1') + b'"')
+                           if name.lower() == b'etag' and value.startswith(b'"') else (name, value)
+                           for name, value in headers]
+                await send({**start, 'headers': headers + [(b'content-encoding', encoding.encode('latin-1')),
+                                                           (b'vary', b'Accept-Encoding')]})
+            output = compressor.compress(body)
+            if not more_body:
+                output += compressor.finish()
+            if output or not more_body:
+                await send({'type': 'http.response.body', 'body': output, 'more_body': more_body})
+            return
+        await send(message)
+
+    return compressing_send
+
+
+def init_compression(app):
+    """
+    Compress responses of the Flask app.
+
+    Args:
+        app: The Flask application instance
+    """
+    if not app.config.get("COMPRESSION_ENABLED", True):
+        return
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, min_size=app.config["COMPRESSION_MIN_SIZE"],
+                                 level=app.config["COMPRESSION_LEVEL"])
@@ -0,0 +1,363 @@
+"""
+PostGIS connection pooling.
+
+This module keeps one connection pool per logical database (``roi_db`` and
+``geoserver_db``) for the lifetime of the worker process, so request handlers
+no longer pay a TCP and authentication handshake on every call.
+
+Every transaction opened with :func:`db_connection` inside a request runs
+with the ``statement_timeout`` budget configured for that request's route, so
+a runaway query is cancelled by PostgreSQL instead of saturating the server.
+When the server passes a :class:`RequestQueries` in the WSGI environ (as
+asgi.py does), the queries of a request are also cancelled as soon as its
+client disconnects.
+"""
+
+import time
+import logging
+import threading
+import contextlib
+from collections import deque
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from flask import current_app, has_request_context, request
+from prometheus_client import Counter, Gauge, Histogram
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Pool metrics, labelled by logical database name
+pool_in_use_gauge = Gauge('db_pool_connections_in_use', 'Connections currently checked out of the pool', ['pool'])
+pool_idle_gauge = Gauge('db_pool_connections_idle', 'Idle connections held by the pool', ['pool'])
+pool_wait_histogram = Histogram('db_pool_wait_seconds', 'Time spent waiting to check out a connection', ['pool'])
+
+# Queries stopped early, by route and reason ('timeout' or 'client_disconnect')
+query_cancellations = Counter('db_query_cancellations_total', 'PostGIS queries cancelled before completion',
+                              ['route', 'reason'])
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool's max wait"""
+    status_code = 503
+
+
+class QueryTimeout(Exception):
+    """Raised when a query exceeds the statement_timeout budget of its route"""
+    status_code = 504
+
+
+class ClientDisconnected(Exception):
+    """Raised when a request whose client disconnected goes on with its work"""
+    status_code = 499
+
+
+# WSGI environ key of the RequestQueries of a request
+REQUEST_QUERIES_KEY = 'szeb.request_queries'
+
+
+class RequestQueries:
+    """
+    Connections running the queries of one request.
+
+    The server cancels them from another thread when the request's client
+    disconnects, which stops a statement that is still running; closing a
+    streamed response only takes effect between fetches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = set()
+        self.cancelled = False
+
+    def add(self, conn):
+        """
+        Track a connection checked out by the request.
+
+        Raises:
+            ClientDisconnected: If the request was already cancelled
+        """
+        with self._lock:
+            if self.cancelled:
+                raise ClientDisconnected("The client disconnected")
+            self._connections.add(conn)
+
+    def discard(self, conn):
+        # Under the lock, so a connection back in the pool is never cancelled
+        with self._lock:
+            self._connections.discard(conn)
+
+    def cancel(self):
+        """Cancel the running queries; later ones raise ClientDisconnected."""
+        with self._lock:
+            self.cancelled = True
+            for conn in self._connections:
+                try:
+                    conn.cancel()
+                except psycopg2.Error as e:
+                    logger.warning(f"Could not cancel a query of a disconnected client: {str(e)}")
+
+
+def request_queries():
+    """Get the RequestQueries of the current request, or None."""
+    if has_request_context():
+        return request.environ.get(REQUEST_QUERIES_KEY)
+    return None
+
+
+def current_route():
+    """Get the endpoint name of the current request, or 'background' outside requests."""
+    if has_request_context() and request.endpoint:
+        return request.endpoint
+    return 'background'
+
+
+def route_statement_timeout(route):
+    """
+    Get the statement_timeout budget of a route.
+
+    Args:
+        route (str): Endpoint name
+
+    Returns:
+        int: Budget in milliseconds, 0 for no limit
+    """
+    config = current_app.config
+    default = config.get("STATEMENT_TIMEOUT_DEFAULT", 0)
+    return int(config.get("STATEMENT_TIMEOUTS", {}).get(route, default))
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections to a single database.
+
+    Connections are opened lazily up to ``max_connections``. Callers that find
+    the pool exhausted wait up to ``timeout`` seconds for a connection to be
+    returned before :class:`PoolTimeout` is raised.
+    """
+
+    def __init__(self, name, dsn, max_connections=5, timeout=10.0, health_check_interval=30.0):
+        """
+        Initialize the pool.
+
+        Args:
+            name (str): Logical database name, used as the metric label
+            dsn (dict): Keyword arguments passed to ``psycopg2.connect``
+            max_connections (int): Maximum number of open connections
+            timeout (float): Maximum time to wait for a free connection in seconds
+            health_check_interval (float): Idle time in seconds after which a
+                connection is pinged before being handed out
+        """
+        self.name = name
+        self.dsn = dsn
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._update_gauges()
+
+    def _update_gauges(self):
+        pool_in_use_gauge.labels(pool=self.name).set(self._in_use)
+        pool_idle_gauge.labels(pool=self.name).set(len(self._idle))
+
+    def _connect(self):
+        return psycopg2.connect(**self.dsn)
+
+    def _is_healthy(self, conn, last_used):
+        """Check that an idle connection is still usable."""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1;")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        Check a connection out of the pool.
+
+        Returns:
+            connection: An open psycopg2 connection
+
+        Raises:
+            PoolTimeout: If no connection is available within the timeout
+        """
+        start_time = time.monotonic()
+        deadline = start_time + self.timeout
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._in_use + len(self._idle) < self.max_connections:
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"Timed out waiting for a '{self.name}' database connection")
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._update_gauges()
+
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                logger.info(f"Discarding stale connection from pool '{self.name}'")
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._update_gauges()
+                self._cond.notify()
+            raise
+
+        pool_wait_histogram.labels(pool=self.name).observe(time.monotonic() - start_time)
+        return conn
+
+    def putconn(self, conn, close=False):
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn: The connection previously obtained from :meth:`getconn`
+            close (bool): Close the connection instead of keeping it idle
+        """
+        if not close and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        if close or conn.closed:
+            self._close_quietly(conn)
+            conn = None
+
+        with self._cond:
+            self._in_use -= 1
+            if conn is not None:
+                self._idle.append((conn, time.monotonic()))
+            self._update_gauges()
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every idle connection held by the pool."""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close_quietly(conn)
+            self._update_gauges()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def init_db_pools(app):
+    """
+    Create the connection pools for every configured database.
+
+    Args:
+        app: The Flask application instance.
+    """
+    pools = {}
+    for name, dbname in app.config["DB_POOLS"].items():
+        dsn = {
+            'host': app.config["POSTGIS_HOST"],
+            'port': app.config["POSTGIS_PORT"],
+            'user': app.config["POSTGIS_USER"],
+            'password': app.config["POSTGIS_PASSWORD"],
+            'database': dbname,
+            'connect_timeout': app.config["DB_CONNECT_TIMEOUT"],
+        }
+        pools[name] = ConnectionPool(
+            name,
+            dsn,
+            max_connections=app.config["DB_POOL_MAX_CONNECTIONS"],
+            timeout=app.config["DB_POOL_TIMEOUT"],
+            health_check_interval=app.config["DB_POOL_HEALTH_CHECK_INTERVAL"],
+        )
+    app.extensions['db_pools'] = pools
+
+
+def get_pool(name):
+    """
+    Get the connection pool for a logical database of the current app.
+
+    Args:
+        name (str): Logical database name ('roi_db' or 'geoserver_db')
+    """
+    return current_app.extensions['db_pools'][name]
+
+
+@contextlib.contextmanager
+def db_connection(name, statement_timeout=None):
+    """
+    Context manager that checks a connection out of the named pool.
+
+    The transaction is committed when the block exits normally and rolled back
+    if it raises. The connection is always returned to the pool.
+
+    Args:
+        name (str): Logical database name ('roi_db' or 'geoserver_db')
+        statement_timeout (int): Budget in milliseconds for each statement of
+            the transaction; defaults to the budget of the current route
+
+    Yields:
+        connection: An open psycopg2 connection
+
+    Raises:
+        QueryTimeout: If a statement exceeds the budget
+    """
+    route = current_route()
+    if statement_timeout is None:
+        statement_timeout = route_statement_timeout(route)
+    pool = get_pool(name)
+    queries = request_queries()
+    conn = pool.getconn()
+    broken = False
+    if queries is not None:
+        try:
+            queries.add(conn)
+        except ClientDisconnected:
+            pool.putconn(conn)
+            raise
+    try:
+        if statement_timeout:
+            # SET LOCAL ends with the transaction, so pooled connections stay clean
+            cur = conn.cursor()
+            cur.execute("SET LOCAL statement_timeout = %s;", (int(statement_timeout),))
+            cur.close()
+        yield conn
+        conn.commit()
+    except Exception as e:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        if isinstance(e, psycopg2.errors.QueryCanceled):
+            if queries is not None and queries.cancelled:
+                query_cancellations.labels(route=route, reason='client_disconnect').inc()
+                raise
+            query_cancellations.labels(route=route, reason='timeout').inc()
+            raise QueryTimeout(f"Query exceeded the {statement_timeout} ms time budget of this request") from e
+        raise
+    finally:
+        if queries is not None:
+            queries.discard(conn)
+        pool.putconn(conn, close=broken)
@@ -0,0 +1,151 @@
+"""
+Conditional GET support.
+
+Read endpoints whose bodies change rarely derive a strong ETag from a cheap
+version of the data they serve (the species config file's modification
+time, the ROI's upload time, the GeoServer catalog revision) and answer a
+matching ``If-None-Match`` with 304 before doing any of the work of
+building the body.
+
+The GeoServer catalog revision is a file whose modification time is bumped
+by every route of this app that changes the catalog, so all worker
+processes see the same revision. Changes made to GeoServer directly are
+picked up when the revision expires after CATALOG_REVISION_TTL seconds.
+"""
+
+import os
+import time
+import hashlib
+import logging
+from functools import wraps
+from flask import current_app, make_response, request
+from werkzeug.http import parse_etags
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Content codings utils.compression appends to the ETag of a compressed representation
+ENCODING_SUFFIXES = ('', '-gzip', '-br')
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag value from the parts identifying a representation.
+
+    Args:
+        *parts: Values identifying the data version, converted with str()
+
+    Returns:
+        str: Unquoted ETag value
+    """
+    text = '\x1f'.join(str(part) for part in parts)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def matching_etag(if_none_match, etag):
+    """
+    Check an If-None-Match header against the ETag of the current version.
+
+    Any content coding of the same version matches, since compression
+    changes the representation but not the data.
+
+    Args:
+        if_none_match (str): Raw If-None-Match header value, may be None
+        etag (str): Unquoted ETag of the current version
+
+    Returns:
+        str: The client's matching ETag, to send back with the 304, or None
+            if the client's copy is stale
+    """
+    if not if_none_match:
+        return None
+    etags = parse_etags(if_none_match)
+    for suffix in ENCODING_SUFFIXES:
+        if etags.contains(etag + suffix):
+            return etag + suffix
+    return None
+
+
+def conditional(version_func, private=False):
+    """
+    Decorate a GET view with ETag revalidation.
+
+    ``version_func`` is called in the request context and returns a cheap
+    version of the data, or None when there is none (the view then runs
+    unconditionally, e.g. to produce its 404). The ETag covers the request
+    path and query string, so variants of a resource get their own tags.
+
+    Args:
+        version_func: Callable without arguments returning the data version
+        private (bool): Mark responses as specific to the user's session
+
+    Returns:
+        The decorator
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            version = version_func()
+            if version is None:
+                return func(*args, **kwargs)
+
+            etag = make_etag(request.full_path, version)
+            cache_control = 'private, no-cache' if private else 'no-cache'
+            matched = matching_etag(request.headers.get('If-None-Match'), etag)
+            if matched:
+                response = current_app.response_class(status=304)
+                response.set_etag(matched)
+            else:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
+
+
+def bump_catalog_revision():
+    """Record that this app changed the GeoServer catalog."""
+    path = current_app.config["CATALOG_REVISION_FILE"]
+    try:
+        with open(path, 'a'):
+            pass
+        os.utime(path)
+    except OSError as e:
+        logger.warning(f"Could not bump catalog revision: {str(e)}")
+
+
+def catalog_changed_at(config=None):
+    """
+    Get the time this app last changed the GeoServer catalog.
+
+    Args:
+        config: App config, defaults to the current app's
+
+    Returns:
+        int: Modification time of the catalog revision file in ns, 0 if never changed
+    """
+    config = config if config is not None else current_app.config
+    try:
+        return os.stat(config["CATALOG_REVISION_FILE"]).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def catalog_revision(config=None):
+    """
+    Get the current GeoServer catalog revision.
+
+    Args:
+        config: App config, defaults to the current app's
+
+    Returns:
+        str: Revision combining the last local change and the expiry window
+    """
+    config = config if config is not None else current_app.config
+    changed = catalog_changed_at(config)
+    ttl = config["CATALOG_REVISION_TTL"]
+    window = int(time.time() // ttl) if ttl > 0 else 0
+    return f"{changed}:{window}"
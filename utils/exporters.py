@@ -0,0 +1,264 @@
+"""
+Feature Export Module
+
+This module writes the result of a PostGIS feature query in one of several
+download formats. GeoJSON and CSV are streamed row by row from a server-side
+cursor; GeoPackage, FlatGeobuf and zipped Shapefile are written by ogr2ogr
+reading directly from PostGIS, so no GeoDataFrame is ever built in the worker.
+"""
+
+import io
+import os
+import csv
+import shutil
+import tempfile
+import logging
+import subprocess
+from flask import Response, current_app, stream_with_context
+
+from utils.db_pool import db_connection, current_route, route_statement_timeout
+from utils.feature_stream import iter_rows, peek, feature_query, geojson_chunks
+from utils.generalization import NO_GENERALIZATION
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Supported export formats. Formats with a 'driver' are written by ogr2ogr.
+EXPORT_FORMATS = {
+    'geojson': {'extension': 'geojson', 'mimetype': 'application/json'},
+    'csv': {'extension': 'csv', 'mimetype': 'text/csv'},
+    'gpkg': {'extension': 'gpkg', 'mimetype': 'application/geopackage+sqlite3', 'driver': 'GPKG'},
+    'fgb': {'extension': 'fgb', 'mimetype': 'application/octet-stream', 'driver': 'FlatGeobuf'},
+    'shp': {'extension': 'shp.zip', 'mimetype': 'application/zip', 'driver': 'ESRI Shapefile'},
+}
+
+# Size of the chunks used when streaming a written file
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+class ExportError(Exception):
+    """Exception raised when an export file cannot be written"""
+    status_code = 500
+
+
+def iter_geojson(table, source_sql, params, generalization=NO_GENERALIZATION):
+    """
+    Stream features as a GeoJSON FeatureCollection in EPSG:4326.
+
+    Args:
+        table (VectorTable): Registry entry of the exported table
+        source_sql (str): FROM/WHERE clause selecting rows aliased as ``v``
+        params (tuple): Query parameters
+        generalization (Generalization): Simplification and precision of the geometries
+
+    Returns:
+        generator: Body chunks, or None if the query matches no features
+    """
+    query = feature_query(source_sql,
+                          geometry_sql=table.to_client_srid(table.geometry_sql()),
+                          geometry_column=table.geometry_column,
+                          generalization=generalization)
+    rows = peek(iter_rows('geoserver_db', query, params,
+                          batch_size=current_app.config["EXPORT_BATCH_SIZE"]))
+    if rows is None:
+        return None
+    return geojson_chunks(row[0] for row in rows)
+
+
+def iter_csv(table, source_sql, params):
+    """
+    Stream features as CSV with the geometry written as EPSG:4326 WKT.
+
+    Args:
+        table (VectorTable): Registry entry of the exported table
+        source_sql (str): FROM/WHERE clause selecting rows aliased as ``v``
+        params (tuple): Query parameters
+
+    Returns:
+        generator: Body chunks, or None if the query matches no features
+    """
+    geometry_column = table.geometry_column
+    query = f"SELECT v.*, ST_AsText({table.to_client_srid(table.geometry_sql())}) AS wkt {source_sql}"
+    rows = iter_rows('geoserver_db', query, params,
+                     batch_size=current_app.config["EXPORT_BATCH_SIZE"], header=True)
+    columns = next(rows)
+    rows = peek(rows)
+    if rows is None:
+        return None
+
+    # Drop the raw geometry column, the WKT column replaces it
+    keep = [i for i, name in enumerate(columns) if name != geometry_column]
+
+    def chunks():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([columns[i] for i in keep])
+        for row in rows:
+            writer.writerow([row[i] for i in keep])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        remainder = buffer.getvalue()
+        if remainder:
+            yield remainder
+
+    return chunks()
+
+
+def iter_file(path, cleanup_dir=None):
+    """
+    Stream a file in chunks, removing its directory afterwards.
+
+    Args:
+        path (str): File to stream
+        cleanup_dir (str): Directory deleted once streaming ends
+
+    Yields:
+        bytes: File content chunks
+    """
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if cleanup_dir:
+            shutil.rmtree(cleanup_dir, ignore_errors=True)
+
+
+def write_ogr(fmt, source_sql, params, layer_name, output_path):
+    """
+    Write the features of a query to a file with ogr2ogr.
+
+    ogr2ogr reads straight from PostGIS, so features never pass through the
+    Python process.
+
+    Args:
+        fmt (str): Key of an EXPORT_FORMATS entry with a driver
+        source_sql (str): FROM/WHERE clause selecting rows aliased as ``v``
+        params (tuple): Query parameters
+        layer_name (str): Name of the layer in the output file
+        output_path (str): File to write
+
+    Raises:
+        ExportError: If ogr2ogr fails
+    """
+    config = current_app.config
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        sql = cur.mogrify(f"SELECT v.* {source_sql}", params).decode('utf-8')
+        cur.close()
+
+    pg_source = (f"PG:host={config['POSTGIS_HOST']} port={config['POSTGIS_PORT']} "
+                 f"dbname={config['DB_POOLS']['geoserver_db']} user={config['POSTGIS_USER']}")
+    command = [
+        'ogr2ogr', '-f', EXPORT_FORMATS[fmt]['driver'],
+        output_path, pg_source,
+        '-sql', sql,
+        '-nln', layer_name,
+    ]
+    env = dict(os.environ, PGPASSWORD=config['POSTGIS_PASSWORD'])
+    statement_timeout = route_statement_timeout(current_route())
+    if statement_timeout:
+        # ogr2ogr's own connection gets the same budget as the route
+        env['PGOPTIONS'] = f"-c statement_timeout={statement_timeout}"
+
+    try:
+        subprocess.run(command, env=env, check=True, capture_output=True,
+                       timeout=config["EXPORT_TIMEOUT"])
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode('utf-8', errors='replace').strip()
+        logger.error(f"ogr2ogr export to {fmt} failed: {stderr}")
+        raise ExportError(f"Failed to write {fmt} export: {stderr}")
+    except subprocess.TimeoutExpired:
+        raise ExportError(f"Timed out writing {fmt} export")
+
+
+def has_features(source_sql, params):
+    """
+    Check whether a feature query matches at least one row.
+
+    Args:
+        source_sql (str): FROM/WHERE clause selecting rows aliased as ``v``
+        params (tuple): Query parameters
+    """
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT EXISTS (SELECT 1 {source_sql})", params)
+        exists = cur.fetchone()[0]
+        cur.close()
+    return exists
+
+
+def export_features(fmt, table, source_sql, params, generalization=NO_GENERALIZATION):
+    """
+    Export the features of a query in the requested format.
+
+    Args:
+        fmt (str): Key of EXPORT_FORMATS
+        table (VectorTable): Registry entry of the exported table
+        source_sql (str): FROM/WHERE clause selecting rows aliased as ``v``
+        params (tuple): Query parameters
+        generalization (Generalization): Simplification and precision of the
+            geometries; only applied to GeoJSON, other formats are for analysis
+
+    Returns:
+        generator: Body chunks, or None if the query matches no features
+    """
+    if fmt == 'geojson':
+        return iter_geojson(table, source_sql, params, generalization)
+    if fmt == 'csv':
+        return iter_csv(table, source_sql, params)
+
+    layer_name = table.table
+    if not has_features(source_sql, params):
+        return None
+
+    temp_dir = tempfile.mkdtemp(prefix='export_')
+    output_path = os.path.join(temp_dir, f"{layer_name}.{EXPORT_FORMATS[fmt]['extension']}")
+    try:
+        write_ogr(fmt, source_sql, params, layer_name, output_path)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return iter_file(output_path, cleanup_dir=temp_dir)
+
+
+def export_response(fmt, table, source_sql, params, filename, cache_entry=None,
+                    generalization=NO_GENERALIZATION):
+    """
+    Build a streamed download response for a feature query.
+
+    Args:
+        fmt (str): Key of EXPORT_FORMATS
+        table (VectorTable): Registry entry of the exported table
+        source_sql (str): FROM/WHERE clause selecting rows aliased as ``v``
+        params (tuple): Query parameters
+        filename (str): Download file name without extension
+        cache_entry (CacheEntry): Optional result cache slot for this export
+        generalization (Generalization): Simplification and precision of GeoJSON geometries
+
+    Returns:
+        Response: The streamed response, or None if there are no features
+    """
+    cache_status = None
+    if cache_entry is not None and cache_entry.exists():
+        cache_entry.touch()
+        body = iter_file(cache_entry.path)
+        cache_status = 'HIT'
+    else:
+        body = export_features(fmt, table, source_sql, params, generalization)
+        if body is None:
+            return None
+        if cache_entry is not None:
+            body = cache_entry.tee(body)
+            cache_status = 'MISS'
+
+    info = EXPORT_FORMATS[fmt]
+    response = Response(stream_with_context(body), mimetype=info['mimetype'])
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}.{info['extension']}"
+    if cache_status:
+        response.headers["X-Cache"] = cache_status
+    return response
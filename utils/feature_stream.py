@@ -0,0 +1,129 @@
+"""
+Streaming feature export.
+
+Features are read from PostGIS through a named (server-side) cursor in
+batches and written to the client as they arrive, so the size of an export
+no longer determines how much memory the worker needs.
+"""
+
+import uuid
+import logging
+
+from utils.db_pool import db_connection, current_route, query_cancellations
+from utils.generalization import NO_GENERALIZATION
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+def iter_rows(db_name, query, params=None, batch_size=500, header=False):
+    """
+    Iterate over the rows of a query using a server-side cursor.
+
+    The connection stays checked out of the pool until the generator is
+    exhausted or closed. Closing it early (the client disconnected) closes
+    the cursor's portal, so PostgreSQL stops producing the remaining rows.
+
+    Args:
+        db_name (str): Logical database name ('roi_db' or 'geoserver_db')
+        query (str): SQL query to run
+        params (tuple): Query parameters
+        batch_size (int): Number of rows fetched from the server per round trip
+        header (bool): Yield a tuple of column names before the first row
+
+    Yields:
+        tuple: One result row at a time
+    """
+    with db_connection(db_name) as conn:
+        cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cur.itersize = batch_size
+        try:
+            cur.execute(query, params)
+            if header:
+                # A named cursor only has a description once rows are fetched
+                first = cur.fetchone()
+                yield tuple(column.name for column in cur.description)
+                if first is None:
+                    return
+                yield first
+            for row in cur:
+                yield row
+        except GeneratorExit:
+            query_cancellations.labels(route=current_route(), reason='client_disconnect').inc()
+            raise
+        finally:
+            cur.close()
+
+
+def peek(rows):
+    """
+    Fetch the first row of a stream before the response starts.
+
+    This lets a route report an empty result with a proper status code
+    instead of streaming an empty document.
+
+    Args:
+        rows: Generator returned by :func:`iter_rows`
+
+    Returns:
+        generator: A generator yielding every row, or None if there are none
+    """
+    first = next(rows, None)
+    if first is None:
+        rows.close()
+        return None
+
+    def chained():
+        try:
+            yield first
+            yield from rows
+        finally:
+            rows.close()
+
+    return chained()
+
+
+def feature_query(source_sql, geometry_sql="v.geom", geometry_column="geom",
+                  generalization=NO_GENERALIZATION):
+    """
+    Build a query that returns one GeoJSON Feature per row as text.
+
+    Features are serialized by PostGIS and returned as text so psycopg2 does
+    not decode them into Python objects.
+
+    Args:
+        source_sql (str): FROM/WHERE clause selecting rows aliased as ``v``
+        geometry_sql (str): SQL expression for the output geometry
+        geometry_column (str): Geometry column excluded from the properties
+        generalization (Generalization): Simplification and coordinate
+            precision of the output geometry, which must be in EPSG:4326
+
+    Returns:
+        str: The SQL query
+    """
+    return f"""
+        SELECT json_build_object(
+                   'type', 'Feature',
+                   'geometry', {generalization.geojson_sql(geometry_sql)}::json,
+                   'properties', to_jsonb(v) - '{geometry_column}'
+               )::text
+        {source_sql}
+    """
+
+
+def geojson_chunks(features):
+    """
+    Frame an iterable of serialized features as a GeoJSON FeatureCollection.
+
+    Args:
+        features: Iterable of GeoJSON Feature strings
+
+    Yields:
+        str: The collection header, one feature per chunk, then the footer
+    """
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+    for feature in features:
+        yield separator + feature
+        separator = ','
+    yield ']}'
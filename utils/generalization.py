@@ -0,0 +1,137 @@
+"""
+Display-oriented geometry generalization for GeoJSON responses.
+
+Requests meant for display can ask for simplified geometries and fewer
+coordinate decimals with optional parameters:
+
+- ``tolerance``: simplification tolerance in degrees
+- ``zoom``: web map zoom level; the tolerance becomes one screen pixel
+- ``generalize=1``: derive the tolerance from the requested bbox so the view
+  is drawn at about ``TARGET_PIXELS`` pixels across
+- ``precision``: decimal digits of output coordinates; defaults to the
+  digits that still resolve the tolerance
+
+Without any of them geometries are returned at full resolution, so
+downloads meant for analysis are unchanged.
+"""
+
+import math
+from collections import namedtuple
+
+# Degrees covered by one 256 px tile at zoom 0
+WORLD_DEGREES = 360.0
+TILE_SIZE = 256
+
+# Width in pixels the bbox-derived default tolerance is aimed at
+TARGET_PIXELS = 1024
+
+# ST_AsGeoJSON's own default number of decimal digits
+MAX_PRECISION = 9
+
+
+class InvalidGeneralization(Exception):
+    """Raised when a generalization parameter cannot be parsed"""
+    status_code = 400
+
+
+class Generalization(namedtuple('Generalization', 'tolerance precision')):
+    """Simplification tolerance (degrees) and coordinate precision, either may be None."""
+    __slots__ = ()
+
+    @property
+    def cache_key(self):
+        """Suffix distinguishing cached results generalized differently."""
+        if self == NO_GENERALIZATION:
+            return ''
+        return f"@t{self.tolerance or 0:g}p{self.precision if self.precision is not None else MAX_PRECISION}"
+
+    def geometry_sql(self, geometry_sql):
+        """Wrap an EPSG:4326 geometry expression with the simplification."""
+        if not self.tolerance:
+            return geometry_sql
+        return f"ST_SimplifyPreserveTopology({geometry_sql}, {float(self.tolerance)!r})"
+
+    def geojson_sql(self, geometry_sql):
+        """Serialize an EPSG:4326 geometry expression as GeoJSON text."""
+        geometry_sql = self.geometry_sql(geometry_sql)
+        if self.precision is None:
+            return f"ST_AsGeoJSON({geometry_sql})"
+        return f"ST_AsGeoJSON({geometry_sql}, {int(self.precision)})"
+
+
+NO_GENERALIZATION = Generalization(None, None)
+
+
+def zoom_tolerance(zoom):
+    """
+    Get the size of one screen pixel in degrees at a zoom level.
+
+    Args:
+        zoom (float): Web map zoom level
+
+    Returns:
+        float: Degrees per pixel at the equator
+    """
+    return WORLD_DEGREES / (TILE_SIZE * 2 ** zoom)
+
+
+def precision_for(tolerance):
+    """
+    Get the number of decimals that still resolves a tolerance.
+
+    Args:
+        tolerance (float): Simplification tolerance in degrees
+
+    Returns:
+        int: Decimal digits, one finer than the tolerance
+    """
+    digits = math.ceil(-math.log10(tolerance)) + 1
+    return max(0, min(MAX_PRECISION, digits))
+
+
+def _number(args, name, cast):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = cast(value)
+    except ValueError:
+        raise InvalidGeneralization(f"Parameter '{name}' must be a number.")
+    if not math.isfinite(number):
+        raise InvalidGeneralization(f"Parameter '{name}' must be a finite number.")
+    if number < 0:
+        raise InvalidGeneralization(f"Parameter '{name}' must not be negative.")
+    return number
+
+
+def parse_generalization(args, bbox=None):
+    """
+    Read the generalization parameters of a request.
+
+    Args:
+        args: Mapping of query parameters (e.g. ``request.args``)
+        bbox (tuple): Requested (minx, miny, maxx, maxy) in degrees, if any
+
+    Returns:
+        Generalization: The tolerance and precision to apply
+
+    Raises:
+        InvalidGeneralization: If a parameter is invalid
+    """
+    tolerance = _number(args, 'tolerance', float)
+    zoom = _number(args, 'zoom', float)
+    precision = _number(args, 'precision', int)
+    if precision is not None:
+        precision = min(precision, MAX_PRECISION)
+
+    if tolerance is None and zoom is not None:
+        tolerance = zoom_tolerance(min(zoom, 24))
+    if tolerance is None and bbox and args.get('generalize', '').lower() in ('1', 'true', 'yes'):
+        minx, _, maxx, _ = bbox
+        width = abs(maxx - minx)
+        if width > 0:
+            tolerance = width / TARGET_PIXELS
+
+    if precision is None and tolerance:
+        precision = precision_for(tolerance)
+    return Generalization(tolerance or None, precision)
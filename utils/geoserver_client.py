@@ -0,0 +1,139 @@
+"""
+Shared GeoServer REST client.
+
+All GeoServer calls of the Flask app go through one ``GeoServerClient``
+stored on the app. It owns a ``requests.Session`` whose connection pool keeps
+connections to GeoServer alive between calls, so multi-call workflows such
+as a raster upload pay the TCP/TLS setup once. Every call gets default
+connect and read timeouts, idempotent calls (GET, HEAD, PUT, DELETE) are
+retried with exponential backoff on connection errors and 502/503/504
+responses, and latencies are recorded per operation.
+
+The base URL and credentials are read from the app config on every call,
+so they can be changed at runtime (e.g. by tests).
+"""
+
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import current_app
+from prometheus_client import Counter, Histogram
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Metrics
+geoserver_request_seconds = Histogram('geoserver_request_seconds',
+                                      'Latency of GeoServer requests', ['operation'])
+geoserver_request_errors = Counter('geoserver_request_errors_total',
+                                   'GeoServer requests that failed without a response', ['operation'])
+
+# Responses worth retrying for idempotent requests
+RETRY_STATUSES = (502, 503, 504)
+
+
+class GeoServerClient:
+    """Pooled, instrumented HTTP client for the GeoServer REST API and OGC services."""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: App config with the GEOSERVER_* settings
+        """
+        self.config = config
+        self.timeout = (config["GEOSERVER_CONNECT_TIMEOUT"], config["GEOSERVER_READ_TIMEOUT"])
+        retry = Retry(
+            total=config["GEOSERVER_RETRIES"],
+            backoff_factor=config["GEOSERVER_RETRY_BACKOFF"],
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config["GEOSERVER_POOL_SIZE"], max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def base_url(self):
+        return self.config.get("GEOSERVER_URL", "http://conescout.duckdns.org/geoserver").rstrip('/')
+
+    @property
+    def auth(self):
+        return (self.config.get("GEOSERVER_USER", "admin"), self.config.get("GEOSERVER_PASS", "geoserver"))
+
+    def url(self, path):
+        """
+        Resolve a path against the GeoServer base URL.
+
+        Args:
+            path (str): Path such as ``/rest/layers.json``, or an absolute URL
+
+        Returns:
+            str: The absolute URL
+        """
+        if path.startswith(('http://', 'https://')):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, operation, **kwargs):
+        """
+        Send a request to GeoServer.
+
+        Args:
+            method (str): HTTP method
+            path (str): Path relative to GEOSERVER_URL, or an absolute URL
+            operation (str): Name of the call, used as the metrics label
+            **kwargs: Passed to ``requests.Session.request``; ``auth``
+                defaults to the configured credentials (pass None for
+                anonymous OGC requests) and ``timeout`` to the configured
+                connect/read timeouts
+
+        Returns:
+            requests.Response: The response, whatever its status
+
+        Raises:
+            requests.RequestException: If GeoServer could not be reached
+        """
+        kwargs.setdefault('auth', self.auth)
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.perf_counter()
+        try:
+            return self.session.request(method, self.url(path), **kwargs)
+        except requests.RequestException:
+            geoserver_request_errors.labels(operation=operation).inc()
+            raise
+        finally:
+            geoserver_request_seconds.labels(operation=operation).observe(time.perf_counter() - started)
+
+    def get(self, path, operation, **kwargs):
+        return self.request('GET', path, operation, **kwargs)
+
+    def post(self, path, operation, **kwargs):
+        return self.request('POST', path, operation, **kwargs)
+
+    def put(self, path, operation, **kwargs):
+        return self.request('PUT', path, operation, **kwargs)
+
+    def delete(self, path, operation, **kwargs):
+        return self.request('DELETE', path, operation, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def init_geoserver_client(app):
+    """
+    Create the app's GeoServer client.
+
+    Args:
+        app: The Flask application instance
+    """
+    app.extensions['geoserver_client'] = GeoServerClient(app.config)
+
+
+def get_geoserver_client():
+    """Get the GeoServer client of the current app."""
+    return current_app.extensions['geoserver_client']
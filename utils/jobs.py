@@ -0,0 +1,550 @@
+"""
+Background job queue for long-running exports and imports.
+
+Jobs run on a bounded thread pool outside the request handlers, so a slow
+ogr2ogr import or a large raster clip no longer ties up a gunicorn worker.
+Each job has its own directory under ``JOBS_DIR`` holding its state file
+(``job.json``), any uploaded inputs and its result file. State is written on
+every change, so status polling keeps working across worker restarts, and
+jobs that were queued or running when a worker stopped are queued again on
+startup. Listing and cancelling jobs go through the job directories as well,
+so they work from any process sharing ``JOBS_DIR``: cancellation drops a flag
+file that the running job polls.
+
+Job kinds are registered with :meth:`JobManager.register`. A handler is
+called with the :class:`Job` inside an application context. It may report
+progress, should call :meth:`Job.check_cancelled` between units of work, and
+returns a JSON-serializable result (or None).
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, jsonify, request, url_for
+from prometheus_client import Counter, Gauge
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Job metrics
+jobs_finished = Counter('jobs_finished_total', 'Finished background jobs', ['kind', 'state'])
+jobs_running = Gauge('jobs_running', 'Background jobs currently running', ['kind'])
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Seconds between cancellation checks while a job waits on a subprocess
+SUBPROCESS_POLL_INTERVAL = 0.5
+
+# Minimum seconds between reads of a job's cancellation flag file
+CANCEL_POLL_INTERVAL = 0.5
+
+# Job IDs are UUID hex strings; anything else is never looked up on disk
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobCancelled(Exception):
+    """Exception raised inside a job handler when the job has been cancelled"""
+
+
+class JobError(Exception):
+    """Exception raised for job submission and lookup errors"""
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Job:
+    """A unit of background work and its persisted state."""
+
+    FIELDS = ('id', 'kind', 'params', 'owner', 'state', 'progress', 'message', 'result',
+              'result_filename', 'result_mimetype', 'error', 'cancel_requested', 'has_secrets',
+              'created_at', 'started_at', 'finished_at')
+
+    def __init__(self, manager, **state):
+        self.manager = manager
+        for field in self.FIELDS:
+            setattr(self, field, state.get(field))
+        self.secrets = {}
+        self._next_cancel_poll = 0.0
+
+    @property
+    def dir(self):
+        return os.path.join(self.manager.jobs_dir, self.id)
+
+    @property
+    def result_path(self):
+        return os.path.join(self.dir, 'result')
+
+    @property
+    def cancel_path(self):
+        return os.path.join(self.dir, 'cancel')
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    @property
+    def expires_at(self):
+        if not self.finished or not self.finished_at:
+            return None
+        return self.finished_at + self.manager.result_ttl
+
+    def to_dict(self):
+        """Get the public status of the job."""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'result': self.result,
+            'has_file': self.state == SUCCEEDED and self.result_filename is not None,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'expires_at': self.expires_at,
+        }
+
+    def save(self):
+        """Write the job state file atomically."""
+        state = {field: getattr(self, field) for field in self.FIELDS}
+        os.makedirs(self.dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, os.path.join(self.dir, 'job.json'))
+
+    def update(self, progress=None, message=None):
+        """
+        Report progress.
+
+        Args:
+            progress (float): Completed fraction between 0 and 1, if known
+            message (str): Short description of the current step
+        """
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+        self.save()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation has been requested, by this or another process."""
+        if not self.cancel_requested and time.monotonic() >= self._next_cancel_poll:
+            self._next_cancel_poll = time.monotonic() + CANCEL_POLL_INTERVAL
+            self.cancel_requested = os.path.exists(self.cancel_path)
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    def set_result_file(self, filename, mimetype):
+        """
+        Declare the file at ``result_path`` as the downloadable result.
+
+        Args:
+            filename (str): File name offered to the client
+            mimetype (str): Content type of the file
+        """
+        self.result_filename = filename
+        self.result_mimetype = mimetype
+
+    def write_result(self, chunks):
+        """
+        Write a stream of chunks to the result file, honouring cancellation.
+
+        Args:
+            chunks: Iterable of str or bytes chunks
+
+        Returns:
+            int: Number of bytes written
+        """
+        written = 0
+        last_report = time.monotonic()
+        with open(self.result_path, 'wb') as f:
+            for chunk in chunks:
+                self.check_cancelled()
+                data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                f.write(data)
+                written += len(data)
+                if time.monotonic() - last_report > 1:
+                    self.update(message=f"{written:,} bytes written")
+                    last_report = time.monotonic()
+        return written
+
+    def run_subprocess(self, command, env=None, timeout=None, parse_progress=None):
+        """
+        Run a command, killing it if the job is cancelled or times out.
+
+        Args:
+            command (list): Command and arguments
+            env (dict): Environment of the command
+            timeout (float): Seconds before the command is killed
+            parse_progress: Optional callable mapping the output so far to a
+                completed fraction, or None if it cannot tell
+
+        Returns:
+            str: Combined stdout and stderr of the command
+
+        Raises:
+            RuntimeError: If the command fails or times out
+        """
+        log_path = os.path.join(self.dir, 'subprocess.log')
+        started = time.monotonic()
+        with open(log_path, 'wb') as log:
+            process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+            try:
+                while True:
+                    try:
+                        process.wait(timeout=SUBPROCESS_POLL_INTERVAL)
+                        break
+                    except subprocess.TimeoutExpired:
+                        pass
+                    self.check_cancelled()
+                    if timeout and time.monotonic() - started > timeout:
+                        raise RuntimeError(f"{command[0]} timed out after {timeout} seconds")
+                    if parse_progress:
+                        with open(log_path, 'r', errors='replace') as f:
+                            progress = parse_progress(f.read())
+                        if progress is not None and progress != self.progress:
+                            self.update(progress=progress)
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+
+        with open(log_path, 'r', errors='replace') as f:
+            output = f.read()
+        if process.returncode != 0:
+            raise RuntimeError(f"{command[0]} failed: {output.strip()[-2000:]}")
+        return output
+
+
+class JobManager:
+    """
+    Bounded pool of background workers with persisted job state.
+
+    Jobs run in the process that queued them. Lookups, listings and
+    cancellation read the persisted state, so any process sharing
+    ``jobs_dir`` can serve them. Resuming unfinished jobs on startup still
+    assumes no other live process is running them, as in the container's
+    one-worker gunicorn setup.
+    """
+
+    def __init__(self, app, jobs_dir, max_workers=2, result_ttl=86400):
+        """
+        Initialize the manager.
+
+        Args:
+            app: The Flask application instance jobs run in
+            jobs_dir (str): Directory holding job state and results
+            max_workers (int): Number of jobs run concurrently
+            result_ttl (float): Seconds finished jobs and their results are kept
+        """
+        self.app = app
+        self.jobs_dir = jobs_dir
+        self.result_ttl = result_ttl
+        self.handlers = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def register(self, kind, handler):
+        """
+        Register the handler of a job kind.
+
+        Args:
+            kind (str): Job kind name
+            handler: Callable taking the Job
+        """
+        self.handlers[kind] = handler
+
+    def prepare(self, kind, params, owner, secrets=None):
+        """
+        Create a queued job without starting it.
+
+        Use this when inputs must be written into the job directory before it
+        runs; call :meth:`start` afterwards.
+
+        Args:
+            kind (str): Registered job kind
+            params (dict): JSON-serializable job parameters, persisted
+            owner (str): Session ID allowed to see the job
+            secrets (dict): Parameters kept in memory only, never written to disk
+
+        Returns:
+            Job: The new job
+        """
+        if kind not in self.handlers:
+            raise JobError(f"Unknown job kind '{kind}'.")
+        job = Job(self, id=uuid.uuid4().hex, kind=kind, params=params, owner=owner,
+                  state=QUEUED, cancel_requested=False, has_secrets=bool(secrets),
+                  created_at=time.time())
+        job.secrets = secrets or {}
+        job.save()
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def start(self, job):
+        """Queue a prepared job on the worker pool."""
+        self._executor.submit(self._run, job)
+
+    def submit(self, kind, params, owner, secrets=None):
+        """
+        Create and queue a job.
+
+        Args:
+            kind (str): Registered job kind
+            params (dict): JSON-serializable job parameters
+            owner (str): Session ID allowed to see the job
+            secrets (dict): Parameters kept in memory only
+
+        Returns:
+            Job: The queued job
+        """
+        job = self.prepare(kind, params, owner, secrets=secrets)
+        self.start(job)
+        return job
+
+    def _load(self, job_id):
+        try:
+            with open(os.path.join(self.jobs_dir, job_id, 'job.json')) as f:
+                return Job(self, **json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def get(self, job_id, owner):
+        """
+        Look up a job.
+
+        Args:
+            job_id (str): The job ID
+            owner (str): Session ID; only jobs this session owns are returned,
+                none if it is None (the request has no session)
+
+        Returns:
+            Job: The job
+
+        Raises:
+            JobError: If the job does not exist or belongs to another session
+        """
+        job = None
+        if JOB_ID_PATTERN.match(job_id or ''):
+            with self._lock:
+                job = self._jobs.get(job_id)
+            if job is None:
+                job = self._load(job_id)
+        if job is None or owner is None or job.owner != owner:
+            raise JobError("Job not found.", status_code=404)
+        return job
+
+    def list(self, owner):
+        """
+        List the jobs of a session, newest first.
+
+        Args:
+            owner (str): Session ID
+
+        Returns:
+            list: Jobs owned by the session
+        """
+        jobs = []
+        for job_id in os.listdir(self.jobs_dir):
+            if not JOB_ID_PATTERN.match(job_id):
+                continue
+            job = self._load(job_id)
+            if job is not None and job.owner == owner:
+                jobs.append(job)
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def cancel(self, job):
+        """
+        Request cancellation of a job.
+
+        Queued jobs are cancelled when a worker picks them up; running jobs
+        stop at their next cancellation check. The request is a flag file
+        rather than a rewrite of the job's state, which may belong to a job
+        running in another process.
+        """
+        if job.finished:
+            return
+        job.cancel_requested = True
+        with open(job.cancel_path, 'w'):
+            pass
+
+    def _run(self, job):
+        try:
+            job.check_cancelled()
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+            return
+
+        job.state = RUNNING
+        job.started_at = time.time()
+        job.save()
+        jobs_running.labels(kind=job.kind).inc()
+        try:
+            with self.app.app_context():
+                job.result = self.handlers[job.kind](job)
+            self._finish(job, SUCCEEDED)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+            job.error = str(e)
+            self._finish(job, FAILED)
+        finally:
+            jobs_running.labels(kind=job.kind).dec()
+
+    def _finish(self, job, state):
+        job.state = state
+        job.finished_at = time.time()
+        job.secrets = {}
+        if state == SUCCEEDED:
+            job.progress = 1.0
+        elif job.result_filename:
+            job.result_filename = None
+            try:
+                os.remove(job.result_path)
+            except OSError:
+                pass
+        job.save()
+        jobs_finished.labels(kind=job.kind, state=state).inc()
+
+    def resume(self):
+        """
+        Load persisted jobs and queue again those that did not finish.
+
+        Jobs that depended on in-memory secrets cannot be rerun and are
+        marked as failed.
+        """
+        for job_id in os.listdir(self.jobs_dir):
+            job = self._load(job_id)
+            if job is None:
+                continue
+            with self._lock:
+                if job.id in self._jobs:
+                    continue
+                self._jobs[job.id] = job
+            if job.finished:
+                continue
+            if job.has_secrets or job.kind not in self.handlers:
+                job.error = "Interrupted by a server restart; please submit it again."
+                self._finish(job, FAILED)
+            else:
+                logger.info(f"Resuming job {job.id} ({job.kind})")
+                job.state = QUEUED
+                job.save()
+                self.start(job)
+
+    def sweep(self):
+        """
+        Delete finished jobs whose results have expired.
+
+        Returns:
+            int: Number of jobs deleted
+        """
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.expires_at is not None and job.expires_at < now]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.dir, ignore_errors=True)
+        return len(expired)
+
+    def schedule_sweep(self, interval):
+        """
+        Run :meth:`sweep` every ``interval`` seconds in the background.
+
+        Args:
+            interval (float): Seconds between sweeps, 0 to disable
+        """
+        if not interval:
+            return
+
+        def run():
+            try:
+                deleted = self.sweep()
+                if deleted:
+                    logger.info(f"Removed {deleted} expired jobs")
+            except Exception as e:
+                logger.warning(f"Job sweep failed: {str(e)}")
+            self.schedule_sweep(interval)
+
+        timer = threading.Timer(interval, run)
+        timer.daemon = True
+        timer.start()
+
+
+def init_job_manager(app):
+    """
+    Create the job manager for the app.
+
+    Args:
+        app: The Flask application instance.
+    """
+    app.extensions['job_manager'] = JobManager(
+        app,
+        app.config["JOBS_DIR"],
+        max_workers=app.config["JOB_WORKERS"],
+        result_ttl=app.config["JOB_RESULT_TTL_HOURS"] * 3600,
+    )
+
+
+def resume_jobs(app):
+    """
+    Queue again the jobs left unfinished by a previous worker and start the
+    expiry sweeper. Call after all job kinds have been registered.
+
+    Args:
+        app: The Flask application instance.
+    """
+    manager = app.extensions['job_manager']
+    try:
+        manager.resume()
+    except OSError as e:
+        logger.warning(f"Could not resume jobs: {str(e)}")
+    manager.schedule_sweep(app.config["JOB_SWEEP_INTERVAL"])
+
+
+def get_job_manager():
+    """Get the job manager of the current app."""
+    return current_app.extensions['job_manager']
+
+
+def wants_async():
+    """Check whether the current request asked to run as a background job."""
+    value = request.args.get('async') or request.form.get('async') or ''
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def job_accepted(job):
+    """
+    Build the 202 response returned when a request is queued as a job.
+
+    Args:
+        job (Job): The queued job
+
+    Returns:
+        tuple: The JSON response and status code
+    """
+    status_url = url_for('job_api.get_job', job_id=job.id)
+    response = jsonify({"status": "accepted", "job_id": job.id, "status_url": status_url})
+    response.headers["Location"] = status_url
+    return response, 202
@@ -0,0 +1,279 @@
+"""
+In-process cache of GeoServer layer schemas.
+
+A schema lists a layer's attribute names and types and its geometry column
+and type. Layers backed by a PostGIS table known to the spatial registry are
+described from the PostgreSQL catalog; all others through a single WFS
+``DescribeFeatureType`` request per batch, which GeoServer answers without
+opening the datastore's data. Both list the same columns: GeoServer publishes
+primary key columns as feature IDs rather than attributes, so they are left
+out of PostGIS schemas too.
+
+Schemas are kept for LAYER_SCHEMA_TTL seconds and dropped when this app
+changes the GeoServer catalog (see ``utils.etags.bump_catalog_revision``).
+Saving the species configuration refreshes the schemas of its vector layers
+in the background.
+"""
+
+import time
+import logging
+import threading
+from flask import current_app
+
+from utils.db_pool import db_connection
+from utils.etags import catalog_changed_at
+from utils.geoserver_client import get_geoserver_client
+from utils.spatial_registry import get_spatial_registry
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+def postgis_schemas(tables):
+    """
+    Describe PostGIS tables from the PostgreSQL catalog.
+
+    Args:
+        tables (dict): Layer name -> VectorTable
+
+    Returns:
+        dict: Layer name -> schema
+    """
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT n.nspname, c.relname, a.attname, format_type(a.atttypid, a.atttypmod),
+                   EXISTS (SELECT 1 FROM pg_index i
+                           WHERE i.indrelid = c.oid AND i.indisprimary AND a.attnum = ANY(i.indkey))
+            FROM pg_attribute a
+            JOIN pg_class c ON c.oid = a.attrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE a.attnum > 0 AND NOT a.attisdropped
+              AND n.nspname || '.' || c.relname = ANY(%s)
+            ORDER BY n.nspname, c.relname, a.attnum;
+        """, ([f"{table.schema}.{table.table}" for table in tables.values()],))
+        columns = {}
+        for schema, table, column, column_type, primary_key in cur.fetchall():
+            # Like WFS, which serves primary keys as feature IDs
+            if not primary_key:
+                columns.setdefault((schema, table), []).append((column, column_type))
+        cur.close()
+
+    schemas = {}
+    for layer, table in tables.items():
+        if (table.schema, table.table) not in columns:
+            continue
+        schemas[layer] = {
+            'layer': layer,
+            'source': 'postgis',
+            'geometry': {'name': table.geometry_column, 'type': table.geometry_type},
+            'attributes': [{'name': column, 'type': column_type}
+                           for column, column_type in columns[(table.schema, table.table)]
+                           if column != table.geometry_column],
+        }
+    return schemas
+
+
+def wfs_schemas(layers, workspace):
+    """
+    Describe layers through WFS DescribeFeatureType.
+
+    All layers are described in one request. If GeoServer rejects it (e.g.
+    because one layer does not exist), each layer is described on its own.
+
+    Args:
+        layers (list): Layer names without workspace prefix
+        workspace (str): GeoServer workspace
+
+    Returns:
+        dict: Layer name -> schema, for the layers GeoServer knows
+    """
+    client = get_geoserver_client()
+    response = client.get('/wfs', 'wfs_describe_feature_type', auth=None, params={
+        'service': 'WFS', 'version': '2.0.0', 'request': 'DescribeFeatureType',
+        'typeNames': ','.join(f"{workspace}:{layer}" for layer in layers),
+        'outputFormat': 'application/json',
+    })
+    if response.status_code >= 500:
+        response.raise_for_status()
+    try:
+        feature_types = response.json().get('featureTypes') if response.ok else None
+    except ValueError:
+        # GeoServer reports errors as XML
+        feature_types = None
+    if feature_types is None:
+        if len(layers) == 1:
+            return {}
+        schemas = {}
+        for layer in layers:
+            schemas.update(wfs_schemas([layer], workspace))
+        return schemas
+
+    schemas = {}
+    for feature_type in feature_types:
+        layer = feature_type['typeName'].split(':')[-1]
+        geometry, attributes = None, []
+        for prop in feature_type.get('properties', []):
+            if prop.get('type', '').startswith('gml:'):
+                if geometry is None:
+                    geometry = {'name': prop['name'], 'type': prop.get('localType')}
+            else:
+                attributes.append({'name': prop['name'], 'type': prop.get('localType')})
+        schemas[layer] = {'layer': layer, 'source': 'wfs', 'geometry': geometry, 'attributes': attributes}
+    return schemas
+
+
+def describe_layers(layers):
+    """
+    Describe layers, from PostGIS where possible and through WFS otherwise.
+
+    Must be called inside an application context.
+
+    Args:
+        layers (list): Layer names, optionally prefixed with the workspace
+
+    Returns:
+        dict: Layer name -> schema, for the layers that exist
+    """
+    registry = get_spatial_registry()
+    tables, others = {}, []
+    for layer in layers:
+        table = registry.vector_table(layer, refresh=False)
+        if table is not None:
+            tables[layer] = table
+        else:
+            others.append(layer)
+
+    schemas = postgis_schemas(tables) if tables else {}
+    # Tables missing from the catalog since the last registry refresh are asked to GeoServer
+    others.extend(layer for layer in tables if layer not in schemas)
+    if others:
+        workspace = current_app.config.get("GEOSERVER_WORKSPACE", "SZEB_sample")
+        found = wfs_schemas([layer.split(':')[-1] for layer in others], workspace)
+        for layer in others:
+            if layer.split(':')[-1] in found:
+                schemas[layer] = dict(found[layer.split(':')[-1]], layer=layer)
+    return schemas
+
+
+class LayerSchemaCache:
+    """Layer schemas, kept in memory per layer name."""
+
+    def __init__(self, ttl=3600):
+        """
+        Initialize an empty cache.
+
+        Args:
+            ttl (float): Seconds a schema is kept
+        """
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def cached(self, layer, changed_at):
+        """
+        Get a cached schema without fetching anything.
+
+        Args:
+            layer (str): Layer name
+            changed_at (int): Current catalog change time, from ``catalog_changed_at``
+
+        Returns:
+            dict: The schema, or None if it is not cached or expired
+        """
+        with self._lock:
+            entry = self._entries.get(layer)
+        if entry is None or entry[2] != changed_at or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def refresh(self, layers):
+        """
+        Describe layers again and cache their schemas.
+
+        Must be called inside an application context.
+
+        Args:
+            layers (list): Layer names
+
+        Returns:
+            dict: Layer name -> schema, for the layers that exist
+        """
+        changed_at = catalog_changed_at()
+        schemas = describe_layers(list(layers))
+        now = time.monotonic()
+        with self._lock:
+            for layer in layers:
+                if layer in schemas:
+                    self._entries[layer] = (schemas[layer], now, changed_at)
+                else:
+                    self._entries.pop(layer, None)
+        return schemas
+
+    def get_many(self, layers):
+        """
+        Get the schemas of layers, describing the uncached ones in one batch.
+
+        Must be called inside an application context.
+
+        Args:
+            layers (list): Layer names
+
+        Returns:
+            dict: Layer name -> schema, for the layers that exist
+        """
+        changed_at = catalog_changed_at()
+        schemas, missing = {}, []
+        for layer in layers:
+            schema = self.cached(layer, changed_at)
+            if schema is not None:
+                schemas[layer] = schema
+            else:
+                missing.append(layer)
+        if missing:
+            schemas.update(self.refresh(missing))
+        return schemas
+
+    def get(self, layer):
+        """
+        Get the schema of a layer.
+
+        Args:
+            layer (str): Layer name
+
+        Returns:
+            dict: The schema, or None if the layer does not exist
+        """
+        return self.get_many([layer]).get(layer)
+
+    def refresh_in_background(self, app, layers):
+        """
+        Refresh schemas on a background thread.
+
+        Args:
+            app: The Flask application instance
+            layers (list): Layer names
+        """
+        def run():
+            with app.app_context():
+                try:
+                    self.refresh(layers)
+                except Exception as e:
+                    logger.warning(f"Background refresh of layer schemas failed: {str(e)}")
+
+        threading.Thread(target=run, name='layer-schema-refresh', daemon=True).start()
+
+
+def init_layer_schema_cache(app):
+    """
+    Create the app's layer schema cache.
+
+    Args:
+        app: The Flask application instance
+    """
+    app.extensions['layer_schema_cache'] = LayerSchemaCache(ttl=app.config["LAYER_SCHEMA_TTL"])
+
+
+def get_layer_schema_cache():
+    """Get the layer schema cache of the current app."""
+    return current_app.extensions['layer_schema_cache']
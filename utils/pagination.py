@@ -0,0 +1,163 @@
+"""
+Keyset pagination of feature queries.
+
+Pages are ordered by the table's primary key and each page continues after
+the last key of the previous one (``WHERE pk > last ORDER BY pk LIMIT n``),
+so every page costs the same index range scan however deep the client goes,
+unlike OFFSET. The position is handed to the client as an opaque, signed
+continuation token that is only valid for the same table and filter.
+"""
+
+import json
+import hashlib
+import logging
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from utils.db_pool import db_connection
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursor(Exception):
+    """Raised when a continuation token is malformed or belongs to another query"""
+    status_code = 400
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='feature-page')
+
+
+def filter_fingerprint(table, filter_params):
+    """
+    Identify a paginated query, so tokens cannot be replayed against another one.
+
+    Args:
+        table (VectorTable): The paginated table
+        filter_params (tuple): Parameters of the page filter
+
+    Returns:
+        str: Short hex digest
+    """
+    text = json.dumps([table.schema, table.table, list(filter_params)], default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def encode_cursor(fingerprint, last_key):
+    """
+    Build the continuation token pointing after ``last_key``.
+
+    Args:
+        fingerprint (str): From :func:`filter_fingerprint`
+        last_key: Primary key of the last feature of the page
+
+    Returns:
+        str: The opaque token
+    """
+    if not isinstance(last_key, (int, str)):
+        # UUIDs, numerics and dates round-trip through their text form
+        last_key = str(last_key)
+    return _serializer().dumps({'f': fingerprint, 'k': last_key})
+
+
+def decode_cursor(token, fingerprint):
+    """
+    Read the last key from a continuation token.
+
+    Args:
+        token (str): Token from a previous page
+        fingerprint (str): Fingerprint of the current query
+
+    Returns:
+        The primary key to continue after
+
+    Raises:
+        InvalidCursor: If the token is invalid or belongs to another query
+    """
+    try:
+        data = _serializer().loads(token)
+    except BadSignature:
+        raise InvalidCursor("Invalid cursor.")
+    if not isinstance(data, dict) or data.get('f') != fingerprint:
+        raise InvalidCursor("Cursor does not belong to this query.")
+    return data['k']
+
+
+def estimate_count(cur, source_sql, params):
+    """
+    Estimate the number of rows of a query from planner statistics.
+
+    Args:
+        cur: An open database cursor
+        source_sql (str): FROM/WHERE clause of the query
+        params (tuple): Query parameters
+
+    Returns:
+        int: The planner's row estimate
+    """
+    cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 {source_sql}", params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def fetch_page(table, filter_sql, filter_params, limit, cursor=None):
+    """
+    Fetch one page of features as GeoJSON in EPSG:4326.
+
+    Args:
+        table (VectorTable): The paginated table, which must have a primary key
+        filter_sql (str): WHERE condition on rows aliased as ``v``
+        filter_params (tuple): Parameters of the condition
+        limit (int): Maximum number of features in the page
+        cursor (str): Continuation token of the previous page, None for the first
+
+    Returns:
+        str: GeoJSON FeatureCollection text with ``next_cursor`` and, on the
+            first page, ``estimated_total`` members
+    """
+    fingerprint = filter_fingerprint(table, filter_params)
+    key_sql = f'v."{table.primary_key}"'
+    source_sql = f"FROM {table.qualified_name} v WHERE {filter_sql}"
+    params = tuple(filter_params)
+    if cursor:
+        source_sql += f" AND {key_sql} > %s"
+        params += (decode_cursor(cursor, fingerprint),)
+
+    # One row more than the page size tells whether another page follows
+    query = f"""
+        SELECT json_build_object(
+                   'type', 'Feature',
+                   'id', {key_sql},
+                   'geometry', ST_AsGeoJSON({table.to_client_srid(table.geometry_sql())})::json,
+                   'properties', to_jsonb(v) - '{table.geometry_column}'
+               )::text,
+               {key_sql}
+        {source_sql}
+        ORDER BY {key_sql}
+        LIMIT %s
+    """
+    estimated_total = None
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        if not cursor:
+            estimated_total = estimate_count(cur, f"FROM {table.qualified_name} v WHERE {filter_sql}",
+                                             tuple(filter_params))
+        cur.execute(query, params + (limit + 1,))
+        rows = cur.fetchall()
+        cur.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(fingerprint, rows[-1][1])
+
+    # Features are already serialized by PostGIS; only the envelope is built here
+    members = {'next_cursor': next_cursor}
+    if estimated_total is not None:
+        members['estimated_total'] = estimated_total
+    return ('{"type": "FeatureCollection", "features": [' +
+            ','.join(feature for feature, _ in rows) + '], ' +
+            json.dumps(members)[1:])
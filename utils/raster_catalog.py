@@ -0,0 +1,179 @@
+"""
+In-process cache of the raster layers published in GeoServer.
+
+Listing the raster layers of a workspace takes one REST call for the
+coverage stores and one per store for its coverages. The catalog makes the
+per-store calls concurrently over a bounded thread pool and keeps the merged
+list in memory:
+
+- for ``ttl`` seconds the cached list is served as is;
+- for ``stale_ttl`` seconds after that it is still served, while a
+  background thread fetches a fresh one (stale-while-revalidate);
+- older lists are fetched again before answering.
+
+Lists are dropped when this app publishes a raster, in every worker process,
+since each list records the catalog revision file's modification time it was
+fetched at (see ``utils.etags.bump_catalog_revision``).
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+from utils.etags import catalog_changed_at
+from utils.geoserver_client import get_geoserver_client
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+class RasterCatalogError(Exception):
+    """Raised when GeoServer cannot list the coverage stores of a workspace"""
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RasterCatalog:
+    """Cached, concurrently fetched lists of raster layers per workspace."""
+
+    def __init__(self, ttl=60, stale_ttl=600, max_workers=8):
+        """
+        Initialize an empty catalog.
+
+        Args:
+            ttl (float): Seconds a fetched list is served without revalidation
+            stale_ttl (float): Further seconds a list is served while it is refreshed
+            max_workers (int): Concurrent per-store requests
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='raster-catalog')
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+
+    def fetch(self, client, workspace):
+        """
+        Fetch the raster layers of a workspace from GeoServer.
+
+        Args:
+            client: The app's GeoServerClient
+            workspace (str): GeoServer workspace
+
+        Returns:
+            list: Coverage names, grouped by store in GeoServer's store order
+
+        Raises:
+            RasterCatalogError: If the coverage stores cannot be listed
+        """
+        response = client.get(f"/rest/workspaces/{workspace}/coveragestores.json", 'list_coveragestores')
+        if not response.ok:
+            raise RasterCatalogError(f"Failed to fetch coverage stores: {response.status_code} {response.reason}", 400)
+        stores = (response.json().get('coverageStores') or {}).get('coverageStore') or []
+
+        def store_coverages(store):
+            store_response = client.get(f"/rest/workspaces/{workspace}/coveragestores/{store['name']}/coverages.json",
+                                        'list_coverages')
+            if not store_response.ok:
+                logger.warning(f"Failed to list coverages of store {store['name']}: {store_response.status_code}")
+                return []
+            coverages = (store_response.json().get('coverages') or {}).get('coverage') or []
+            return [coverage['name'] for coverage in coverages]
+
+        layers = []
+        for names in self._executor.map(store_coverages, stores):
+            layers.extend(names)
+        return layers
+
+    def _store(self, workspace, layers, changed_at):
+        with self._lock:
+            self._entries[workspace] = (layers, time.monotonic(), changed_at)
+
+    def _fetch_and_store(self, client, workspace, changed_at):
+        layers = self.fetch(client, workspace)
+        self._store(workspace, layers, changed_at)
+        return layers
+
+    def _revalidate(self, client, workspace, changed_at):
+        try:
+            self._fetch_and_store(client, workspace, changed_at)
+        except Exception as e:
+            logger.warning(f"Background refresh of the raster catalog of {workspace} failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(workspace)
+
+    def layers(self, workspace):
+        """
+        Get the raster layers of a workspace.
+
+        Must be called inside an application context.
+
+        Args:
+            workspace (str): GeoServer workspace
+
+        Returns:
+            list: Coverage names
+
+        Raises:
+            RasterCatalogError: If no usable list is cached and GeoServer cannot list the stores
+        """
+        client = get_geoserver_client()
+        changed_at = catalog_changed_at()
+        with self._lock:
+            entry = self._entries.get(workspace)
+            age = time.monotonic() - entry[1] if entry else None
+            usable = entry is not None and entry[2] == changed_at
+            if usable and age <= self.ttl:
+                return entry[0]
+            if usable and age <= self.ttl + self.stale_ttl:
+                if workspace not in self._refreshing:
+                    self._refreshing.add(workspace)
+                    threading.Thread(target=self._revalidate, args=(client, workspace, changed_at),
+                                     name='raster-catalog-refresh', daemon=True).start()
+                return entry[0]
+            fetch_lock = self._fetch_locks.setdefault(workspace, threading.Lock())
+
+        # Concurrent misses of the same workspace wait for a single fetch
+        with fetch_lock:
+            with self._lock:
+                entry = self._entries.get(workspace)
+                if entry is not None and entry[2] == changed_at and time.monotonic() - entry[1] <= self.ttl:
+                    return entry[0]
+            return self._fetch_and_store(client, workspace, changed_at)
+
+    def invalidate(self, workspace=None):
+        """
+        Drop the cached list of a workspace, or of all workspaces.
+
+        Args:
+            workspace (str): Workspace whose list changed, None for all
+        """
+        with self._lock:
+            if workspace is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(workspace, None)
+
+
+def init_raster_catalog(app):
+    """
+    Create the app's raster catalog.
+
+    Args:
+        app: The Flask application instance
+    """
+    app.extensions['raster_catalog'] = RasterCatalog(
+        ttl=app.config["RASTER_CATALOG_TTL"],
+        stale_ttl=app.config["RASTER_CATALOG_STALE_TTL"],
+        max_workers=app.config["RASTER_CATALOG_WORKERS"],
+    )
+
+
+def get_raster_catalog():
+    """Get the raster catalog of the current app."""
+    return current_app.extensions['raster_catalog']
@@ -0,0 +1,181 @@
+"""
+Raster clipping against the session ROI.
+
+Rasters loaded with raster2pgsql are split into many tiles. Only the tiles
+whose footprint intersects the ROI parts are selected (using the raster's
+spatial index), each is clipped to the ROI, and the pieces are merged with
+``ST_Union`` into a single GeoTIFF. The output size is estimated up front so
+oversized requests are rejected before PostGIS does any work.
+
+The GeoTIFF is written to a PostgreSQL large object and read back in chunks
+while the response is sent, so it is never held in memory by the app.
+"""
+
+import logging
+
+from utils.db_pool import db_connection
+from utils.roi_store import roi_filter_sql
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Size of the chunks used when streaming the encoded GeoTIFF
+RASTER_CHUNK_SIZE = 64 * 1024
+
+
+class RasterTooLarge(Exception):
+    """Exception raised when a clip would exceed the output pixel cap"""
+    status_code = 413
+
+
+def roi_tiles_sql(table):
+    """
+    Build a FROM/WHERE clause selecting the raster tiles that intersect the ROI.
+
+    Tiles are aliased as ``r``. The clause takes a single query parameter,
+    the session ID.
+
+    Args:
+        table (RasterTable): Registry entry of the raster
+
+    Returns:
+        str: The SQL clause
+    """
+    raster_sql = f'r."{table.raster_column}"'
+    return f"""
+        FROM {table.qualified_name} r
+        WHERE {roi_filter_sql(raster_sql, table)}
+    """
+
+
+def estimate_clip_pixels(cur, table, session_id):
+    """
+    Estimate the pixel count of a raster clipped to the ROI's bounding box.
+
+    Args:
+        cur: An open cursor on the GeoServer database
+        table (RasterTable): Registry entry of the raster
+        session_id (str): Session whose ROI is used
+
+    Returns:
+        int: Estimated number of output pixels, 0 if nothing intersects
+    """
+    scale_x, scale_y = table.scale_x, table.scale_y
+    if not scale_x or not scale_y:
+        # Rasters without a scale constraint: read it from an intersecting tile
+        cur.execute(f'SELECT ST_ScaleX(r."{table.raster_column}"), ST_ScaleY(r."{table.raster_column}") '
+                    f'{roi_tiles_sql(table)} LIMIT 1;', (session_id,))
+        row = cur.fetchone()
+        if not row:
+            return 0
+        scale_x, scale_y = row
+
+    cur.execute(f"""
+        SELECT ST_XMax(e) - ST_XMin(e), ST_YMax(e) - ST_YMin(e)
+        FROM (SELECT ST_Extent({table.to_table_srid('p.geom')}) AS e
+              FROM roi_parts p WHERE p.session_id = %s) extent;
+    """, (session_id,))
+    row = cur.fetchone()
+    if not row or row[0] is None:
+        return 0
+    width, height = row
+    return int(width / abs(scale_x)) * int(height / abs(scale_y))
+
+
+class ClippedRaster:
+    """
+    A clipped GeoTIFF held in a PostgreSQL large object while it is streamed.
+
+    Iterating yields the file in chunks read from the large object, so the
+    GeoTIFF is never held in the Python process. The connection stays
+    checked out until the iteration ends or :meth:`close` is called; the
+    large object is removed with the transaction either way.
+    """
+
+    def __init__(self, size, chunks):
+        """
+        Args:
+            size (int): Size of the GeoTIFF in bytes
+            chunks: Generator yielding the GeoTIFF's bytes
+        """
+        self.size = size
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        self._chunks.close()
+
+
+def iter_clipped_raster(table, session_id, roi_geojson, max_pixels, chunk_size=RASTER_CHUNK_SIZE):
+    """
+    Clip a raster into a large object and stream it.
+
+    The first item yielded is the size of the GeoTIFF, the following ones
+    its bytes. Nothing is yielded if no tile intersects the ROI.
+    """
+    roi_sql = table.to_table_srid("ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326)")
+    # The ROI is parsed once (as an init plan) and shared by every clipped tile.
+    # The GeoTIFF goes into a large object, which the transaction owns.
+    query = f"""
+        WITH roi AS (
+            SELECT {roi_sql} AS geom
+        ),
+        clipped AS (
+            SELECT ST_Clip(r."{table.raster_column}", (SELECT geom FROM roi), true) AS rast
+            {roi_tiles_sql(table)}
+        ),
+        tiff AS (
+            SELECT ST_AsGDALRaster(ST_Union(clipped.rast), 'GTiff', ARRAY['COMPRESS=DEFLATE', 'TILED=YES']) AS data
+            FROM clipped
+        )
+        SELECT lo_from_bytea(0, tiff.data) FROM tiff WHERE tiff.data IS NOT NULL;
+    """
+
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        if max_pixels:
+            pixels = estimate_clip_pixels(cur, table, session_id)
+            if pixels > max_pixels:
+                raise RasterTooLarge(f"The ROI covers about {pixels:,} pixels of this raster; "
+                                     f"at most {max_pixels:,} can be downloaded at once.")
+        cur.execute(query, (roi_geojson, session_id))
+        result = cur.fetchone()
+        cur.close()
+        if not result or result[0] is None:
+            return
+
+        lobject = conn.lobject(result[0], 'rb')
+        yield lobject.seek(0, 2)
+        lobject.seek(0)
+        while True:
+            chunk = lobject.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        # Closing early rolls the transaction back, which removes the large object too
+        lobject.unlink()
+
+
+def clip_raster(table, session_id, roi_geojson, max_pixels):
+    """
+    Clip a raster to the session ROI and encode the result as GeoTIFF.
+
+    Args:
+        table (RasterTable): Registry entry of the raster
+        session_id (str): Session whose ROI parts select the tiles
+        roi_geojson (str): The full ROI geometry, used as the clip boundary
+        max_pixels (int): Largest allowed output size in pixels, 0 for no cap
+
+    Returns:
+        ClippedRaster: The GeoTIFF, to be streamed, or None if no tile intersects the ROI
+
+    Raises:
+        RasterTooLarge: If the clip would exceed ``max_pixels``
+    """
+    chunks = iter_clipped_raster(table, session_id, roi_geojson, max_pixels)
+    size = next(chunks, None)
+    if size is None:
+        return None
+    return ClippedRaster(size, chunks)
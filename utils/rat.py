@@ -0,0 +1,195 @@
+"""
+Streaming parser for raster attribute tables (RATs) in GDAL PAM documents.
+
+The PAM document is read with ``iterparse``, one row at a time, and each
+row is dropped from the tree once it has been read, so memory does not grow
+with the size of the document. Values are stored column by column: integer
+and real columns in typed arrays (missing values are NaN, or masked for
+integers), string columns in lists. Fields are mapped to their column
+through an index-to-column map built once from the field definitions.
+
+Only the requested columns and the requested window of rows are kept;
+all rows are still counted. No more than ``max_rows`` rows are kept per
+band, whatever the window.
+"""
+
+import math
+import logging
+from array import array
+import xml.etree.ElementTree as ET
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# GDAL writes field types as GDALRATFieldType codes, GeoServer by name
+FIELD_TYPES = {'0': 'Integer', '1': 'Real', '2': 'String',
+               'Integer': 'Integer', 'Real': 'Real', 'String': 'String'}
+
+
+class RatColumn:
+    """A RAT column and its values."""
+
+    def __init__(self, name, index, type, usage):
+        self.name = name
+        self.index = index
+        self.type = FIELD_TYPES.get(type, 'String')
+        self.usage = usage
+        # Integer arrays have no null value; a mask marks the missing ones once there are any
+        self.nulls = None
+        if self.type == 'Integer':
+            self.values = array('q')
+        elif self.type == 'Real':
+            self.values = array('d')
+        else:
+            self.values = []
+
+    def append(self, text):
+        if isinstance(self.values, array):
+            if text is None or not text.strip():
+                self._append_null()
+                return
+            try:
+                value = int(text) if self.type == 'Integer' else float(text)
+            except ValueError:
+                # Keep values that are not numbers; the column becomes a plain list
+                self.values = self.to_list()
+                self.nulls = None
+                self.values.append(text)
+                return
+            self.values.append(value)
+            if self.nulls is not None:
+                self.nulls.append(0)
+        else:
+            self.values.append(text)
+
+    def _append_null(self):
+        if self.type == 'Real':
+            self.values.append(math.nan)
+            return
+        if self.nulls is None:
+            self.nulls = bytearray(len(self.values))
+        self.values.append(0)
+        self.nulls.append(1)
+
+    def to_list(self):
+        values = list(self.values)
+        if self.nulls is not None:
+            values = [None if null else value for value, null in zip(values, self.nulls)]
+        # NaN and infinity are not valid JSON
+        return [None if isinstance(value, float) and not math.isfinite(value) else value for value in values]
+
+
+class RasterAttributeTable:
+    """The RAT of one band, stored column by column."""
+
+    def __init__(self, band, columns, offset=0):
+        """
+        Args:
+            band (str): Band number
+            columns (list): RatColumn of every column, in field order
+            offset (int): Index of the first kept row
+        """
+        self.band = band
+        self.columns = columns
+        self.offset = offset
+        self.row_count = 0
+        self.values = array('q')
+
+    def to_dict(self):
+        """
+        Get the table as a JSON-serializable document.
+
+        ``columns`` describes every column of the RAT; ``data`` holds the
+        values of the kept columns for the rows ``offset`` to
+        ``offset + len(values)`` out of ``row_count``, and ``values`` the
+        pixel values (row indexes) of those rows.
+        """
+        kept = [column for column in self.columns if column.values is not None]
+        return {
+            'columns': {column.name: {'index': column.index, 'type': column.type, 'usage': column.usage}
+                        for column in self.columns},
+            'row_count': self.row_count,
+            'offset': self.offset,
+            'values': self.values.tolist(),
+            'data': {column.name: column.to_list() for column in kept},
+        }
+
+
+def parse_rat(source, columns=None, offset=0, limit=None, max_rows=100000):
+    """
+    Parse the raster attribute tables of a PAM document.
+
+    Args:
+        source: File name or binary file-like object with the PAM XML
+        columns (list): Names of the columns to keep values of, None for all
+        offset (int): Index of the first row to keep
+        limit (int): Number of rows to keep, None for as many as ``max_rows``
+        max_rows (int): Most rows kept per band
+
+    Returns:
+        dict: RasterAttributeTable by band number, for bands with a RAT
+    """
+    limit = max_rows if limit is None else min(limit, max_rows)
+    wanted = set(columns) if columns is not None else None
+    tables = {}
+    band_count = 0
+    band = None
+    table = None
+    rat_elem = None
+    definitions = []
+    by_index = None
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'PAMRasterBand':
+                band_count += 1
+                band = elem.get('band', str(band_count))
+            elif tag == 'GDALRasterAttributeTable':
+                rat_elem, definitions, by_index, table = elem, [], None, None
+            continue
+
+        if tag == 'FieldDefn' and rat_elem is not None:
+            column = RatColumn(elem.findtext('Name'), elem.get('index', str(len(definitions))),
+                               elem.findtext('Type'), elem.findtext('Usage'))
+            if not column.name:
+                column = None
+            elif wanted is not None and column.name not in wanted:
+                # Described, but its values are not kept
+                column.values = None
+            definitions.append(column)
+        elif tag == 'Row' and rat_elem is not None:
+            if table is None:
+                # Field position -> column, built once per table
+                by_index = {}
+                for position, column in enumerate(definitions):
+                    if column is not None:
+                        by_index[int(column.index) if column.index.isdigit() else position] = column
+                table = RasterAttributeTable(band, [column for column in definitions if column is not None],
+                                             offset=offset)
+            row_number = table.row_count
+            table.row_count += 1
+            if offset <= row_number < offset + limit:
+                table.values.append(int(elem.get('index', row_number)))
+                filled = set()
+                for position, field in enumerate(elem.iter('F')):
+                    column = by_index.get(int(field.get('index', position)))
+                    if column is not None and column.values is not None and column.name not in filled:
+                        column.append(field.text)
+                        filled.add(column.name)
+                # Keep the columns aligned when a row lacks fields
+                for column in table.columns:
+                    if column.values is not None and column.name not in filled:
+                        column.append(None)
+            # Rows are not needed once read
+            rat_elem.remove(elem)
+        elif tag == 'GDALRasterAttributeTable':
+            if table is None:
+                table = RasterAttributeTable(band, [column for column in definitions if column is not None],
+                                             offset=offset)
+            tables[band] = table
+            rat_elem = None
+            elem.clear()
+        elif tag == 'PAMRasterBand':
+            elem.clear()
+    return tables
@@ -0,0 +1,353 @@
+"""
+Disk-backed result cache for ROI downloads.
+
+Entries are keyed by (table, ROI hash, table data version, format). Files are
+grouped in one directory per ROI so that replacing an ROI can drop all of its
+entries at once, and the total size is kept under a configurable budget by
+evicting the least recently used files.
+
+Table data versions are counters kept by a statement trigger on each cached
+table. The triggers are installed once, by a database owner, with the
+``flask install-version-triggers`` command; requests only read the counters.
+Results of tables without the trigger are not cached.
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import click
+from flask import current_app
+
+from utils.db_pool import db_connection
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Name of the statement trigger keeping a table's data version
+VERSION_TRIGGER = 'table_data_version'
+
+# Version counters and the trigger function updating them. The function runs
+# with its owner's rights, so writers of a table need no rights on the counters.
+VERSION_SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS public.table_data_versions (
+        table_oid oid PRIMARY KEY,
+        version bigint NOT NULL
+    );
+    GRANT SELECT ON public.table_data_versions TO PUBLIC;
+    CREATE OR REPLACE FUNCTION public.bump_table_data_version() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER SET search_path = pg_catalog, public AS $$
+    BEGIN
+        INSERT INTO public.table_data_versions AS v (table_oid, version) VALUES (TG_RELID, 1)
+        ON CONFLICT (table_oid) DO UPDATE SET version = v.version + 1;
+        RETURN NULL;
+    END
+    $$;
+"""
+
+# Tables whose results can be cached: every vector and raster table
+SPATIAL_TABLES_SQL = """
+    SELECT f_table_schema, f_table_name FROM geometry_columns
+    UNION
+    SELECT r_table_schema, r_table_name FROM raster_columns
+    ORDER BY 1, 2;
+"""
+
+
+def roi_hash(roi_geojson):
+    """
+    Hash an ROI geometry.
+
+    Args:
+        roi_geojson (str): The ROI geometry as GeoJSON text
+
+    Returns:
+        str: Hex digest identifying the ROI
+    """
+    return hashlib.sha256(roi_geojson.encode('utf-8')).hexdigest()
+
+
+def install_version_triggers(cur, tables):
+    """
+    Install the triggers maintaining the data version of tables.
+
+    The trigger runs once per statement and increments the table's row in
+    ``table_data_versions`` in the writing transaction, so the version
+    changes exactly when the write commits. Creating it takes a lock that
+    conflicts with writes to the table and needs a user that owns it, so
+    this is an administration step, never run by requests.
+
+    Args:
+        cur: An open database cursor
+        tables (list): (schema, table) pairs
+
+    Returns:
+        list: The (schema, table) pairs the trigger was added to; tables
+            that already had it are left alone
+    """
+    cur.execute(VERSION_SCHEMA_SQL)
+    installed = []
+    for schema_name, table_name in tables:
+        cur.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_catalog.pg_trigger
+                WHERE tgrelid = to_regclass(format('%%I.%%I', %s::text, %s::text)) AND tgname = %s
+            );
+        """, (schema_name, table_name, VERSION_TRIGGER))
+        if cur.fetchone()[0]:
+            continue
+        cur.execute(f"""
+            CREATE TRIGGER {VERSION_TRIGGER}
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "{schema_name}"."{table_name}"
+            FOR EACH STATEMENT EXECUTE PROCEDURE public.bump_table_data_version();
+        """)
+        installed.append((schema_name, table_name))
+    return installed
+
+
+def table_data_version(cur, schema_name, table_name):
+    """
+    Get a token that changes whenever a table's data changes.
+
+    The token combines the table OID, which changes when the table is
+    recreated, with the counter kept by the table's version trigger. Unlike
+    the statistics collector's counters, the counter is updated in the
+    writing transaction and never reset. The trigger is looked up on every
+    call, so results stop being cached as soon as it is dropped or disabled.
+
+    Args:
+        cur: An open database cursor
+        schema_name (str): Schema of the table
+        table_name (str): Name of the table
+
+    Returns:
+        str: The data version token, or None if the table has no enabled
+            version trigger and its results must not be cached
+    """
+    cur.execute("""
+        SELECT c.oid, EXISTS (
+            SELECT 1 FROM pg_catalog.pg_trigger t
+            WHERE t.tgrelid = c.oid AND t.tgname = %s AND t.tgenabled <> 'D'
+        )
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s;
+    """, (VERSION_TRIGGER, schema_name, table_name))
+    row = cur.fetchone()
+    if row is None or not row[1]:
+        return None
+    cur.execute("SELECT version FROM public.table_data_versions WHERE table_oid = %s;", (row[0],))
+    version = cur.fetchone()
+    return f"{row[0]}-{version[0] if version else 0}"
+
+
+class CacheEntry:
+    """A single cache slot, which may or may not hold a file yet."""
+
+    def __init__(self, cache, path):
+        self.cache = cache
+        self.path = path
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def touch(self):
+        """Mark the entry as recently used."""
+        try:
+            os.utime(self.path)
+        except OSError:
+            pass
+
+    def read(self):
+        """Read the cached bytes, or None if the entry is missing."""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        self.touch()
+        return data
+
+    def write(self, data):
+        """
+        Store a small result in one go.
+
+        Args:
+            data (str or bytes): The result to cache
+        """
+        for _ in self.tee([data]):
+            pass
+
+    def tee(self, chunks):
+        """
+        Pass a stream through while writing it into the cache.
+
+        The entry is only published once the stream has been fully written,
+        so an aborted download never leaves a truncated file behind.
+
+        Args:
+            chunks: Iterable of str or bytes chunks
+
+        Yields:
+            The chunks unchanged
+        """
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        complete = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                self.cache.publish(temp_path, self.path)
+            else:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of download results stored on disk.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir (str): Directory holding the cached files
+            max_bytes (int): Total size budget in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def entry(self, table, roi, version, fmt):
+        """
+        Get the cache slot for a download.
+
+        Args:
+            table (str): Vector table name
+            roi (str): ROI hash from :func:`roi_hash`
+            version (str): Table data version from :func:`table_data_version`
+            fmt (str): Output format
+
+        Returns:
+            CacheEntry: The slot for this combination, or None if the table
+                has no data version
+        """
+        if version is None:
+            return None
+        # The slot prefix identifies (table, format); the suffix the data version
+        slot = hashlib.sha256(f"{table}|{fmt}".encode('utf-8')).hexdigest()[:16]
+        digest = hashlib.sha256(f"{table}|{roi}|{version}|{fmt}".encode('utf-8')).hexdigest()[:32]
+        return CacheEntry(self, os.path.join(self.cache_dir, roi, f"{slot}-{digest}"))
+
+    def publish(self, temp_path, path):
+        """
+        Move a completed file into place and enforce the size budget.
+
+        Entries for the same table and format written against an older data
+        version are removed, since they can no longer be hit.
+        """
+        directory, name = os.path.split(path)
+        slot = name.split('-')[0]
+        if os.path.getsize(temp_path) > self.max_bytes:
+            os.remove(temp_path)
+            return
+        os.replace(temp_path, path)
+        for other in os.listdir(directory):
+            if other.startswith(slot + '-') and other != name:
+                try:
+                    os.remove(os.path.join(directory, other))
+                except OSError:
+                    pass
+        self.evict()
+
+    def invalidate_roi(self, roi):
+        """
+        Remove every entry computed for an ROI.
+
+        Args:
+            roi (str): ROI hash from :func:`roi_hash`
+        """
+        shutil.rmtree(os.path.join(self.cache_dir, roi), ignore_errors=True)
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its budget."""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def init_result_cache(app):
+    """
+    Create the result cache for the app.
+
+    Args:
+        app: The Flask application instance.
+    """
+    cache_dir = app.config["RESULT_CACHE_DIR"]
+    os.makedirs(cache_dir, exist_ok=True)
+    app.extensions['result_cache'] = ResultCache(cache_dir, app.config["RESULT_CACHE_MAX_BYTES"])
+
+
+def get_result_cache():
+    """Get the result cache of the current app."""
+    return current_app.extensions['result_cache']
+
+
+def init_result_cache_commands(app):
+    """
+    Register the ``install-version-triggers`` CLI command.
+
+    Args:
+        app: The Flask application instance
+    """
+    @app.cli.command('install-version-triggers')
+    @click.argument('tables', nargs=-1)
+    def install_version_triggers_command(tables):
+        """Install the data version triggers that let results of TABLES be cached.
+
+        Defaults to every vector and raster table. Run as a user owning the
+        tables, e.g. with POSTGIS_USER and POSTGIS_PASSWORD set accordingly.
+        """
+        # DDL waits for writes to the tables, so no statement budget applies
+        with db_connection('geoserver_db', statement_timeout=0) as conn:
+            cur = conn.cursor()
+            if tables:
+                pairs = [tuple(name.split('.', 1)) if '.' in name else ('public', name) for name in tables]
+            else:
+                cur.execute(SPATIAL_TABLES_SQL)
+                pairs = cur.fetchall()
+            installed = install_version_triggers(cur, pairs)
+            cur.close()
+        for schema_name, table_name in installed:
+            click.echo(f"Installed the data version trigger on {schema_name}.{table_name}")
+        click.echo(f"Installed {len(installed)} trigger(s); {len(pairs) - len(installed)} table(s) already had one.")
@@ -0,0 +1,287 @@
+"""
+Per-session ROI storage.
+
+Each browser session keeps its own region of interest in ``roi_sessions``,
+keyed by session ID, so concurrent users no longer overwrite each other's
+ROI. Every lookup is a primary-key read, and ROIs older than the configured
+TTL are removed by a background sweeper.
+
+Intersection queries do not use that copy directly. Large ROIs with tens of
+thousands of vertices get little help from a spatial index, so on upload the
+ROI is also split with ``ST_Subdivide`` into small parts stored in
+``roi_parts``. That table lives in the GeoServer database, next to the
+species tables, so intersection queries can join against it.
+"""
+
+import logging
+import threading
+
+from utils.db_pool import db_connection
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Valid, polygon-only geometry of an uploaded ROI; repairs and mixed-geometry
+# files can produce collections with lines or points, which the tables refuse
+POLYGONAL_ROI_SQL = "ST_CollectionExtract(ST_MakeValid(ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326)), 3)"
+
+
+class InvalidRoi(Exception):
+    """Raised when an uploaded ROI cannot be stored"""
+    status_code = 400
+
+
+# Schema creation runs once per process instead of on every upload
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_roi_schema():
+    """Create the ROI table and its indexes if they do not exist yet."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with db_connection('roi_db') as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS roi_sessions (
+                    session_id VARCHAR(100) PRIMARY KEY,
+                    geom geometry(MultiPolygon, 4326) NOT NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS roi_sessions_geom_idx ON roi_sessions USING GIST (geom);")
+            cur.execute("CREATE INDEX IF NOT EXISTS roi_sessions_created_at_idx ON roi_sessions (created_at);")
+            cur.close()
+        with db_connection('geoserver_db') as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS roi_parts (
+                    id BIGSERIAL PRIMARY KEY,
+                    session_id VARCHAR(100) NOT NULL,
+                    geom geometry(Polygon, 4326) NOT NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS roi_parts_session_idx ON roi_parts (session_id);")
+            cur.execute("CREATE INDEX IF NOT EXISTS roi_parts_geom_idx ON roi_parts USING GIST (geom);")
+            cur.close()
+        _schema_ready = True
+
+
+def save_roi(session_id, geom_json, max_vertices=256):
+    """
+    Store the ROI of a session, replacing any previous one.
+
+    The geometry is made valid and reduced to its polygons, since the ROI
+    tables only hold polygons. The two databases cannot share a transaction,
+    so the parts are written in a transaction of the GeoServer database that
+    is committed only after the ROI itself: a failure before that leaves the
+    previous ROI and its parts as they were, and if the parts fail to commit
+    after the ROI did, both are removed.
+
+    Args:
+        session_id (str): The session ID
+        geom_json (str): ROI geometry as GeoJSON in EPSG:4326
+        max_vertices (int): Vertex cap of each subdivided part
+
+    Raises:
+        InvalidRoi: If the geometry has no polygonal area
+    """
+    ensure_roi_schema()
+    roi_committed = False
+    try:
+        with db_connection('geoserver_db') as parts_conn:
+            cur = parts_conn.cursor()
+            cur.execute("DELETE FROM roi_parts WHERE session_id = %s;", (session_id,))
+            cur.execute(f"""
+                INSERT INTO roi_parts (session_id, geom)
+                SELECT %s, part.geom
+                FROM (SELECT (ST_Dump(ST_Subdivide({POLYGONAL_ROI_SQL}, %s))).geom) AS part
+                WHERE NOT ST_IsEmpty(part.geom);
+            """, (session_id, geom_json, max_vertices))
+            if not cur.rowcount:
+                raise InvalidRoi("The ROI has no polygon area.")
+            cur.close()
+
+            with db_connection('roi_db') as conn:
+                cur = conn.cursor()
+                cur.execute(f"""
+                    INSERT INTO roi_sessions (session_id, geom, created_at)
+                    VALUES (%s, ST_Multi({POLYGONAL_ROI_SQL}), CURRENT_TIMESTAMP)
+                    ON CONFLICT (session_id)
+                    DO UPDATE SET geom = EXCLUDED.geom, created_at = EXCLUDED.created_at;
+                """, (session_id, geom_json))
+                cur.close()
+            roi_committed = True
+    except Exception:
+        if not roi_committed:
+            raise
+        # The new ROI was committed but its parts were not
+        try:
+            delete_roi(session_id)
+        except Exception as e:
+            logger.warning(f"Could not remove the partly saved ROI of {session_id}: {str(e)}")
+        raise
+
+
+def delete_roi(session_id):
+    """
+    Remove the ROI of a session and its parts.
+
+    Args:
+        session_id (str): The session ID
+    """
+    with db_connection('roi_db') as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM roi_sessions WHERE session_id = %s;", (session_id,))
+        cur.close()
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM roi_parts WHERE session_id = %s;", (session_id,))
+        cur.close()
+
+
+def load_roi(session_id, tolerance=0, precision=None):
+    """
+    Get the ROI of a session.
+
+    Args:
+        session_id (str): The session ID
+        tolerance (float): Simplification tolerance in degrees, 0 for the full geometry
+        precision (int): Decimal digits of the coordinates, None for all of them
+
+    Returns:
+        str: ROI geometry as GeoJSON, or None if the session has no ROI
+    """
+    if not session_id:
+        return None
+    ensure_roi_schema()
+    geometry_sql = "ST_SimplifyPreserveTopology(geom, %s)" if tolerance else "geom"
+    params = (tolerance,) if tolerance else ()
+    if precision is not None:
+        geometry_sql = f"ST_AsGeoJSON({geometry_sql}, %s)"
+        params += (int(precision),)
+    else:
+        geometry_sql = f"ST_AsGeoJSON({geometry_sql})"
+    with db_connection('roi_db') as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {geometry_sql} FROM roi_sessions WHERE session_id = %s;", params + (session_id,))
+        result = cur.fetchone()
+        cur.close()
+    return result[0] if result else None
+
+
+def roi_revision(session_id):
+    """
+    Get the revision of a session's ROI, which changes with every upload.
+
+    Args:
+        session_id (str): The session ID
+
+    Returns:
+        str: Revision identifying the ROI version, or None if the session has no ROI
+    """
+    if not session_id:
+        return None
+    ensure_roi_schema()
+    with db_connection('roi_db') as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT created_at FROM roi_sessions WHERE session_id = %s;", (session_id,))
+        result = cur.fetchone()
+        cur.close()
+    return f"{session_id}:{result[0].isoformat()}" if result else None
+
+
+def roi_exists(session_id):
+    """
+    Check whether a session has an ROI.
+
+    Args:
+        session_id (str): The session ID
+    """
+    if not session_id:
+        return False
+    ensure_roi_schema()
+    with db_connection('roi_db') as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT EXISTS (SELECT 1 FROM roi_sessions WHERE session_id = %s);", (session_id,))
+        exists = cur.fetchone()[0]
+        cur.close()
+    return exists
+
+
+def roi_filter_sql(geometry_sql, table):
+    """
+    Build a condition matching rows that intersect the session's ROI.
+
+    The condition is an EXISTS over the subdivided ROI parts, so each row is
+    returned at most once however many parts it touches. It takes a single
+    query parameter, the session ID.
+
+    Args:
+        geometry_sql (str): Geometry (or raster) expression of the filtered rows
+        table: Registry entry of the filtered table, used to match its SRID
+
+    Returns:
+        str: The SQL condition
+    """
+    return f"""EXISTS (
+        SELECT 1 FROM roi_parts p
+        WHERE p.session_id = %s
+          AND ST_Intersects({geometry_sql}, {table.to_table_srid('p.geom')})
+    )"""
+
+
+def sweep_expired_rois(ttl_hours):
+    """
+    Delete ROIs older than the TTL.
+
+    Args:
+        ttl_hours (float): Maximum ROI age in hours
+
+    Returns:
+        int: Number of ROIs deleted
+    """
+    ensure_roi_schema()
+    with db_connection('roi_db') as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM roi_sessions WHERE created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour';",
+                    (ttl_hours,))
+        deleted = cur.rowcount
+        cur.close()
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM roi_parts WHERE created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 hour';",
+                    (ttl_hours,))
+        cur.close()
+    return deleted
+
+
+def schedule_roi_sweeper(app):
+    """
+    Run the expired-ROI sweeper every ROI_SWEEP_INTERVAL seconds.
+
+    Args:
+        app: The Flask application instance.
+    """
+    interval = app.config["ROI_SWEEP_INTERVAL"]
+    if not interval:
+        return
+
+    def run():
+        with app.app_context():
+            try:
+                deleted = sweep_expired_rois(app.config["ROI_TTL_HOURS"])
+                if deleted:
+                    logger.info(f"Removed {deleted} expired ROIs")
+            except Exception as e:
+                logger.warning(f"ROI sweep failed: {str(e)}")
+        schedule_roi_sweeper(app)
+
+    timer = threading.Timer(interval, run)
+    timer.daemon = True
+    timer.start()
@@ -0,0 +1,242 @@
+"""
+In-process registry of the spatial tables in the GeoServer database.
+
+The registry is built from PostGIS' ``geometry_columns`` and ``raster_columns``
+views and records, for each table, its schema, geometry (or raster) column,
+SRID, geometry type and attribute list. Geodata routes look tables up here
+instead of querying the system catalogs on every request.
+"""
+
+import time
+import logging
+import threading
+from collections import namedtuple
+from flask import current_app
+
+from utils.db_pool import db_connection
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# SRID of geometries exchanged with the browser (ROIs, bboxes, GeoJSON output)
+CLIENT_SRID = 4326
+
+
+class VectorTable(namedtuple('VectorTable', 'schema table geometry_column srid geometry_type attributes primary_key',
+                             defaults=(None,))):
+    """Description of a table with a geometry column and, if any, its single-column primary key."""
+    __slots__ = ()
+
+    @property
+    def qualified_name(self):
+        return f'"{self.schema}"."{self.table}"'
+
+    def geometry_sql(self, alias='v'):
+        """SQL expression for the table's geometry column."""
+        return f'{alias}."{self.geometry_column}"'
+
+    def to_table_srid(self, geometry_sql):
+        """Transform a client (EPSG:4326) geometry expression into the table's SRID."""
+        if self.srid in (0, CLIENT_SRID):
+            return geometry_sql
+        return f"ST_Transform({geometry_sql}, {int(self.srid)})"
+
+    def to_client_srid(self, geometry_sql):
+        """Transform a geometry expression in the table's SRID to EPSG:4326."""
+        if self.srid in (0, CLIENT_SRID):
+            return geometry_sql
+        return f"ST_Transform({geometry_sql}, {CLIENT_SRID})"
+
+
+class RasterTable(namedtuple('RasterTable', 'schema table raster_column srid scale_x scale_y')):
+    """Description of a table with a raster column."""
+    __slots__ = ()
+
+    @property
+    def qualified_name(self):
+        return f'"{self.schema}"."{self.table}"'
+
+    def to_table_srid(self, geometry_sql):
+        """Transform a client (EPSG:4326) geometry expression into the raster's SRID."""
+        if self.srid in (0, CLIENT_SRID):
+            return geometry_sql
+        return f"ST_Transform({geometry_sql}, {int(self.srid)})"
+
+
+class SpatialRegistry:
+    """
+    Registry of vector and raster tables, refreshed periodically.
+
+    Lookups of unknown tables trigger a refresh at most once per
+    ``miss_refresh_interval`` seconds, so newly imported tables become
+    available without waiting for the next scheduled refresh.
+    """
+
+    def __init__(self, refresh_interval=300, miss_refresh_interval=30):
+        """
+        Initialize an empty registry.
+
+        Args:
+            refresh_interval (float): Seconds between scheduled refreshes, 0 to disable
+            miss_refresh_interval (float): Minimum seconds between refreshes
+                triggered by lookups of unknown tables
+        """
+        self.refresh_interval = refresh_interval
+        self.miss_refresh_interval = miss_refresh_interval
+        self._vector = {}
+        self._raster = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def refresh(self):
+        """
+        Reload the registry from the database.
+
+        Must be called inside an application context.
+
+        Returns:
+            dict: Number of vector and raster tables found
+        """
+        with db_connection('geoserver_db') as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT f_table_schema, f_table_name, f_geometry_column, srid, type
+                FROM geometry_columns
+                ORDER BY (f_table_schema = 'public') DESC, f_table_schema, f_table_name;
+            """)
+            geometry_rows = cur.fetchall()
+
+            # Tables with several geometry columns are listed once, without any of them
+            cur.execute("""
+                SELECT c.table_schema, c.table_name, c.column_name
+                FROM information_schema.columns c
+                WHERE (c.table_schema, c.table_name) IN (
+                    SELECT f_table_schema, f_table_name FROM geometry_columns)
+                  AND NOT EXISTS (
+                    SELECT 1 FROM geometry_columns g
+                    WHERE g.f_table_schema = c.table_schema AND g.f_table_name = c.table_name
+                      AND g.f_geometry_column = c.column_name)
+                ORDER BY c.table_schema, c.table_name, c.ordinal_position;
+            """)
+            attributes = {}
+            for schema, table, column in cur.fetchall():
+                attributes.setdefault((schema, table), []).append(column)
+
+            cur.execute("""
+                SELECT n.nspname, c.relname, a.attname
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indrelid
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = i.indkey[0]
+                WHERE i.indisprimary AND i.indnatts = 1;
+            """)
+            primary_keys = {(schema, table): column for schema, table, column in cur.fetchall()}
+
+            cur.execute("""
+                SELECT r_table_schema, r_table_name, r_raster_column, srid, scale_x, scale_y
+                FROM raster_columns
+                ORDER BY (r_table_schema = 'public') DESC, r_table_schema, r_table_name;
+            """)
+            raster_rows = cur.fetchall()
+            cur.close()
+
+        vector = {}
+        for schema, table, column, srid, geometry_type in geometry_rows:
+            # The first geometry column of a table is the one routes use
+            if table not in vector:
+                vector[table] = VectorTable(schema, table, column, srid, geometry_type,
+                                            tuple(attributes.get((schema, table), ())),
+                                            primary_keys.get((schema, table)))
+        raster = {}
+        for schema, table, column, srid, scale_x, scale_y in raster_rows:
+            if table not in raster:
+                raster[table] = RasterTable(schema, table, column, srid, scale_x, scale_y)
+
+        with self._lock:
+            self._vector = vector
+            self._raster = raster
+            self._loaded_at = time.monotonic()
+
+        logger.info(f"Spatial registry loaded {len(vector)} vector and {len(raster)} raster tables")
+        return {'vector_tables': len(vector), 'raster_tables': len(raster)}
+
+    def _lookup(self, tables, name, refresh=True):
+        table = tables().get(name)
+        if table is not None or not refresh:
+            return table
+        stale = (self._loaded_at is None or
+                 time.monotonic() - self._loaded_at > self.miss_refresh_interval)
+        if stale:
+            self.refresh()
+            table = tables().get(name)
+        return table
+
+    def vector_table(self, name, refresh=True):
+        """
+        Look up a vector table by name.
+
+        Args:
+            name (str): Table name, optionally prefixed with a GeoServer workspace
+            refresh (bool): Reload the registry if the table is unknown; pass
+                False where blocking database calls are not allowed
+
+        Returns:
+            VectorTable: The table description, or None if unknown
+        """
+        return self._lookup(lambda: self._vector, name.split(':')[-1], refresh=refresh)
+
+    def raster_table(self, name):
+        """
+        Look up a raster table by name.
+
+        Args:
+            name (str): Table name, optionally prefixed with a GeoServer workspace
+
+        Returns:
+            RasterTable: The table description, or None if unknown
+        """
+        return self._lookup(lambda: self._raster, name.split(':')[-1])
+
+    def schedule_refresh(self, app, delay=None):
+        """
+        Refresh the registry every ``refresh_interval`` seconds in the background.
+
+        Args:
+            app: The Flask application instance.
+            delay (float): Seconds before the first refresh, defaults to the interval
+        """
+        if not self.refresh_interval:
+            return
+
+        def run():
+            with app.app_context():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning(f"Scheduled spatial registry refresh failed: {str(e)}")
+            self.schedule_refresh(app)
+
+        self._timer = threading.Timer(self.refresh_interval if delay is None else delay, run)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+def init_spatial_registry(app):
+    """
+    Create the spatial registry and load it in the background.
+
+    The first load runs right after startup without blocking it. If the
+    database is not reachable yet, the registry is loaded on first use.
+
+    Args:
+        app: The Flask application instance.
+    """
+    registry = SpatialRegistry(refresh_interval=app.config["SPATIAL_REGISTRY_REFRESH_INTERVAL"])
+    app.extensions['spatial_registry'] = registry
+    registry.schedule_refresh(app, delay=0)
+
+
+def get_spatial_registry():
+    """Get the spatial registry of the current app."""
+    return current_app.extensions['spatial_registry']
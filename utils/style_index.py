@@ -0,0 +1,267 @@
+"""
+Content-addressed deduplication of generated GeoServer styles.
+
+Style generation requests are hashed from their normalized inputs (layer,
+band, classification column, palette, breaks, ...). A local JSON index maps
+each hash to the style created for it, so a repeated request reuses that
+style instead of creating another near-identical one. The index is shared by
+all worker processes and guarded by a file lock.
+
+``flask gc-styles`` deletes generated styles that no GeoServer layer uses
+any more and drops index entries whose style was removed in GeoServer.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import click
+from flask import current_app
+
+from utils.file_lock import file_lock
+from utils.geoserver_client import get_geoserver_client
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Length of the hash suffix of generated style names
+NAME_HASH_LENGTH = 10
+
+
+class StyleCreationError(Exception):
+    """Raised when GeoServer rejects the creation of a style"""
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def normalize(value):
+    """Normalize style inputs so equivalent requests hash the same."""
+    if isinstance(value, dict):
+        return {str(key): normalize(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, str):
+        value = value.strip()
+        # Numbers sent as strings ("1", "0.50") hash like numbers
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        return int(number) if number.is_integer() else number
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def style_hash(inputs):
+    """
+    Hash the inputs of a style generation request.
+
+    Args:
+        inputs (dict): Everything the generated style depends on
+
+    Returns:
+        str: Hex digest
+    """
+    text = json.dumps(normalize(inputs), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def hashed_style_name(prefix, digest):
+    """
+    Build the deterministic name of a generated style.
+
+    Args:
+        prefix (str): Human-readable part of the name
+        digest (str): From :func:`style_hash`
+
+    Returns:
+        str: Style name
+    """
+    return f"{prefix}_{digest[:NAME_HASH_LENGTH]}"
+
+
+class StyleIndex:
+    """JSON file mapping input hashes to generated style names."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def lock(self, timeout=10):
+        """Lock the index across processes."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        return file_lock(self.path, timeout=timeout)
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning(f"Style index {self.path} is corrupt, starting a new one")
+            return {}
+
+    def _write(self, entries):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def entries(self):
+        """Get all index entries, keyed by hash."""
+        with self.lock():
+            return self._read()
+
+    def get_or_create(self, digest, create, exists):
+        """
+        Get the style of a hash, creating it if it is unknown or was deleted.
+
+        The lock is held while creating, so concurrent identical requests
+        create a single style.
+
+        Args:
+            digest (str): From :func:`style_hash`
+            create: Callable creating the style, returning ``(name, workspace)``
+            exists: Callable ``(name, workspace) -> bool`` checking GeoServer
+
+        Returns:
+            tuple: (style name, True if an existing style was reused)
+        """
+        with self.lock(timeout=60):
+            entries = self._read()
+            entry = entries.get(digest)
+            if entry and exists(entry['name'], entry.get('workspace')):
+                return entry['name'], True
+
+            name, workspace = create()
+            entries[digest] = {'name': name, 'workspace': workspace, 'created': time.time()}
+            self._write(entries)
+            return name, False
+
+    def remove(self, digests):
+        """Drop index entries."""
+        with self.lock():
+            entries = self._read()
+            for digest in digests:
+                entries.pop(digest, None)
+            self._write(entries)
+
+
+def get_style_index():
+    return StyleIndex(current_app.config["STYLE_INDEX_FILE"])
+
+
+def style_path(name, workspace=None):
+    if workspace:
+        return f"/rest/workspaces/{workspace}/styles/{name}"
+    return f"/rest/styles/{name}"
+
+
+def style_exists(name, workspace=None):
+    """
+    Check whether GeoServer has a style, in the workspace or globally.
+
+    Args:
+        name (str): Style name
+        workspace (str): Workspace the style was created in, if known
+
+    Returns:
+        bool: True if the style exists
+    """
+    for scope in ([workspace, None] if workspace else [None]):
+        response = get_geoserver_client().get(f"{style_path(name, scope)}.json", 'get_style')
+        if response.ok:
+            return True
+    return False
+
+
+def layer_style_names():
+    """
+    Get the names of all styles used by GeoServer layers.
+
+    Returns:
+        set: Default and alternate style names of every layer
+    """
+    client = get_geoserver_client()
+    response = client.get("/rest/layers.json", 'list_layers')
+    response.raise_for_status()
+    layers = (response.json().get('layers') or {}).get('layer', [])
+
+    used = set()
+    for layer in layers:
+        layer_response = client.get(f"/rest/layers/{layer['name']}.json", 'get_layer')
+        layer_response.raise_for_status()
+        info = layer_response.json().get('layer', {})
+        styles = [info.get('defaultStyle') or {}] + ((info.get('styles') or {}).get('style') or [])
+        for style in styles:
+            if style.get('name'):
+                # Workspace styles are reported as "workspace:name"
+                used.add(style['name'].split(':')[-1])
+    return used
+
+
+def collect_orphaned_styles(min_age_hours=24, dry_run=False):
+    """
+    Delete generated styles that no layer uses and prune the index.
+
+    Styles younger than ``min_age_hours`` are kept, since a style is only
+    assigned to a layer after it has been generated.
+
+    Args:
+        min_age_hours (float): Minimum age of a deleted style
+        dry_run (bool): Only report what would be deleted
+
+    Returns:
+        dict: Names of the deleted styles and of index entries whose style was gone
+    """
+    index = get_style_index()
+    used = layer_style_names()
+    cutoff = time.time() - min_age_hours * 3600
+    deleted, missing, stale = [], [], []
+    for digest, entry in index.entries().items():
+        name, workspace = entry['name'], entry.get('workspace')
+        if name in used or entry.get('created', 0) > cutoff:
+            continue
+        if not style_exists(name, workspace):
+            missing.append(name)
+            stale.append(digest)
+            continue
+        deleted.append(name)
+        if dry_run:
+            continue
+        for scope in ([workspace, None] if workspace else [None]):
+            response = get_geoserver_client().delete(style_path(name, scope), 'delete_style', params={'purge': 'true'})
+            if response.ok:
+                stale.append(digest)
+                break
+        else:
+            logger.warning(f"Could not delete style {name}")
+            deleted.remove(name)
+    if not dry_run:
+        index.remove(stale)
+    return {'deleted': deleted, 'missing': missing}
+
+
+def init_style_commands(app):
+    """
+    Register the ``gc-styles`` CLI command.
+
+    Args:
+        app: The Flask application instance
+    """
+    @app.cli.command('gc-styles')
+    @click.option('--min-age-hours', type=float, default=24, show_default=True,
+                  help="Keep styles generated more recently than this.")
+    @click.option('--dry-run', is_flag=True, help="Only list the styles that would be deleted.")
+    def gc_styles(min_age_hours, dry_run):
+        """Delete generated GeoServer styles that no layer uses."""
+        result = collect_orphaned_styles(min_age_hours=min_age_hours, dry_run=dry_run)
+        verb = "Would delete" if dry_run else "Deleted"
+        for name in result['deleted']:
+            click.echo(f"{verb} style {name}")
+        for name in result['missing']:
+            click.echo(f"Style {name} was already removed from GeoServer")
+        click.echo(f"{verb} {len(result['deleted'])} orphaned style(s).")
@@ -0,0 +1,158 @@
+"""
+Zonal statistics of a raster over the session ROI.
+
+Per-class pixel counts (``ST_ValueCount``) and summary statistics
+(``ST_SummaryStatsAgg``) are computed in PostGIS over the tiles that
+intersect the ROI, so only a small JSON document leaves the database.
+
+Class areas come from the pixel size when the raster's CRS is measured in
+metres. Pixels of a geographic (degree-based) raster shrink towards the
+poles, so their classes are vectorized with ``ST_DumpAsPolygons`` and
+measured on the spheroid with ``ST_Area(geography)``. Rasters in any other
+CRS get no areas and an ``area_unavailable`` reason instead.
+"""
+
+import logging
+
+from utils.db_pool import db_connection
+from utils.raster_clip import roi_tiles_sql
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ('count', 'sum', 'mean', 'stddev', 'min', 'max')
+
+# CRS units of a raster, as reported by crs_units
+METRE = 'metre'
+DEGREE = 'degree'
+
+
+def crs_units(cur, srid):
+    """
+    Get the units of a CRS from its PROJ definition.
+
+    Args:
+        cur: An open cursor on the GeoServer database
+        srid (int): The SRID, 0 if the raster has none
+
+    Returns:
+        str: METRE, DEGREE, or None for a missing CRS or other units
+    """
+    if not srid:
+        return None
+    cur.execute(r"""
+        SELECT proj4text ~ '\+units=m( |$)', proj4text ~ '\+proj=longlat( |$)'
+        FROM spatial_ref_sys WHERE srid = %s;
+    """, (srid,))
+    srs = cur.fetchone()
+    if srs and srs[0]:
+        return METRE
+    if srs and srs[1]:
+        return DEGREE
+    return None
+
+
+def format_zonal_stats(row, units):
+    """
+    Shape a zonal statistics query row into the API response document.
+
+    Args:
+        row (tuple): Summary fields, class counts, pixel area and, for
+            geographic rasters, class areas in square metres
+        units (str): CRS units of the raster, see :func:`crs_units`
+
+    Returns:
+        dict: Summary statistics, per-class pixel counts and areas, and the
+            reason areas are missing (None when they are not)
+    """
+    summary = dict(zip(SUMMARY_FIELDS, row[:len(SUMMARY_FIELDS)]))
+    value_counts, pixel_area, class_areas = row[len(SUMMARY_FIELDS):]
+    pixel_area = abs(pixel_area) if pixel_area is not None and units == METRE else None
+    areas = {value: area for value, area in class_areas or []}
+
+    classes = []
+    for value, pixels in value_counts or []:
+        if pixel_area is not None:
+            area = pixels * pixel_area
+        else:
+            area = areas.get(value, 0.0) if units == DEGREE else None
+        classes.append({'value': value, 'pixels': pixels, 'area_m2': area})
+
+    area_unavailable = None
+    if units is None:
+        area_unavailable = "The raster's CRS is not measured in metres or degrees."
+    return {'summary': summary, 'classes': classes, 'pixel_area_m2': pixel_area,
+            'area_unavailable': area_unavailable}
+
+
+def zonal_stats_query(table, units):
+    """
+    Build the zonal statistics query of a raster.
+
+    The query takes three parameters: the ROI GeoJSON, the band and the
+    session ID.
+
+    Args:
+        table (RasterTable): Registry entry of the raster
+        units (str): CRS units of the raster, see :func:`crs_units`
+
+    Returns:
+        str: The SQL query
+    """
+    roi_sql = table.to_table_srid("ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326)")
+    if units == DEGREE:
+        # Contiguous pixels of a class merge into one polygon before being measured
+        class_areas_sql = f"""(
+                   SELECT json_agg(json_build_array(value, area) ORDER BY value)
+                   FROM (SELECT (d).val AS value,
+                                SUM(ST_Area(ST_Transform((d).geom, 4326)::geography)) AS area
+                         FROM (SELECT ST_DumpAsPolygons(rast, 1, true) AS d FROM clipped) dumped
+                         GROUP BY (d).val) class_areas)"""
+    else:
+        class_areas_sql = "NULL"
+    return f"""
+        WITH roi AS (
+            SELECT {roi_sql} AS geom
+        ),
+        clipped AS MATERIALIZED (
+            SELECT ST_Clip(r."{table.raster_column}", %s, (SELECT geom FROM roi), true) AS rast
+            {roi_tiles_sql(table)}
+        ),
+        value_counts AS (
+            SELECT (vc).value AS value, SUM((vc).count)::bigint AS pixels
+            FROM (SELECT ST_ValueCount(rast, 1, true) AS vc FROM clipped) counts
+            GROUP BY (vc).value
+        ),
+        stats AS (
+            SELECT ST_SummaryStatsAgg(rast, 1, true, 1) AS s FROM clipped
+        )
+        SELECT (s).count, (s).sum, (s).mean, (s).stddev, (s).min, (s).max,
+               (SELECT json_agg(json_build_array(value, pixels) ORDER BY value) FROM value_counts),
+               (SELECT ST_PixelWidth(rast) * ST_PixelHeight(rast) FROM clipped LIMIT 1),
+               {class_areas_sql}
+        FROM stats;
+    """
+
+
+def compute_zonal_stats(table, session_id, roi_geojson, band=1):
+    """
+    Compute statistics of a raster band inside the session ROI.
+
+    Args:
+        table (RasterTable): Registry entry of the raster
+        session_id (str): Session whose ROI parts select the tiles
+        roi_geojson (str): The full ROI geometry, used as the clip boundary
+        band (int): Raster band to summarize
+
+    Returns:
+        dict: See :func:`format_zonal_stats`, or None if no tile intersects the ROI
+    """
+    with db_connection('geoserver_db') as conn:
+        cur = conn.cursor()
+        units = crs_units(cur, table.srid)
+        cur.execute(zonal_stats_query(table, units), (roi_geojson, band, session_id))
+        row = cur.fetchone()
+        cur.close()
+    if not row or not row[0]:
+        return None
+    return format_zonal_stats(row, units)